@@ -0,0 +1,55 @@
+# @author lucasmiranda42
+# encoding: utf-8
+# module deepof
+
+"""
+
+Benchmark for deepof.utils.align_trajectories, comparing the vectorized implementation against per-frame rotation.
+
+Usage: python benchmarks/align_trajectories.py [n_frames]
+
+"""
+
+import sys
+from time import perf_counter
+
+import numpy as np
+
+import deepof.utils
+
+
+def align_per_frame(data: np.ndarray) -> np.ndarray:
+    """Reference implementation, which rotates each frame independently (as in deepof<=0.5.0)."""
+    data = data.reshape(-1, data.shape[-1], order="C")
+    angles = np.arctan2(data[:, 0], data[:, 1])
+
+    aligned_trajs = np.zeros(data.shape)
+    for frame in range(data.shape[0]):
+        aligned_trajs[frame] = deepof.utils.rotate(
+            data[frame].reshape([-1, 2], order="C"), angles[frame]
+        ).reshape(data.shape[1:], order="C")
+
+    return aligned_trajs
+
+
+if __name__ == "__main__":
+
+    n_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    # 11 body parts, as in the default deepof_14 graph after centering
+    data = np.random.uniform(-100, 100, size=(n_frames, 22))
+
+    start = perf_counter()
+    per_frame = align_per_frame(data)
+    per_frame_time = perf_counter() - start
+
+    start = perf_counter()
+    vectorized = deepof.utils.align_trajectories(data, mode="all")
+    vectorized_time = perf_counter() - start
+
+    assert np.allclose(per_frame, vectorized)
+
+    print("Frames: {}".format(n_frames))
+    print("Per-frame rotation: {:.3f}s".format(per_frame_time))
+    print("Vectorized rotation: {:.3f}s".format(vectorized_time))
+    print("Speedup: {:.1f}x".format(per_frame_time / vectorized_time))
@@ -0,0 +1,90 @@
+# @author lucasmiranda42
+# encoding: utf-8
+# module deepof
+
+"""
+
+Benchmark for circular arena autodetection in deepof.utils, comparing recognition on the first 500 full-resolution
+frames (as in deepof<=0.5.0) against a few evenly spaced frames, downsampled before detection.
+
+Usage: python benchmarks/arena_detection.py [video_path] [sample_frames]
+
+If no video is provided, a synthetic 1080p recording of a circular arena is generated.
+
+"""
+
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+import deepof.utils
+
+
+def simulate_video(path: str, n_frames: int = 3000, shape: tuple = (1080, 1920)):
+    """Write a video of a static elliptical arena, with a moving blob and some sensor noise."""
+    writer = cv2.VideoWriter(
+        path, cv2.VideoWriter_fourcc(*"mp4v"), 25, (shape[1], shape[0])
+    )
+    rng = np.random.default_rng(0)
+    for i in range(n_frames):
+        frame = np.full((*shape, 3), 40, dtype=np.uint8)
+        cv2.ellipse(
+            frame, (shape[1] // 2, shape[0] // 2), (450, 420), 0, 0, 360, (200,) * 3, -1
+        )
+        cv2.circle(
+            frame,
+            (shape[1] // 2 + int(200 * np.cos(i / 50)), shape[0] // 2),
+            30,
+            (60,) * 3,
+            -1,
+        )
+        frame = cv2.add(frame, rng.integers(0, 10, size=frame.shape, dtype=np.uint8))
+        writer.write(frame)
+    writer.release()
+
+
+if __name__ == "__main__":
+
+    sample_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if len(sys.argv) > 1:
+            path, video = os.path.split(os.path.abspath(sys.argv[1]))
+        else:
+            path, video = tmp_dir, "arena.mp4"
+            simulate_video(os.path.join(path, video))
+
+        start = perf_counter()
+        reference, h, w = deepof.utils.automatically_recognize_arena(
+            [video], 0, path, recoglimit=500
+        )
+        reference_time = perf_counter() - start
+
+        start = perf_counter()
+        sampled, _, _ = deepof.utils.automatically_recognize_arena(
+            [video], 0, path, sample_frames=sample_frames, max_size=640
+        )
+        sampled_time = perf_counter() - start
+
+    print("Video resolution: {}x{}".format(h, w))
+    print("First 500 frames: {:.3f}s, arena {}".format(reference_time, reference))
+    print(
+        "{} sampled frames: {:.3f}s, arena {}".format(
+            sample_frames, sampled_time, sampled
+        )
+    )
+    print(
+        "Max center / axis difference: {} px".format(
+            np.max(
+                np.abs(
+                    np.array([*reference[0], *reference[1]])
+                    - np.array([*sampled[0], *sampled[1]])
+                )
+            )
+        )
+    )
+    print("Speedup: {:.1f}x".format(reference_time / sampled_time))
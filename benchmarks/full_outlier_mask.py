@@ -0,0 +1,72 @@
+# @author lucasmiranda42
+# encoding: utf-8
+# module deepof
+
+"""
+
+Benchmark for deepof.utils.full_outlier_mask, comparing the vectorized implementation against per-body part masking.
+
+Usage: python benchmarks/full_outlier_mask.py [n_frames]
+
+"""
+
+import sys
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+import deepof.utils
+
+
+def mask_per_bodypart(
+    experiment: pd.DataFrame,
+    likelihood: pd.DataFrame,
+    likelihood_tolerance: float,
+    lag: int,
+    n_std: int,
+    mode: str,
+) -> pd.DataFrame:
+    """Reference implementation, which masks each body part independently (as in deepof<=0.5.0)."""
+    full_mask = experiment.copy()
+
+    for bpart in experiment.columns.levels[0]:
+        mask = deepof.utils.mask_outliers(
+            experiment[bpart], likelihood[bpart], likelihood_tolerance, lag, n_std, mode
+        )
+        full_mask.loc[:, (bpart, "x")] = mask
+        full_mask.loc[:, (bpart, "y")] = mask
+
+    return full_mask
+
+
+if __name__ == "__main__":
+
+    n_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    # 14 body parts, as in the default deepof_14 graph
+    bodyparts = ["bpart_{}".format(i) for i in range(14)]
+    experiment = pd.DataFrame(
+        np.cumsum(np.random.normal(0, 1, size=(n_frames, 28)), axis=0),
+        columns=pd.MultiIndex.from_product([bodyparts, ["x", "y"]]),
+    )
+    likelihood = pd.DataFrame(
+        np.random.uniform(0, 1, size=(n_frames, 14)), columns=bodyparts
+    )
+
+    start = perf_counter()
+    per_bodypart = mask_per_bodypart(experiment, likelihood, 0.5, 5, 3, "or")
+    per_bodypart_time = perf_counter() - start
+
+    start = perf_counter()
+    vectorized = deepof.utils.full_outlier_mask(
+        experiment, likelihood, 0.5, "", 5, 3, "or"
+    )
+    vectorized_time = perf_counter() - start
+
+    assert np.array_equal(per_bodypart.to_numpy(dtype=bool), vectorized.to_numpy())
+
+    print("Frames: {}".format(n_frames))
+    print("Per-body part masking: {:.3f}s".format(per_bodypart_time))
+    print("Vectorized masking: {:.3f}s".format(vectorized_time))
+    print("Speedup: {:.1f}x".format(per_bodypart_time / vectorized_time))
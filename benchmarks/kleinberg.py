@@ -0,0 +1,41 @@
+# @author lucasmiranda42
+# encoding: utf-8
+# module deepof
+
+"""
+
+Benchmark for deepof.utils.kleinberg, timing backpointer-based burst detection on sequences of increasing length.
+Running time should grow roughly linearly with the number of events. Equivalence with the path-copying dynamic program
+used in deepof<=0.5.0 is checked in tests/test_utils.py.
+
+Usage: python benchmarks/kleinberg.py [n_events]
+
+"""
+
+import sys
+from time import perf_counter
+
+import numpy as np
+
+import deepof.utils
+
+
+if __name__ == "__main__":
+
+    n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    # Boolean tag sequences with bursts of activity, as in supervised annotations
+    rng = np.random.default_rng(0)
+    rates = np.repeat(rng.uniform(0.05, 0.95, size=n_events // 100 + 1), 300)
+    offsets = np.where(rng.uniform(size=rates.shape[0]) < rates)[0][:n_events]
+
+    for length in sorted({min(1_000, n_events), min(10_000, n_events), n_events}):
+        start = perf_counter()
+        deepof.utils.kleinberg(offsets[:length], gamma=0.01)
+        elapsed = perf_counter() - start
+        print("Events: {}".format(length))
+        print(
+            "Backpointers: {:.3f}s ({:.2f}us per event)".format(
+                elapsed, 1e6 * elapsed / length
+            )
+        )
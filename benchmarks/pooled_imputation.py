@@ -0,0 +1,125 @@
+# @author lucasmiranda42
+# encoding: utf-8
+# module deepof
+
+"""
+
+Benchmark for occlusion imputation engines in deepof.utils, comparing per-video iterative imputation against a single
+model per animal fitted on frames pooled across videos. Reports run time and reconstruction error over occluded values.
+
+Usage: python benchmarks/pooled_imputation.py [n_videos] [n_frames]
+
+"""
+
+import sys
+from time import perf_counter
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+import deepof.data
+import deepof.utils
+
+
+def simulate_video(
+    template: np.ndarray, animal_ids: list, n_frames: int, rng
+) -> pd.DataFrame:
+    """Simulate rigid skeletons moving around the arena, with some tracking noise."""
+    tabs = []
+    for _ in animal_ids:
+        center = np.cumsum(rng.normal(0, 2, size=(n_frames, 1, 2)), axis=0) + 200
+        angle = np.cumsum(rng.normal(0, 0.05, size=n_frames))[:, np.newaxis]
+        cos, sin = np.cos(angle), np.sin(angle)
+        rotated = np.stack(
+            [
+                cos * template[:, 0] - sin * template[:, 1],
+                sin * template[:, 0] + cos * template[:, 1],
+            ],
+            axis=-1,
+        )
+        tabs.append(
+            (center + rotated + rng.normal(0, 1, size=rotated.shape)).reshape(
+                n_frames, -1
+            )
+        )
+
+    return pd.DataFrame(
+        np.concatenate(tabs, axis=1),
+        columns=pd.MultiIndex.from_product(
+            [
+                [
+                    "{}_bpart_{}".format(aid, i)
+                    for aid in animal_ids
+                    for i in range(template.shape[0])
+                ],
+                ["x", "y"],
+            ]
+        ),
+    )
+
+
+def occlude(tab: pd.DataFrame, rate: float, rng) -> pd.DataFrame:
+    """Remove the x, y coordinates of randomly selected body parts and frames."""
+    mask = np.repeat(
+        rng.uniform(size=(tab.shape[0], tab.shape[1] // 2)) < rate, 2, axis=1
+    )
+    return tab.mask(mask)
+
+
+if __name__ == "__main__":
+
+    n_videos = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    n_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    rng = np.random.default_rng(0)
+    animal_ids = ["B", "W"]
+    template = rng.uniform(-20, 20, size=(7, 2))
+    project = SimpleNamespace(animal_ids=animal_ids, enable_iterative_imputation=250)
+
+    ground_truth = {
+        "video_{}".format(i): simulate_video(template, animal_ids, n_frames, rng)
+        for i in range(n_videos)
+    }
+    occluded = {k: occlude(tab, 0.05, rng) for k, tab in ground_truth.items()}
+    likelihood = deepof.data.TableDict(
+        {
+            k: pd.DataFrame(1.0, index=tab.index, columns=tab.columns.unique(0))
+            for k, tab in occluded.items()
+        },
+        typ="quality",
+        animal_ids=animal_ids,
+    )
+
+    def reconstruction_error(imputed: dict) -> float:
+        """Root mean squared error over occluded values."""
+        errors = [
+            (imputed[k].to_numpy() - ground_truth[k].to_numpy())[tab.isna().to_numpy()]
+            for k, tab in occluded.items()
+        ]
+        return np.sqrt(np.mean(np.concatenate(errors) ** 2))
+
+    start = perf_counter()
+    per_video = {
+        k: deepof.utils.iterative_imputation(project, {k: tab}, likelihood)[k]
+        for k, tab in occluded.items()
+    }
+    per_video_time = perf_counter() - start
+
+    start = perf_counter()
+    imputers = deepof.utils.fit_pooled_imputer(project, occluded, likelihood)
+    pooled = deepof.utils.pooled_imputation(project, occluded, likelihood, imputers)
+    pooled_time = perf_counter() - start
+
+    print("Videos: {} ({} frames each)".format(n_videos, n_frames))
+    print(
+        "Per-video iterative imputation: {:.3f}s, RMSE {:.3f}".format(
+            per_video_time, reconstruction_error(per_video)
+        )
+    )
+    print(
+        "Pooled imputation: {:.3f}s, RMSE {:.3f}".format(
+            pooled_time, reconstruction_error(pooled)
+        )
+    )
+    print("Speedup: {:.1f}x".format(per_video_time / pooled_time))
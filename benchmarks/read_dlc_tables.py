@@ -0,0 +1,92 @@
+# @author lucasmiranda42
+# encoding: utf-8
+# module deepof
+
+"""
+
+Benchmark for DLC table parsing in deepof.data.Project, comparing direct header parsing against the transposed
+object-dtype round-trip used in deepof<=0.5.0.
+
+Usage: python benchmarks/read_dlc_tables.py [n_frames]
+
+"""
+
+import os
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+import deepof.data
+
+
+def read_transposed(path: str) -> pd.DataFrame:
+    """Reference implementation, which parses headers through an object-dtype transpose (as in deepof<=0.5.0)."""
+    if path.endswith(".h5"):
+        loaded_tab = pd.read_hdf(path, dtype=float)
+        loaded_tab = loaded_tab.T.reset_index(drop=False).T
+        loaded_tab.columns = loaded_tab.loc["scorer", :]
+        loaded_tab = loaded_tab.iloc[1:]
+    else:
+        loaded_tab = pd.read_csv(path, index_col=0, low_memory=False)
+
+    tab = loaded_tab.copy()
+    tab.columns = pd.MultiIndex.from_arrays([loaded_tab.iloc[i] for i in range(2)])
+    return tab.iloc[2:].astype(float).reset_index(drop=True)
+
+
+def profile(func, *args):
+    """Return the output, run time and peak traced memory of the given function."""
+    tracemalloc.start()
+    start = perf_counter()
+    out = func(*args)
+    elapsed = perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, elapsed, peak / 1e6
+
+
+if __name__ == "__main__":
+
+    n_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    # 14 body parts, as in the default deepof_14 graph
+    columns = pd.MultiIndex.from_product(
+        [
+            ["DLC_scorer"],
+            ["bpart_{}".format(i) for i in range(14)],
+            ["x", "y", "likelihood"],
+        ],
+        names=["scorer", "bodyparts", "coords"],
+    )
+    raw = pd.DataFrame(
+        np.random.uniform(0, 500, size=(n_frames, len(columns))), columns=columns
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        raw.to_hdf(os.path.join(tmp_dir, "testDLC.h5"), key="df_with_missing")
+        raw.to_csv(os.path.join(tmp_dir, "testDLC.csv"))
+
+        for table_format in [".h5", ".csv"]:
+            project = deepof.data.Project.__new__(deepof.data.Project)
+            project.table_path, project.table_format = tmp_dir, table_format
+            path = os.path.join(tmp_dir, "testDLC" + table_format)
+
+            reference, ref_time, ref_peak = profile(read_transposed, path)
+            direct, direct_time, direct_peak = profile(
+                project._read_table, "testDLC" + table_format
+            )
+            assert np.array_equal(reference.to_numpy(), direct.to_numpy())
+
+            print("Format: {} ({} frames)".format(table_format, n_frames))
+            print(
+                "Transposed parsing: {:.3f}s, peak {:.1f} MB".format(ref_time, ref_peak)
+            )
+            print(
+                "Direct parsing: {:.3f}s, peak {:.1f} MB".format(
+                    direct_time, direct_peak
+                )
+            )
@@ -7,9 +7,9 @@
 import os
 import pickle
 import warnings
-from joblib import delayed, Parallel, parallel_backend
-from typing import Any, List, NewType, Union
-from shapely.geometry import Point, Polygon
+from joblib import delayed, effective_n_jobs, Parallel, parallel_backend
+from typing import Any, List, NewType, Tuple, Union
+from shapely.geometry import Polygon
 from sklearn.preprocessing import StandardScaler
 from tqdm import tqdm
 from itertools import combinations
@@ -149,6 +149,38 @@ def outside_ellipse(x, y, e_center, e_axes, e_angle, threshold=0.0):
     return term_x + term_y > 1
 
 
+def outside_polygon(points, polygon, threshold=0.0):
+    """Auxiliar function to climb_wall and sniff_object.
+
+    Returns True if the passed x, y coordinates are outside the polygon denoted by its vertices, buffered by a certain
+    threshold. The buffered polygon is computed once, and all points are tested at once using the even-odd rule over
+    its boundary rings.
+
+    """
+    points = np.asarray(points, dtype=float)
+    px, py = points[:, 0], points[:, 1]
+
+    buffered = Polygon(polygon).buffer(threshold)
+    inside = np.zeros(points.shape[0], dtype=bool)
+
+    for part in getattr(buffered, "geoms", [buffered]):
+        if part.is_empty:
+            continue
+
+        for ring in [part.exterior, *part.interiors]:
+            vertices = np.asarray(ring.coords)
+            for (x1, y1), (x2, y2) in zip(vertices[:-1], vertices[1:]):
+                if y1 == y2:
+                    continue
+
+                # Flip the state of all points whose horizontal ray to the right crosses the current edge
+                inside ^= ((y1 > py) != (y2 > py)) & (
+                    px < (x2 - x1) * (py - y1) / (y2 - y1) + x1
+                )
+
+    return ~inside
+
+
 def climb_wall(
     arena_type: str,
     arena: np.array,
@@ -188,9 +220,7 @@ def climb_wall(
 
     elif arena_type.startswith("polygon"):
 
-        climbing = np.array(
-            [not Polygon(arena).buffer(tol).contains(Point(n)) for n in nose.values]
-        )
+        climbing = outside_polygon(nose.values, arena, threshold=tol)
 
     else:
         raise NotImplementedError(
@@ -260,15 +290,8 @@ def sniff_object(
 
         elif arena_type.startswith("polygon"):
 
-            nosing_min = np.array(
-                [
-                    not Polygon(arena).buffer(-tol).contains(Point(n))
-                    for n in nose.values
-                ]
-            )
-            nosing_max = np.array(
-                [not Polygon(arena).buffer(tol).contains(Point(n)) for n in nose.values]
-            )
+            nosing_min = outside_polygon(nose.values, arena, threshold=-tol)
+            nosing_max = outside_polygon(nose.values, arena, threshold=tol)
 
         # noinspection PyUnboundLocalVariable
         nosing = nosing_min & (~nosing_max)
@@ -384,7 +407,8 @@ def following_path(
     followed: str,
     frames: int = 20,
     tol: float = 0,
-) -> np.array:
+    bidirectional: bool = False,
+) -> Union[np.array, Tuple[np.array, np.array]]:
     """Return True if 'follower' is closer than tol to the path that followed has walked over the last specified number of frames.
 
     For multi animal videos only.
@@ -396,43 +420,70 @@ def following_path(
             followed (str) identifier for the animal who's followed
             frames (int) frames in which to track whether the process consistently occurs,
             tol (float) Maximum distance for which True is returned
+            bidirectional (bool) if True, both follower -> followed and followed -> follower sequences are computed at once
 
         Returns:
-            follow (np.array): boolean sequence, True if conditions are fulfilled, False otherwise
+            follow (np.array): boolean sequence, True if conditions are fulfilled, False otherwise. If bidirectional is
+            True, a tuple with the sequences for both directions is returned instead
 
     """
-    # Check that follower is close enough to the path that followed has passed though in the last frames
-    shift_dict = {
-        i: position_dframe[followed + "_Tail_base"].shift(i) for i in range(frames)
-    }
-    dist_df = pd.DataFrame(
-        {
-            i: np.linalg.norm(
-                position_dframe[follower + "_Nose"] - shift_dict[i], axis=1
-            )
-            for i in range(frames)
-        }
+    directions = [(follower, followed)]
+    if bidirectional:
+        directions.append((followed, follower))
+
+    # Check that follower is close enough to the path that followed has passed though in the last frames. Paths are
+    # built as strided (direction, frame, lag) views over the tail trajectories, padded at the start so that early
+    # frames only look back as far as the video goes. Squared distances are minimised before taking the root
+    noses = np.stack(
+        [position_dframe[a + "_Nose"].to_numpy(dtype=float) for a, _ in directions]
     )
-
-    # Check that the animals are oriented follower's nose -> followed's tail
-    right_orient1 = (
-        distance_dframe[tuple(sorted([follower + "_Nose", followed + "_Tail_base"]))]
-        < distance_dframe[
-            tuple(sorted([follower + "_Tail_base", followed + "_Tail_base"]))
-        ]
+    tails = np.stack(
+        [position_dframe[b + "_Tail_base"].to_numpy(dtype=float) for _, b in directions]
     )
-
-    right_orient2 = (
-        distance_dframe[tuple(sorted([follower + "_Nose", followed + "_Tail_base"]))]
-        < distance_dframe[tuple(sorted([follower + "_Nose", followed + "_Nose"]))]
+    tails = np.concatenate(
+        [np.full((len(directions), frames - 1, 2), np.nan), tails], axis=1
     )
-
-    # noinspection PyArgumentList
-    follow = np.all(
-        np.array([(dist_df.min(axis=1) < tol), right_orient1, right_orient2]), axis=0
+    paths = np.lib.stride_tricks.sliding_window_view(tails, frames, axis=1)
+    path_distances = np.sqrt(
+        np.fmin.reduce(
+            (noses[..., 0, np.newaxis] - paths[..., 0, :]) ** 2
+            + (noses[..., 1, np.newaxis] - paths[..., 1, :]) ** 2,
+            axis=2,
+        )
     )
 
-    return follow
+    follow = []
+    for (follower, followed), path_distance in zip(directions, path_distances):
+
+        # Check that the animals are oriented follower's nose -> followed's tail
+        right_orient1 = (
+            distance_dframe[
+                tuple(sorted([follower + "_Nose", followed + "_Tail_base"]))
+            ]
+            < distance_dframe[
+                tuple(sorted([follower + "_Tail_base", followed + "_Tail_base"]))
+            ]
+        )
+
+        right_orient2 = (
+            distance_dframe[
+                tuple(sorted([follower + "_Nose", followed + "_Tail_base"]))
+            ]
+            < distance_dframe[tuple(sorted([follower + "_Nose", followed + "_Nose"]))]
+        )
+
+        # noinspection PyArgumentList
+        follow.append(
+            np.all(
+                np.array([(path_distance < tol), right_orient1, right_orient2]),
+                axis=0,
+            )
+        )
+
+    if bidirectional:
+        return tuple(follow)
+
+    return follow[0]
 
 
 def max_behaviour(
@@ -515,6 +566,29 @@ def frame_corners(w, h, corners: dict = {}):
 
 
 # noinspection PyDefaultArgument,PyProtectedMember
+def load_huddle_estimator(trained_model_path: str) -> sklearn.pipeline.Pipeline:
+    """Load the pre-trained huddle estimator used by supervised_tagging.
+
+    Args:
+        trained_model_path (str): path indicating where all pretrained models are located
+
+    Returns:
+        huddle_estimator (sklearn.pipeline.Pipeline): pre-trained model to predict huddling
+
+    """
+    with open(
+        os.path.join(
+            trained_model_path,
+            "deepof_supervised",
+            "deepof_supervised_huddle_estimator.pkl",
+        ),
+        "rb",
+    ) as est:
+        huddle_estimator = pickle.load(est)
+
+    return huddle_estimator
+
+
 def supervised_tagging(
     coord_object: coordinates,
     raw_coords: table_dict,
@@ -525,6 +599,8 @@ def supervised_tagging(
     video: str,
     trained_model_path: str = None,
     params: dict = {},
+    huddle_estimator: sklearn.pipeline.Pipeline = None,
+    quality: table_dict = None,
 ) -> pd.DataFrame:
     """Output a dataframe with the registered motives per frame.
 
@@ -540,21 +616,16 @@ def supervised_tagging(
         video (str): string name of the experiment to tag
         trained_model_path (str): path indicating where all pretrained models are located
         params (dict): dictionary to overwrite the default values of the parameters of the functions that the rule-based pose estimation utilizes. See documentation for details.
+        huddle_estimator (sklearn.pipeline.Pipeline): pre-trained huddle estimator. If None (default), it is loaded from trained_model_path.
+        quality (deepof.data.table_dict): table_dict with tracking likelihoods. If None (default), it is retrieved from coord_object.
 
     Returns:
         tag_df (pandas.DataFrame): table with traits as columns and frames as rows. Each value is a boolean indicating trait detection at a given time
 
     """
-    # Load pre-trained models for ML annotated traits
-    with open(
-        os.path.join(
-            trained_model_path,
-            "deepof_supervised",
-            "deepof_supervised_huddle_estimator.pkl",
-        ),
-        "rb",
-    ) as est:
-        huddle_estimator = pickle.load(est)
+    # Load pre-trained models for ML annotated traits, if not provided
+    if huddle_estimator is None:
+        huddle_estimator = load_huddle_estimator(trained_model_path)
 
     # Extract useful information from coordinates object
     tracks = list(coord_object._tables.keys())
@@ -577,7 +648,9 @@ def supervised_tagging(
 
     # angs = angs[vid_name].reset_index(drop=True)
     speeds = speeds[vid_name].reset_index(drop=True)
-    likelihoods = coord_object.get_quality()[vid_name].reset_index(drop=True)
+    if quality is None:
+        quality = coord_object.get_quality()
+    likelihoods = quality[vid_name].reset_index(drop=True)
     arena_abs = coord_object._scales[vid_index][-1]
     arena_rel = coord_object._scales[vid_index][-2]
 
@@ -702,31 +775,21 @@ def supervised_tagging(
             )
 
             try:
+                following = following_path(
+                    dists,
+                    raw_coords,
+                    follower=animal_pair[0],
+                    followed=animal_pair[1],
+                    frames=params["follow_frames"],
+                    tol=params["follow_tol"],
+                    bidirectional=True,
+                )
                 tag_dict[
                     f"{animal_pair[0]}_{animal_pair[1]}_following"
-                ] = deepof.utils.smooth_boolean_array(
-                    following_path(
-                        dists,
-                        raw_coords,
-                        follower=animal_pair[0],
-                        followed=animal_pair[1],
-                        frames=params["follow_frames"],
-                        tol=params["follow_tol"],
-                    )
-                )
-
+                ] = deepof.utils.smooth_boolean_array(following[0])
                 tag_dict[
                     f"{animal_pair[1]}_{animal_pair[0]}_following"
-                ] = deepof.utils.smooth_boolean_array(
-                    following_path(
-                        dists,
-                        raw_coords,
-                        follower=animal_pair[1],
-                        followed=animal_pair[0],
-                        frames=params["follow_frames"],
-                        tol=params["follow_tol"],
-                    )
-                )
+                ] = deepof.utils.smooth_boolean_array(following[1])
             except KeyError:
                 pass
 
@@ -793,7 +856,7 @@ def tagged_video_output(
         video_output: List with the names of the videos to render, or 'all' (default) to render all videos.
         frame_limit: Number of frames to render per output video. If None, all frames are rendered.
         debug: If True, debugging information, such as arena fits and processed tracklets, are displayed.
-        n_jobs: Number of jobs to run in parallel.
+        n_jobs: Number of jobs to run in parallel. Non-positive values are resolved as in joblib, so -1 uses all CPU cores.
         params (dict): dictionary to overwrite the default values of the hyperparameters of the functions that the supervised pose estimation utilizes.
     """
 
@@ -806,6 +869,7 @@ def tagged_video_output(
             debug=debug,
             frame_limit=frame_limit,
             params=params,
+            n_jobs=frame_jobs,
         )
         pbar.update(1)
 
@@ -818,6 +882,10 @@ def tagged_video_output(
             "Video output must be either 'all' or a list with the names of the videos to render"
         )
 
+    # Spare jobs, if any, are used to render frames of each video in parallel
+    n_jobs = effective_n_jobs(n_jobs)
+    frame_jobs = max(1, n_jobs // len(vid_idxs))
+
     pbar = tqdm(total=len(vid_idxs))
     with parallel_backend("threading", n_jobs=n_jobs):
         Parallel()(delayed(output_video)(key) for key in vid_idxs)
@@ -14,8 +14,12 @@ For a detailed tutorial on how to use this module, see the advanced tutorials in
 # module deepof
 
 
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+from collections.abc import MutableMapping
 from difflib import get_close_matches
+from importlib import metadata
+from itertools import combinations
+from joblib import Parallel, delayed
 from pkg_resources import resource_filename
 from shapely.geometry import Polygon
 from shutil import rmtree
@@ -34,6 +38,9 @@ from typing import Any, NewType, Union
 from typing import Dict, List, Tuple, Any
 import copy
 import datetime
+import functools
+import hashlib
+import inspect
 import math
 import matplotlib.pyplot as plt
 import networkx as nx
@@ -41,9 +48,9 @@ import numpy as np
 import os
 import pandas as pd
 import pickle
-import pims
 import re
 import shutil
+import tempfile
 import tensorflow as tf
 import umap
 import warnings
@@ -59,6 +66,15 @@ project = NewType("deepof_project", Any)
 coordinates = NewType("deepof_coordinates", Any)
 table_dict = NewType("deepof_table_dict", Any)
 
+# Increase whenever changes to the processing code invalidate the outputs stored in existing processing caches
+PROCESSING_CACHE_VERSION = 1
+
+# Outputs of other versions of deepof are never reused either, since the processing code may have changed
+try:
+    _DEEPOF_VERSION = metadata.version("deepof")
+except metadata.PackageNotFoundError:  # pragma: no cover
+    _DEEPOF_VERSION = None
+
 
 # CLASSES FOR PREPROCESSING AND DATA WRANGLING
 
@@ -66,6 +82,9 @@ table_dict = NewType("deepof_table_dict", Any)
 def load_project(project_path: str) -> coordinates:  # pragma: no cover
     """Load a pre-saved pickled Coordinates object.
 
+    If the project was saved using an on-disk storage backend, only the metadata manifest is unpickled, and
+    individual tables are loaded lazily from disk on first access.
+
     Args:
         project_path (str): name of the file to load.
 
@@ -79,9 +98,466 @@ def load_project(project_path: str) -> coordinates:  # pragma: no cover
         coordinates = pickle.load(handle)
 
     coordinates._project_path = os.path.split(project_path)[0]
+
+    # Point all lazily loaded tables to the current location of the project
+    for attr in ["_tables", "_quality", "_distances", "_angles", "_areas"]:
+        tabs = getattr(coordinates, attr)
+        if isinstance(tabs, DiskTableDict):
+            tabs._root = os.path.join(project_path, "Coordinates")
+
     return coordinates
 
 
+def _cached_getter(getter):
+    """Cache the outputs of a Coordinates getter in a least-recently-used fashion.
+
+    Each experiment is cached independently, keyed on the getter, its normalized arguments, and the experiment ID.
+    Calls with unhashable arguments (such as propagated annotations) bypass the cache. All tables are copied both
+    when stored and when retrieved, so that modifying the returned values never affects the cache.
+
+    """
+    signature = inspect.signature(getter)
+
+    @functools.wraps(getter)
+    def wrapper(self, *args, **kwargs):
+
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        params = tuple(
+            (name, value) for name, value in bound.arguments.items() if name != "self"
+        )
+
+        try:
+            hash(params)
+        except TypeError:
+            return getter(self, *args, **kwargs)
+
+        if self._cache_size <= 0:
+            return getter(self, *args, **kwargs)
+
+        # The empty output is cached as well, to retrieve the metadata of the resulting TableDict
+        cache = self._feature_cache
+        keys = [(getter.__name__, params, None)] + [
+            (getter.__name__, params, exp) for exp in self._tables.keys()
+        ]
+
+        if all(key in cache for key in keys):
+            self._cache_hits += 1
+            for key in keys:
+                cache.move_to_end(key)
+
+            tabs = copy.copy(cache[keys[0]][0])
+            for key in keys[1:]:
+                tabs[key[2]] = cache[key][0].copy()
+
+            return tabs
+
+        self._cache_misses += 1
+        tabs = getter(self, *args, **kwargs)
+
+        shell = copy.copy(tabs)
+        shell.clear()
+
+        for key in keys:
+            value = shell if key[2] is None else tabs[key[2]].copy()
+            size = 0 if key[2] is None else value.memory_usage(index=True).sum()
+            cache[key] = (value, size)
+            cache.move_to_end(key)
+
+        # Evict least recently used entries until the cache fits within the memory budget
+        while sum(size for _, size in cache.values()) > self._cache_size * 1e6:
+            cache.popitem(last=False)
+
+        return tabs
+
+    return wrapper
+
+
+class DiskTableDict(MutableMapping):
+    """Dictionary-like object with experiment IDs as keys, which loads the corresponding tables from disk on first access.
+
+    Used by the on-disk storage backends of :class:`~deepof.data.Coordinates`. Each experiment is stored as an
+    independent dataset, so that only the tables that are actually used are ever loaded into memory. With the "npy"
+    backend, tables are memory-mapped instead of read, and copies are remapped in copy-on-write mode, so that memory
+    is only allocated for the values that are modified. Tables read from disk are shared between a store and all its
+    copies, so that each table is read at most once, regardless of how many copies access it.
+
+    """
+
+    def __init__(
+        self,
+        root: str,
+        name: str,
+        keys: list = None,
+        backend: str = "hdf5",
+        mmap_mode: str = "r",
+    ):
+        """Initialize a DiskTableDict object.
+
+        Args:
+            root (str): path to the folder containing the store. Updated when a project is loaded from a new location.
+            name (str): name of the store, relative to root.
+            keys (list): experiment IDs already present on disk.
+            backend (str): file format of the store. Must be one of "hdf5" (default) and "npy".
+            mmap_mode (str): memory-map mode used to open tables with the "npy" backend. Read-only by default.
+
+        """
+        self._root = root
+        self._name = name
+        self._keys = list(keys) if keys is not None else []
+        self._backend = backend
+        self._mmap_mode = mmap_mode
+        self._loaded = {}
+        self._unsaved = set()
+        self._disk_cache = {}
+        self._owns_cache = True
+
+    def _table_path(self, key: str) -> str:
+        """Return the path of the file storing the table of the given experiment."""
+        return os.path.join(
+            self._root,
+            self._name,
+            "{}.{}".format(key, ("h5" if self._backend == "hdf5" else "npy")),
+        )
+
+    def _read_table(self, key: str) -> pd.DataFrame:
+        """Read the table of the given experiment from disk. With the "npy" backend, values are mapped read-only."""
+        if self._backend == "hdf5":
+            return pd.read_hdf(self._table_path(key), key="table")
+
+        # Values are memory-mapped, and wrapped with the stored index and columns without copying
+        index, columns = pd.read_pickle(self._table_path(key)[:-4] + "_index.pkl")
+        return pd.DataFrame(
+            np.load(self._table_path(key), mmap_mode="r"),
+            index=index,
+            columns=columns,
+            copy=False,
+        )
+
+    def _load_table(self, key: str) -> pd.DataFrame:
+        """Load the saved table of the given experiment, reading it from disk only if no related store has done so."""
+        path = self._table_path(key)
+        if path not in self._disk_cache:
+            self._disk_cache[path] = self._read_table(key)
+        table = self._disk_cache[path]
+
+        if self._backend == "npy" and self._mmap_mode != "r":
+            # Remapping only reads the header of the file, and reuses the cached index and columns
+            return pd.DataFrame(
+                np.load(path, mmap_mode=self._mmap_mode),
+                index=table.index,
+                columns=table.columns,
+                copy=False,
+            )
+
+        if self._backend == "hdf5" and not self._owns_cache:
+            return table.copy()
+
+        return table
+
+    def _write_table(self, key: str):
+        """Write the table of the given experiment to disk."""
+        tab = self._loaded[key]
+
+        if self._backend == "hdf5":
+            with warnings.catch_warnings():
+                # Tuple column names (as in distances and angles) can't be mapped to c-types and get pickled instead
+                warnings.simplefilter("ignore", category=pd.errors.PerformanceWarning)
+                tab.to_hdf(self._table_path(key), key="table", mode="w")
+
+        else:
+            pd.to_pickle(
+                (tab.index, tab.columns), self._table_path(key)[:-4] + "_index.pkl"
+            )
+
+            # Write to a temporary file first, to avoid truncating files that may be currently memory-mapped
+            tmp_path = self._table_path(key)[:-4] + "_tmp.npy"
+            np.save(tmp_path, tab.to_numpy(dtype=float))
+            os.replace(tmp_path, self._table_path(key))
+
+    def create_table(self, key: str, index: pd.Index, columns: pd.Index) -> np.ndarray:
+        """Create an empty table on disk, which can be filled in place without loading it into memory.
+
+        Only supported by the "npy" backend. The table is registered in the store, and read from disk on first access.
+
+        Args:
+            key (str): experiment ID of the table to create.
+            index (pd.Index): index of the table.
+            columns (pd.Index): columns of the table.
+
+        Returns:
+            np.ndarray: writable memory-mapped array of shape (len(index), len(columns)), initialized to NaN.
+
+        """
+        if self._backend != "npy":  # pragma: no cover
+            raise NotImplementedError(
+                "Tables can only be created in place as npy files"
+            )
+
+        os.makedirs(os.path.join(self._root, self._name), exist_ok=True)
+        pd.to_pickle((index, columns), self._table_path(key)[:-4] + "_index.pkl")
+
+        if key not in self._keys:
+            self._keys.append(key)
+        self._loaded.pop(key, None)
+        self._unsaved.discard(key)
+        self._disk_cache.pop(self._table_path(key), None)
+
+        table = np.lib.format.open_memmap(
+            self._table_path(key),
+            mode="w+",
+            dtype=float,
+            shape=(len(index), len(columns)),
+        )
+        table[:] = np.nan
+
+        return table
+
+    def __getitem__(self, key):
+        """Return the table of the given experiment, loading it from disk if necessary."""
+        if key not in self._loaded:
+            if key not in self._keys:
+                raise KeyError(key)
+            self._loaded[key] = self._load_table(key)
+
+        return self._loaded[key]
+
+    def __setitem__(self, key, value):
+        """Set the table of the given experiment. Changes are kept in memory until the store is saved."""
+        if key not in self._keys:
+            self._keys.append(key)
+        self._loaded[key] = value
+        self._unsaved.add(key)
+
+    def __delitem__(self, key):
+        """Remove the given experiment from the store."""
+        self._keys.remove(key)
+        self._loaded.pop(key, None)
+        self._unsaved.discard(key)
+
+    def __iter__(self):
+        """Iterate over experiment IDs, in insertion order."""
+        return iter(self._keys)
+
+    def __len__(self):
+        """Return the number of stored experiments."""
+        return len(self._keys)
+
+    def __getstate__(self):
+        """Pickle only the metadata and the tables that have not been written to disk yet."""
+        state = self.__dict__.copy()
+        state["_loaded"] = {key: self._loaded[key] for key in self._unsaved}
+        del state["_disk_cache"], state["_owns_cache"]
+        return state
+
+    def __setstate__(self, state):
+        """Restore a pickled store, with an empty cache of tables read from disk."""
+        self.__dict__.update(state)
+        self._disk_cache = {}
+        self._owns_cache = True
+
+    def __deepcopy__(self, memo):
+        """Copy the store.
+
+        With the "npy" backend, saved tables are not copied, but remapped in copy-on-write mode on access.
+        Otherwise, all tables that are already loaded into memory are copied, and saved tables that are not are
+        copied from the shared cache of tables read from disk on access.
+
+        """
+        copied = DiskTableDict(
+            self._root,
+            self._name,
+            self._keys,
+            backend=self._backend,
+            mmap_mode=("c" if self._backend == "npy" else self._mmap_mode),
+        )
+        copied._loaded = copy.deepcopy(
+            (
+                {key: self._loaded[key] for key in self._unsaved}
+                if self._backend == "npy"
+                else self._loaded
+            ),
+            memo,
+        )
+        copied._unsaved = set(self._unsaved)
+        copied._disk_cache = self._disk_cache
+        copied._owns_cache = False
+        return copied
+
+    def save(self, root: str = None, name: str = None):
+        """Write all modified tables to disk.
+
+        Args:
+            root (str): path to the folder where to store the tables. If None, the current location is used.
+            name (str): name of the store, relative to root. If None, the current name is used.
+
+        """
+        to_write = self._unsaved
+        if (root is not None and root != self._root) or (
+            name is not None and name != self._name
+        ):
+            # Relocating the store requires all tables to be written to the new location
+            to_write = set(self._keys)
+            for key in to_write:
+                self[key]
+            self._root = root if root is not None else self._root
+            self._name = name if name is not None else self._name
+
+        os.makedirs(os.path.join(self._root, self._name), exist_ok=True)
+        for key in to_write:
+            self._write_table(key)
+
+            # Replace in-memory tables with their memory-mapped counterparts
+            self._disk_cache.pop(self._table_path(key), None)
+            if self._backend == "npy":
+                self._loaded[key] = self._load_table(key)
+
+        self._unsaved = set()
+
+
+class WindowedDataset:
+    """Lazy sliding-window dataset over a set of per-video 2D arrays.
+
+    Returned by :meth:`~deepof.data.TableDict.preprocess` when lazy=True. Instead of materializing a
+    (instances, window_size, features) array, only an index of (video, start) pairs is stored, and windows are
+    gathered from the underlying arrays on access. Indexing with an integer, slice, or array of positions returns the
+    corresponding windows as a dense numpy array; use :meth:`batches` or :meth:`to_tf_dataset` to iterate over all of
+    them without holding the whole set in memory.
+
+    """
+
+    def __init__(
+        self,
+        tables: list,
+        window_size: int,
+        window_step: int = 1,
+        index: np.ndarray = None,
+    ):
+        """Initialize a WindowedDataset object.
+
+        Args:
+            tables (list): list of 2D arrays of shape (frames, features), one per video.
+            window_size (int): number of frames per window.
+            window_step (int): number of frames between the starts of consecutive windows within a video.
+            index (np.ndarray): array of shape (instances, 2), with the video and first frame of each window. If None (default), all windows of all videos are indexed in order.
+
+        """
+        self.tables = list(tables)
+        self.window_size = window_size
+        self.window_step = window_step
+
+        if index is None:
+            starts = [
+                np.arange(0, tab.shape[0] - window_size + 1, window_step)
+                for tab in self.tables
+            ]
+            index = np.stack(
+                [
+                    np.repeat(np.arange(len(starts)), [len(i) for i in starts]),
+                    np.concatenate(starts + [np.array([], dtype=int)]),
+                ],
+                axis=1,
+            ).astype(int)
+
+        self.index = index
+
+    @property
+    def shape(self) -> tuple:
+        """Shape of the equivalent dense (instances, window_size, features) array."""
+        return len(self), self.window_size, self.tables[0].shape[1]
+
+    def __len__(self):
+        """Return the number of windows in the dataset."""
+        return self.index.shape[0]
+
+    def __getitem__(self, idx) -> np.ndarray:
+        """Gather the selected windows from the underlying per-video arrays."""
+        index = self.index[idx]
+        if index.ndim == 1:
+            video, start = index
+            return self.tables[video][start : start + self.window_size]
+
+        windows = np.empty(
+            (index.shape[0], self.window_size, self.tables[0].shape[1]),
+            dtype=self.tables[0].dtype,
+        )
+        offsets = np.arange(self.window_size)
+        for video in np.unique(index[:, 0]):
+            in_video = index[:, 0] == video
+            windows[in_video] = self.tables[video][
+                index[in_video, 1][:, np.newaxis] + offsets
+            ]
+
+        return windows
+
+    def take(self, indices: np.ndarray) -> "WindowedDataset":
+        """Return a new lazy dataset with the selected windows, in the given order. Useful for shuffling and subsetting.
+
+        Args:
+            indices (np.ndarray): positions of the windows to keep.
+
+        Returns:
+            WindowedDataset: dataset sharing the underlying arrays with the current one.
+
+        """
+        return WindowedDataset(
+            self.tables, self.window_size, self.window_step, self.index[indices]
+        )
+
+    def batches(
+        self, batch_size: int, shuffle: bool = False, labels: np.ndarray = None
+    ):
+        """Iterate over the dataset in dense batches.
+
+        Args:
+            batch_size (int): number of windows per batch. The last batch may be smaller.
+            shuffle (bool): whether to visit windows in a random order. Defaults to False.
+            labels (np.ndarray): optional array with one row per window. If provided, (windows, labels) tuples are yielded.
+
+        Yields:
+            np.ndarray: batch of shape (batch_size, window_size, features), or a tuple with the corresponding labels.
+
+        """
+        order = np.random.permutation(len(self)) if shuffle else np.arange(len(self))
+        for start in range(0, len(self), batch_size):
+            batch = order[start : start + batch_size]
+            if labels is None:
+                yield self[batch]
+            else:
+                yield self[batch], labels[batch]
+
+    def to_tf_dataset(
+        self, batch_size: int, shuffle: bool = False, labels: np.ndarray = None
+    ) -> tf.data.Dataset:
+        """Wrap the dataset in a tf.data.Dataset, which gathers batches of windows as they are consumed.
+
+        Args:
+            batch_size (int): number of windows per batch. The last batch may be smaller.
+            shuffle (bool): whether to visit windows in a different random order on each pass. Defaults to False.
+            labels (np.ndarray): optional array with one row per window. If provided, (windows, labels) tuples are yielded.
+
+        Returns:
+            tf.data.Dataset: dataset yielding float32 batches.
+
+        """
+        signature = tf.TensorSpec(shape=(None, *self.shape[1:]), dtype=tf.float32)
+        if labels is not None:
+            signature = (
+                signature,
+                tf.TensorSpec(shape=(None, *labels.shape[1:]), dtype=tf.float32),
+            )
+
+        def generator():
+            """Cast each batch to float32, as expected by the models."""
+            for batch in self.batches(batch_size, shuffle, labels):
+                if labels is None:
+                    yield batch.astype(np.float32)
+                else:
+                    yield batch[0].astype(np.float32), batch[1].astype(np.float32)
+
+        return tf.data.Dataset.from_generator(generator, output_signature=signature)
+
+
 class Project:
     """Class for loading and preprocessing DLC data of individual and multiple animals.
 
@@ -93,20 +569,27 @@ class Project:
         self,
         animal_ids: List = None,
         arena: str = "polygonal-manual",
+        arena_detection_frames: int = None,
         bodypart_graph: str = "deepof_14",
+        cache_size: int = 1024,
+        chunk_size: int = None,
         enable_iterative_imputation: bool = 250,
         exclude_bodyparts: List = tuple([""]),
         exp_conditions: dict = None,
+        imputation_engine: str = "iterative",
         interpolate_outliers: bool = True,
         interpolation_limit: int = 5,
         interpolation_std: int = 3,
         likelihood_tol: float = 0.75,
         model: str = "mouse_topview",
+        n_jobs: int = 1,
+        processing_cache_path: str = None,
         project_name: str = "deepof_project",
         project_path: str = os.path.join("."),
         video_path: str = None,
         table_path: str = None,
         smooth_alpha: float = 1,
+        storage: str = "pickle",
         table_format: str = "autodetect",
         video_format: str = ".mp4",
         video_scale: int = 1,
@@ -116,20 +599,27 @@ class Project:
         Args:
             animal_ids (list): list of animal ids.
             arena (str): arena type. Can be one of "circular-autodetect", "circular-manual", or "polygon-manual".
+            arena_detection_frames (int): if provided, circular arenas are autodetected on the given number of frames, evenly spaced across each video and downsampled to at most 640 pixels per side, instead of on the first 500 full-resolution frames. Defaults to None.
             bodypart_graph (str): body part scheme to use for the analysis. Defaults to None, in which case the program will attempt to select it automatically based on the available body parts.
+            cache_size (int): maximum memory (in MB) used by the resulting Coordinates object to cache the outputs of its getters, so that repeated calls with the same arguments are not recomputed. Set to 0 to disable caching.
+            chunk_size (int): if provided, tables are streamed from disk in chunks of the given number of frames, and written straight to the on-disk store, so that memory usage while loading is proportional to chunk_size instead of video length. Recommended for very long recordings. Requires storage to be set to "npy". Defaults to None (each table is loaded at once).
             enable_iterative_imputation (bool): whether to use iterative imputation for occluded body parts. Recommended if several animals are present, but slower.
             exclude_bodyparts (list): list of bodyparts to exclude from analysis.
             exp_conditions (dict): dictionary with experiment IDs as keys and experimental conditions as values.
+            imputation_engine (str): strategy used for iterative imputation, if enabled. Must be one of "iterative" (default), which fits an independent model per animal and video, or "pooled", which fits a single model per animal on frames sampled across all videos, and applies it to each of them. The latter scales better with the number of videos.
             interpolate_outliers (bool): whether to interpolate missing data.
             interpolation_limit (int): maximum number of missing frames to interpolate.
             interpolation_std (int): maximum number of standard deviations to interpolate.
             likelihood_tol (float): likelihood threshold for outlier detection.
             model (str): model to use for pose estimation. Defaults to 'mouse_topview' (as described in the documentation).
+            n_jobs (int): number of videos to load and preprocess in parallel. Defaults to 1 (sequential). Set to -1 to use all available cores.
+            processing_cache_path (str): if provided, intermediate results of each video (preprocessed tables, arenas, distances, angles and areas) are cached in the given folder, keyed on the contents of the raw tables and on the parameters each stage depends on. Re-creating a project then only recomputes the stages affected by changed inputs or parameters. Defaults to None (no caching).
             project_name (str): name of the current project.
             project_path (str): path to the folder containing the DLC output data.
             video_path (str): path where to find the videos to use. If not specified, deepof, assumes they are in your project path.
             table_path (str): path where to find the tracks to use. If not specified, deepof, assumes they are in your project path.
             smooth_alpha (float): smoothing intensity. The higher the value, the more smoothing.
+            storage (str): storage backend for the processed coordinates. Must be one of "pickle" (default), which stores the whole object in a single file, "hdf5", which stores each table independently and loads them lazily, or "npy", which stores each table as a memory-mapped array, avoiding copies when retrieving data.
             table_format (str): format of the table. Defaults to 'autodetect', but can be set to "csv" or "h5".
             video_format (str): video format. Defaults to '.mp4'.
             video_scale (int): diameter of the arena in mm (if the arena is round) or length of the first specified arena side (if the arena is polygonal).
@@ -170,6 +660,7 @@ class Project:
 
         # Loads arena details and (if needed) detection models
         self.arena = arena
+        self.arena_detection_frames = arena_detection_frames
         self.arena_dims = video_scale
         self.ellipse_detection = None
 
@@ -182,13 +673,20 @@ class Project:
         self.distances = "all"
         self.ego = False
         self.exp_conditions = exp_conditions
+        self.imputation_engine = imputation_engine
         self.interpolate_outliers = interpolate_outliers
         self.interpolation_limit = interpolation_limit
         self.interpolation_std = interpolation_std
         self.likelihood_tolerance = likelihood_tol
         self.model = model
+        self.n_jobs = n_jobs
+        self.processing_cache_path = processing_cache_path
         self.smooth_alpha = smooth_alpha
+        self.storage = storage
+        self.cache_size = cache_size
+        self.chunk_size = chunk_size
         self.frame_rate = None
+        self.video_metadata = {}
         self.video_format = video_format
         self.enable_iterative_imputation = enable_iterative_imputation
         self.exclude_bodyparts = exclude_bodyparts
@@ -274,47 +772,669 @@ class Project:
                 "Project already exists. Delete it or specify a different name."
             )  # pragma: no cover
 
-    @property
-    def distances(self):
-        """List. If not 'all', sets the body parts among which the distances will be computed."""
-        return self._distances
+    @property
+    def distances(self):
+        """List. If not 'all', sets the body parts among which the distances will be computed."""
+        return self._distances
+
+    @property
+    def ego(self):
+        """String, name of a body part. If True, computes only the distances between the specified body part and the rest."""
+        return self._ego
+
+    @property
+    def angles(self):
+        """Bool. Toggles angle computation. True by default. If turned off, enhances performance for big datasets."""
+        return self._angles
+
+    def _get_table_cache_keys(self) -> dict:
+        """Return processing cache keys for the preprocessed table of each experiment, with experiment IDs as keys.
+
+        Keys combine a hash of the contents of each raw table with all parameters that affect its preprocessing. If
+        pooled imputation is enabled, each table depends on all others, and all raw tables are hashed together.
+
+        """
+        raw_hashes = {}
+        for tab in self.tables:
+            file_hash = hashlib.sha256()
+            with open(os.path.join(self.table_path, tab), "rb") as handle:
+                for block in iter(lambda: handle.read(2**20), b""):
+                    file_hash.update(block)
+            raw_hashes[self._get_experiment_id(tab)] = file_hash.hexdigest()
+
+        params = (
+            self.animal_ids,
+            self.chunk_size,
+            self.enable_iterative_imputation,
+            tuple(self.exclude_bodyparts),
+            self.frame_rate,
+            self.imputation_engine,
+            self.interpolate_outliers,
+            self.interpolation_limit,
+            self.interpolation_std,
+            self.likelihood_tolerance,
+            self.smooth_alpha,
+        )
+        if self.enable_iterative_imputation and self.imputation_engine == "pooled":
+            params += (sorted(raw_hashes.values()),)
+
+        return {
+            exp_id: hashlib.sha256(repr((raw_hash, params)).encode()).hexdigest()
+            for exp_id, raw_hash in raw_hashes.items()
+        }
+
+    def _from_processing_cache(
+        self, stage: str, exp_id: str, params: tuple, compute: callable
+    ) -> Any:
+        """Retrieve the output of a processing stage for a single experiment from the processing cache.
+
+        If the output is not cached yet, it is computed and stored. If no processing cache path was specified, or if the
+        experiment was not loaded by the current project, the output is computed directly.
+
+        Args:
+            stage (str): name of the processing stage.
+            exp_id (str): experiment ID.
+            params (tuple): parameters of the processing stage, other than the preprocessed table of the experiment.
+            compute (callable): function with no arguments computing the output of the stage.
+
+        Returns:
+            Output of compute, either cached or computed.
+
+        """
+        table_key = getattr(self, "_table_cache_keys", {}).get(exp_id)
+        if self.processing_cache_path is None or table_key is None:
+            return compute()
+
+        key = hashlib.sha256(
+            repr(
+                (PROCESSING_CACHE_VERSION, _DEEPOF_VERSION, table_key, params)
+            ).encode()
+        ).hexdigest()
+        cache_file = os.path.join(self.processing_cache_path, stage, key + ".pkl")
+        if os.path.exists(cache_file):
+            return pd.read_pickle(cache_file)
+
+        output = compute()
+
+        # Write to a uniquely named temporary file first, so that interrupted runs never leave corrupted entries
+        # behind, and concurrent workers computing the same entry never write to the same file
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(cache_file), suffix=".tmp", delete=False
+        ) as handle:
+            pickle.dump(output, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(handle.name, cache_file)
+
+        return output
+
+    def get_video_metadata(self) -> dict:
+        """Return the frame rate, number of frames and resolution of each video, with video names as keys.
+
+        Metadata is read from the video containers in parallel (using n_jobs threads), without decoding any frames, and
+        kept in the project, so that each video is only probed once.
+
+        Returns:
+            video_metadata (dict): dictionary with video names as keys, and metadata as returned by
+            deepof.utils.get_video_metadata as values.
+
+        """
+        to_probe = [video for video in self.videos if video not in self.video_metadata]
+
+        probed = Parallel(n_jobs=self.n_jobs, prefer="threads")(
+            delayed(deepof.utils.get_video_metadata)(
+                os.path.join(self.video_path, video)
+            )
+            for video in to_probe
+        )
+        self.video_metadata.update(zip(to_probe, probed))
+
+        return {video: self.video_metadata[video] for video in self.videos}
+
+    def get_arena(self, tables: list, verbose: bool = False) -> np.array:
+        """Return the arena as recognised from the videos.
+
+        Args:
+            tables (list): list of coordinate tables
+            verbose (bool): if True, logs to console
+
+        Returns:
+            arena (np.ndarray): arena parameters, as recognised from the videos. The shape depends on the arena type
+
+        """
+        if verbose:
+            print("Detecting arena...")
+
+        # Autodetected arenas are recognised on downsampled frames when subsampling
+        detection_kwargs = {
+            "sample_frames": self.arena_detection_frames,
+            "max_size": (640 if self.arena_detection_frames is not None else None),
+        }
+
+        video_metadata = self.get_video_metadata()
+
+        if self.processing_cache_path is None or not self.arena:
+            return deepof.utils.get_arenas(
+                self.arena,
+                self.arena_dims,
+                self.project_path,
+                self.project_name,
+                tables,
+                self.videos,
+                n_jobs=self.n_jobs,
+                video_metadata=list(video_metadata.values()),
+                **detection_kwargs,
+            )
+
+        def detect_arena(key: str, tab: pd.DataFrame, video: str) -> list:
+            """Detect the arena of a single video."""
+            return [
+                output[0]
+                for output in deepof.utils.get_arenas(
+                    self.arena,
+                    self.arena_dims,
+                    self.project_path,
+                    self.project_name,
+                    {key: tab},
+                    [video],
+                    video_metadata=[video_metadata[video]],
+                    **detection_kwargs,
+                )
+            ]
+
+        def cached_arena(key: str, tab: pd.DataFrame, video: str) -> list:
+            """Detect the arena of a single video, or retrieve it from the processing cache."""
+            video_path = os.path.join(
+                self.project_path, self.project_name, "Videos", video
+            )
+            return self._from_processing_cache(
+                "arenas",
+                key,
+                (
+                    self.arena,
+                    self.arena_dims,
+                    self.arena_detection_frames,
+                    video,
+                    os.path.getsize(video_path),
+                    os.path.getmtime(video_path),
+                ),
+                functools.partial(detect_arena, key, tab, video),
+            )
+
+        # Detect arenas one video at a time, so that each of them can be cached independently. Only autodetection
+        # runs in parallel, since manual arena selection is interactive
+        arenas = Parallel(
+            n_jobs=(self.n_jobs if self.arena == "circular-autodetect" else 1),
+            prefer="threads",
+        )(
+            delayed(cached_arena)(key, tab, video)
+            for (key, tab), video in zip(tables.items(), self.videos)
+        )
+
+        scales, arena_params, video_resolution = (list(i) for i in zip(*arenas))
+        return np.array(scales), arena_params, video_resolution
+
+    @staticmethod
+    def _get_experiment_id(tab: str) -> str:
+        """Return the experiment ID of the given table, removing the DLC suffix from its name."""
+        try:
+            return deepof.utils.re.findall("(.*?)DLC", tab)[0]
+        except IndexError:
+            return tab
+
+    def _get_file_signatures(self) -> dict:
+        """Return the size and modification time of the table and video of each experiment, with experiment IDs as keys.
+
+        Used to detect new or modified experiments when updating an existing project.
+
+        """
+        return {
+            self._get_experiment_id(tab): tuple(
+                (os.path.getsize(path), os.path.getmtime(path))
+                for path in [
+                    os.path.join(self.table_path, tab),
+                    os.path.join(self.video_path, vid),
+                ]
+            )
+            for tab, vid in zip(self.tables, self.videos)
+        }
+
+    def _read_table_columns(self, tab: str) -> pd.MultiIndex:
+        """Read the header levels of a single DLC table, without loading its values.
+
+        Args:
+            tab (str): name of the table to load, relative to the table path.
+
+        Returns:
+            pd.MultiIndex: ("individuals",) "bodyparts" and "coords" column levels of the table.
+
+        """
+        if self.table_format == ".h5":
+            columns = pd.read_hdf(os.path.join(self.table_path, tab), stop=1).columns
+
+        else:
+            # Header levels are stored as the first rows, with their names in the first column
+            first_cells = pd.read_csv(
+                os.path.join(self.table_path, tab), header=None, nrows=4, usecols=[0]
+            ).iloc[:, 0]
+            n_levels = first_cells.isin(
+                ["scorer", "individuals", "bodyparts", "coords"]
+            ).sum()
+            columns = pd.read_csv(
+                os.path.join(self.table_path, tab),
+                header=list(range(n_levels)),
+                index_col=0,
+                nrows=0,
+            ).columns
+
+        return columns.droplevel("scorer")
+
+    def _read_table(self, tab: str, nrows: int = None) -> pd.DataFrame:
+        """Read a single DLC table from disk, parsing header levels and values separately.
+
+        Values are read directly as a contiguous float array, without object-dtype intermediates.
+
+        Args:
+            tab (str): name of the table to load, relative to the table path.
+            nrows (int): if provided, only the specified number of rows is read.
+
+        Returns:
+            pd.DataFrame: raw table with ("bodyparts", "coords") column levels, and a default integer index. Multi-animal
+            tables are merged into "individual_bodypart" body parts.
+
+        """
+        if self.table_format == ".h5":
+            loaded_tab = pd.read_hdf(os.path.join(self.table_path, tab), stop=nrows)
+            columns = loaded_tab.columns.droplevel("scorer")
+            values = loaded_tab.to_numpy(dtype=float)
+
+        else:
+            columns = self._read_table_columns(tab)
+            values = pd.read_csv(
+                os.path.join(self.table_path, tab),
+                header=None,
+                index_col=0,
+                skiprows=columns.nlevels + 1,
+                nrows=nrows,
+                float_precision="round_trip",
+            ).to_numpy(dtype=float)
+
+        return pd.DataFrame(values, columns=self._merge_individuals(columns))
+
+    @staticmethod
+    def _merge_individuals(columns: pd.MultiIndex) -> pd.MultiIndex:
+        """Merge the individuals and bodyparts levels of multi-animal DLC tables, as "individual_bodypart"."""
+        if "individuals" in columns.names:
+            columns = pd.MultiIndex.from_arrays(
+                [
+                    columns.get_level_values("individuals")
+                    + "_"
+                    + columns.get_level_values("bodyparts"),
+                    columns.get_level_values("coords"),
+                ]
+            )
+
+        return columns.set_names(["bodyparts", "coords"])
+
+    def _get_time_index(self, n_frames: int) -> pd.Index:
+        """Return a time-based index for a table with the given number of frames, using the project frame rate."""
+        return pd.timedelta_range(
+            "00:00:00",
+            pd.to_timedelta((n_frames // self.frame_rate), unit="sec"),
+            periods=n_frames + 1,
+            closed="left",
+        ).map(lambda t: str(t)[7:])
+
+    @staticmethod
+    def _split_likelihood(tab: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Split a DLC table into a sorted table of x, y coordinates, and a table of likelihoods per body part."""
+        x = tab.xs("x", level="coords", axis=1, drop_level=False)
+        y = tab.xs("y", level="coords", axis=1, drop_level=False)
+        lik = tab.xs("likelihood", level="coords", axis=1, drop_level=True).fillna(0.0)
+
+        return pd.concat([x, y], axis=1).sort_index(axis=1), lik
+
+    def _drop_excluded_bodyparts(self, tab: pd.DataFrame) -> pd.DataFrame:
+        """Remove the body parts specified in exclude_bodyparts from the given table of coordinates."""
+        if self.exclude_bodyparts != tuple([""]):
+            temp = tab.drop(self.exclude_bodyparts, axis=1, level="bodyparts")
+            temp.sort_index(axis=1, inplace=True)
+            temp.columns = pd.MultiIndex.from_product(
+                [sorted(list(set([i[j] for i in temp.columns]))) for j in range(2)]
+            )
+            tab = temp.sort_index(axis=1)
+
+        return tab
+
+    def _iter_table_chunks(self, tab: str, chunk_size: int, skiprows: int = 0):
+        """Read a DLC table in chunks, without loading it into memory at once.
+
+        Args:
+            tab (str): name of the table to load, relative to the table path.
+            chunk_size (int): number of frames to read at a time.
+            skiprows (int): number of header lines to skip, for tables in csv format.
+
+        Yields:
+            np.ndarray: float array with the raw values of each chunk, with columns in the same order as in the file.
+
+        """
+        if self.table_format == ".h5":
+            with pd.HDFStore(os.path.join(self.table_path, tab), mode="r") as store:
+                key = store.keys()[0]
+                start = 0
+                while True:
+                    chunk = store.select(key, start=start, stop=start + chunk_size)
+                    if chunk.shape[0] == 0:
+                        break
+                    yield chunk.to_numpy(dtype=float)
+                    start += chunk_size
+
+        else:
+            for chunk in pd.read_csv(
+                os.path.join(self.table_path, tab),
+                index_col=0,
+                header=None,
+                skiprows=skiprows,
+                chunksize=chunk_size,
+                float_precision="round_trip",
+            ):
+                yield chunk.to_numpy(dtype=float)
+
+    def _iter_table_windows(self, tab: str, skiprows: int, halo: int):
+        """Read a DLC table in chunks of chunk_size frames, padding each chunk with halo frames on each side.
+
+        Args:
+            tab (str): name of the table to load, relative to the table path.
+            skiprows (int): number of header lines to skip, for tables in csv format.
+            halo (int): number of neighbouring frames to include on each side of each chunk, when available.
+
+        Yields:
+            Tuple: global index of the first frame of the chunk, padded chunk, and slice selecting the chunk within it.
+
+        """
+        return deepof.utils.iter_padded_chunks(
+            self._iter_table_chunks(tab, max(self.chunk_size, halo), skiprows=skiprows),
+            halo,
+        )
+
+    def _stream_single_table(self, tab: str) -> Tuple[str, None, None]:
+        """Load and preprocess a single DLC table in chunks, writing the results straight to the on-disk store.
+
+        Memory usage is proportional to chunk_size instead of video length. Each chunk is padded with its neighbouring
+        frames, so that smoothing and outlier detection are identical to processing the whole table at once. Outlier
+        thresholds are computed over the whole table in a first pass, and interpolation is carried over chunk boundaries.
+        If iterative imputation is enabled with the "iterative" engine, imputation models are fitted per chunk. With the
+        "pooled" engine, imputation is applied once all tables are loaded.
+
+        Args:
+            tab (str): name of the table to load, relative to the table path.
+
+        Returns:
+            Tuple: experiment ID of the given table. Processed coordinates and likelihoods are stored on disk.
+
+        """
+        tab_name = self._get_experiment_id(tab)
+
+        lag, limit, w_length = 5, self.interpolation_limit, 15
+        halo = 2 * w_length + lag
+
+        # Skip the scorer, (individuals,) bodyparts and coords rows in csv files
+        header = self._read_table_columns(tab)
+        skiprows = header.nlevels + 1
+
+        # Retrieve the column layout of the processed tables, by passing an empty table through the pipeline
+        raw_columns = self._merge_individuals(header)
+
+        coords, lik = self._split_likelihood(
+            pd.DataFrame(np.zeros([0, len(raw_columns)]), columns=raw_columns)
+        )
+        coords = self._drop_excluded_bodyparts(coords)
+        coord_idx = raw_columns.get_indexer(coords.columns)
+        lik_idx = raw_columns.get_indexer([(bp, "likelihood") for bp in lik.columns])
+        bpart_idx = lik.columns.get_indexer([col[0] for col in coords.columns])
+
+        def preprocess_window(window, at_start, at_end):
+            cur_coords = window[:, coord_idx]
+            cur_lik = np.nan_to_num(window[:, lik_idx], nan=0.0)
+            if self.smooth_alpha:
+                cur_coords = deepof.utils.smooth_padded_chunk(
+                    cur_coords, self.smooth_alpha, w_length, at_start, at_end
+                )
+            residuals = cur_coords - deepof.utils.moving_average(cur_coords, lag)
+            return cur_coords, cur_lik, residuals
+
+        # First pass: count frames, and compute outlier thresholds over the whole table
+        n_frames, held, statistics = 0, np.zeros([0, len(coord_idx)]), None
+
+        for start, window, core in self._iter_table_windows(tab, skiprows, halo):
+            n_frames += len(window[core])
+
+            if not self.interpolate_outliers:
+                continue
+
+            # Outlier thresholds ignore the first and last lag frames. The latter are held until the end is reached
+            residuals = preprocess_window(window, start == 0, core.stop is None)[2][
+                core
+            ]
+            residuals = np.concatenate([held, residuals[max(0, lag - start) :]])
+            residuals, held = residuals[:-lag], residuals[-lag:]
+            statistics = deepof.utils.update_residual_statistics(residuals, statistics)
+
+        if self.interpolate_outliers:
+            thresholds = deepof.utils.residual_thresholds(
+                statistics, self.interpolation_std
+            )
+
+        # Second pass: smooth, mask outliers and interpolate, writing results directly to disk
+        index = (
+            self._get_time_index(n_frames)
+            if self.frame_rate is not None
+            else pd.RangeIndex(n_frames)
+        )
+        root = os.path.join(self.project_path, self.project_name, "Coordinates")
+        out_coords = DiskTableDict(
+            root, os.path.join("deepof_coordinates", "tables"), backend="npy"
+        ).create_table(tab_name, index, coords.columns)
+        out_lik = DiskTableDict(
+            root, os.path.join("deepof_coordinates", "quality"), backend="npy"
+        ).create_table(tab_name, index, lik.columns)
+
+        interpolation_state, first_frames = None, None
+
+        for start, window, core in self._iter_table_windows(tab, skiprows, halo):
+            cur_coords, cur_lik, residuals = (
+                arr[core]
+                for arr in preprocess_window(window, start == 0, core.stop is None)
+            )
+            n_cur = len(cur_coords)
+            out_lik[start : start + n_cur] = cur_lik
+
+            if not self.interpolate_outliers:
+                out_coords[start : start + n_cur] = cur_coords
+                continue
+
+            if start == 0:
+                first_frames = cur_coords[:lag].copy()
+
+            # Mark outliers in either coordinate, or with low likelihood, and interpolate them across chunks
+            masked = np.where(
+                deepof.utils.outlier_mask_from_residuals(
+                    residuals,
+                    thresholds,
+                    cur_lik < self.likelihood_tolerance,
+                    bpart_idx,
+                    mode="or",
+                ),
+                np.nan,
+                cur_coords,
+            )
+            out_coords[start : start + n_cur] = masked
+            interpolation_state = deepof.utils.interpolate_gaps(
+                masked,
+                out_coords,
+                start=start,
+                limit=limit,
+                state=interpolation_state,
+                last=core.stop is None,
+            )
+
+        if self.interpolate_outliers:
+            # Keep original values before lag
+            out_coords[:lag] = first_frames
+
+        # Third pass: impute occluded body parts and remove missing animals, chunk by chunk
+        for start in range(0, n_frames, self.chunk_size):
+            stop = min(start + self.chunk_size, n_frames)
+            cur_coords = pd.DataFrame(
+                np.array(out_coords[start:stop]),
+                index=index[start:stop],
+                columns=coords.columns,
+            )
+            cur_lik = TableDict(
+                {
+                    tab_name: pd.DataFrame(
+                        np.array(out_lik[start:stop]),
+                        index=index[start:stop],
+                        columns=lik.columns,
+                    )
+                },
+                typ="quality",
+                animal_ids=self.animal_ids,
+            )
+
+            if (
+                self.enable_iterative_imputation
+                and self.imputation_engine == "iterative"
+            ):
+                cur_coords = deepof.utils.iterative_imputation(
+                    self, {tab_name: cur_coords}, cur_lik
+                )[tab_name]
+
+            out_coords[start:stop] = deepof.utils.set_missing_animals(
+                self, {tab_name: cur_coords}, cur_lik
+            )[tab_name].to_numpy()
+
+        out_coords.flush()
+        out_lik.flush()
+
+        return tab_name, None, None
+
+    def _impute_streamed_table(
+        self,
+        tab_dict: DiskTableDict,
+        lik_dict: DiskTableDict,
+        tab_name: str,
+        imputers: dict,
+    ):
+        """Impute occluded body parts of a streamed table in place, chunk by chunk, using pooled imputation models.
+
+        Args:
+            tab_dict (DiskTableDict): on-disk store with the processed coordinates.
+            lik_dict (DiskTableDict): on-disk store with the DLC likelihoods.
+            tab_name (str): experiment ID of the table to impute.
+            imputers (dict): imputation models per animal, as returned by deepof.utils.fit_pooled_imputer.
+
+        """
+        coords, lik = tab_dict[tab_name], lik_dict[tab_name]
+        out_coords = np.load(tab_dict._table_path(tab_name), mmap_mode="r+")
+
+        for start in range(0, coords.shape[0], self.chunk_size):
+            stop = min(start + self.chunk_size, coords.shape[0])
+            cur_lik = TableDict(
+                {tab_name: lik.iloc[start:stop]},
+                typ="quality",
+                animal_ids=self.animal_ids,
+            )
+            out_coords[start:stop] = deepof.utils.pooled_imputation(
+                self, {tab_name: coords.iloc[start:stop]}, cur_lik, imputers
+            )[tab_name].to_numpy()
+
+        out_coords.flush()
+
+    def _load_single_table(self, tab: str) -> Tuple[str, pd.DataFrame, pd.DataFrame]:
+        """Load and preprocess a single DLC table. Runs independently per video, to enable parallelization.
+
+        Applies the whole preprocessing chain (reading, smoothing, outlier interpolation and iterative imputation)
+        to the specified table, using the settings of the current project.
+
+        Args:
+            tab (str): name of the table to load, relative to the table path.
+
+        Returns:
+            Tuple: experiment ID, processed coordinates, and DLC likelihoods of the given table.
+
+        """
+        if self.chunk_size is not None:
+            return self._stream_single_table(tab)
 
-    @property
-    def ego(self):
-        """String, name of a body part. If True, computes only the distances between the specified body part and the rest."""
-        return self._ego
+        # Remove the DLC suffix from the table name
+        tab_name = self._get_experiment_id(tab)
 
-    @property
-    def angles(self):
-        """Bool. Toggles angle computation. True by default. If turned off, enhances performance for big datasets."""
-        return self._angles
+        tab, lik = self._from_processing_cache(
+            "tables", tab_name, (), lambda: self._preprocess_table(tab_name, tab)
+        )
 
-    def get_arena(self, tables: list, verbose: bool = False) -> np.array:
-        """Return the arena as recognised from the videos.
+        return tab_name, tab, lik
+
+    def _preprocess_table(
+        self, tab_name: str, tab: str
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Read and preprocess a single DLC table, applying smoothing, outlier interpolation and iterative imputation.
 
         Args:
-            tables (list): list of coordinate tables
-            verbose (bool): if True, logs to console
+            tab_name (str): experiment ID of the given table.
+            tab (str): name of the table to load, relative to the table path.
 
         Returns:
-            arena (np.ndarray): arena parameters, as recognised from the videos. The shape depends on the arena type
+            Tuple: processed coordinates, and DLC likelihoods of the given table.
 
         """
-        if verbose:
-            print("Detecting arena...")
+        tab = self._read_table(tab)
 
-        return deepof.utils.get_arenas(
-            self.arena,
-            self.arena_dims,
-            self.project_path,
-            self.project_name,
-            tables,
-            self.videos,
-        )
+        # Pass a time-based index, if specified in init
+        if self.frame_rate is not None:
+            tab.index = self._get_time_index(tab.shape[0])
+
+        tab, lik = self._split_likelihood(tab)
+
+        if self.smooth_alpha:
+            cur_idx = tab.index
+            cur_cols = tab.columns
+            smooth = pd.DataFrame(
+                deepof.utils.smooth_mult_trajectory(
+                    np.array(tab), alpha=self.smooth_alpha, w_length=15
+                )
+            ).reset_index(drop=True)
+            smooth.columns = cur_cols
+            smooth.index = cur_idx
+            tab = smooth
+
+        tab = self._drop_excluded_bodyparts(tab)
+
+        if self.interpolate_outliers:
+            tab = deepof.utils.interpolate_outliers(
+                tab,
+                lik,
+                likelihood_tolerance=self.likelihood_tolerance,
+                mode="or",
+                limit=self.interpolation_limit,
+                n_std=self.interpolation_std,
+            )
+
+        if self.enable_iterative_imputation and self.imputation_engine == "iterative":
+            tab = deepof.utils.iterative_imputation(
+                self,
+                {tab_name: tab},
+                TableDict({tab_name: lik}, typ="quality", animal_ids=self.animal_ids),
+            )[tab_name]
+
+        return tab, lik
 
     def load_tables(self, verbose: bool = True) -> Tuple:
         """Load videos and tables into dictionaries.
 
+        Each table is read, smoothed, outlier-interpolated and imputed independently. If n_jobs is larger than one,
+        tables are processed in parallel, and results are merged back in the original order.
+
         Args:
             verbose (bool): If True, prints the progress of data loading.
 
@@ -328,61 +1448,21 @@ class Project:
                 "Tracking files must be in either h5 or csv format"
             )  # pragma: no cover
 
-        if verbose:
-            print("Loading trajectories...")
-
-        tab_dict = {}
-        for tab in self.tables:
-
-            if self.table_format == ".h5":
-
-                loaded_tab = pd.read_hdf(
-                    os.path.join(self.table_path, tab), dtype=float
-                )
-
-                # Adapt index to be compatible with downstream processing
-                loaded_tab = loaded_tab.T.reset_index(drop=False).T
-                loaded_tab.columns = loaded_tab.loc["scorer", :]
-                loaded_tab = loaded_tab.iloc[1:]
-
-            elif self.table_format == ".csv":
-
-                loaded_tab = pd.read_csv(
-                    os.path.join(self.table_path, tab),
-                    index_col=0,
-                    low_memory=False,
-                )
-
-            # Remove the DLC suffix from the table name
-            try:
-                tab_name = deepof.utils.re.findall("(.*?)DLC", tab)[0]
-            except IndexError:
-                tab_name = tab
-
-            tab_dict[tab_name] = loaded_tab
-
-        # Check in the files come from a multi-animal DLC project
-        if "individuals" in list(tab_dict.values())[0].index:
-            self.animal_ids = list(
-                list(tab_dict.values())[0].loc["individuals", :].unique()
+        if self.chunk_size is not None and self.storage != "npy":
+            raise ValueError(
+                "Streaming tables in chunks requires storage to be set to 'npy'"
             )
 
-            for key, tab in tab_dict.items():
-                # Adapt each table to work with the downstream pipeline
-                tab_dict[key].loc["bodyparts"] = (
-                    tab.loc["individuals"] + "_" + tab.loc["bodyparts"]
-                )
-                tab_dict[key].drop("individuals", axis=0, inplace=True)
+        if self.imputation_engine not in ["iterative", "pooled"]:
+            raise ValueError("imputation_engine must be one of 'iterative' or 'pooled'")
 
-        # Convert the first rows of each dataframe to a multi-index
-        for key, tab in tab_dict.items():
-            tab_copy = tab.copy()
+        if verbose:
+            print("Loading and preprocessing trajectories...")
 
-            tab_copy.columns = pd.MultiIndex.from_arrays(
-                [tab.iloc[i] for i in range(2)]
-            )
-            tab_copy = tab_copy.iloc[2:].astype(float)
-            tab_dict[key] = tab_copy.reset_index(drop=True)
+        # Check in the files come from a multi-animal DLC project
+        header = self._read_table_columns(self.tables[0])
+        if "individuals" in header.names:
+            self.animal_ids = list(header.get_level_values("individuals").unique())
 
         # Update body part connectivity graph, taking detected or specified body parts into account
         model_dict = {
@@ -405,76 +1485,48 @@ class Project:
                 for bp in self.exclude_bodyparts
             ]
 
-        # Pass a time-based index, if specified in init
-        if self.frame_rate is not None:
-            for key, tab in tab_dict.items():
-                tab_dict[key].index = pd.timedelta_range(
-                    "00:00:00",
-                    pd.to_timedelta((tab.shape[0] // self.frame_rate), unit="sec"),
-                    periods=tab.shape[0] + 1,
-                    closed="left",
-                ).map(lambda t: str(t)[7:])
-
-        lik_dict = defaultdict()
+        if self.processing_cache_path is not None:
+            self._table_cache_keys = self._get_table_cache_keys()
 
-        for key, tab in tab_dict.items():
-            x = tab.xs("x", level="coords", axis=1, drop_level=False)
-            y = tab.xs("y", level="coords", axis=1, drop_level=False)
-            lik = tab.xs("likelihood", level="coords", axis=1, drop_level=True)
-
-            tab_dict[key] = pd.concat([x, y], axis=1).sort_index(axis=1)
-            lik_dict[key] = lik.fillna(0.0)
-
-        lik_dict = TableDict(lik_dict, typ="quality", animal_ids=self.animal_ids)
-
-        if self.smooth_alpha:
-
-            if verbose:
-                print("Smoothing trajectories...")
-
-            for key, tab in tab_dict.items():
-                cur_idx = tab.index
-                cur_cols = tab.columns
-                smooth = pd.DataFrame(
-                    deepof.utils.smooth_mult_trajectory(
-                        np.array(tab), alpha=self.smooth_alpha, w_length=15
-                    )
-                ).reset_index(drop=True)
-                smooth.columns = cur_cols
-                smooth.index = cur_idx
-                tab_dict[key] = smooth
-
-        if self.exclude_bodyparts != tuple([""]):
+        # Process each video independently. Results are returned in the same order as the input tables
+        loaded = Parallel(n_jobs=self.n_jobs)(
+            delayed(self._load_single_table)(tab)
+            for tab in tqdm(self.tables, total=len(self.tables), disable=not verbose)
+        )
 
-            for k, tab in tab_dict.items():
-                temp = tab.drop(self.exclude_bodyparts, axis=1, level="bodyparts")
-                temp.sort_index(axis=1, inplace=True)
-                temp.columns = pd.MultiIndex.from_product(
-                    [sorted(list(set([i[j] for i in temp.columns]))) for j in range(2)]
+        if self.chunk_size is not None:
+            # Processed tables were written straight to the on-disk store, and are loaded lazily
+            root = os.path.join(self.project_path, self.project_name, "Coordinates")
+            tab_dict, lik_dict = (
+                DiskTableDict(
+                    root,
+                    os.path.join("deepof_coordinates", name),
+                    keys=[tab_name for tab_name, _, _ in loaded],
+                    backend="npy",
                 )
-                tab_dict[k] = temp.sort_index(axis=1)
-
-        if self.interpolate_outliers:
-
-            if verbose:
-                print("Interpolating outliers...")
+                for name in ["tables", "quality"]
+            )
 
-            for k, tab in tab_dict.items():
-                tab_dict[k] = deepof.utils.interpolate_outliers(
-                    tab,
-                    lik_dict[k],
-                    likelihood_tolerance=self.likelihood_tolerance,
-                    mode="or",
-                    limit=self.interpolation_limit,
-                    n_std=self.interpolation_std,
-                )
+            if self.enable_iterative_imputation and self.imputation_engine == "pooled":
+                imputers = deepof.utils.fit_pooled_imputer(self, tab_dict, lik_dict)
+                for tab_name in tab_dict:
+                    self._impute_streamed_table(tab_dict, lik_dict, tab_name, imputers)
 
-        if self.enable_iterative_imputation:
+            return tab_dict, lik_dict
 
-            if verbose:
-                print("Iterative imputation of ocluded bodyparts...")
+        tab_dict = {tab_name: tab for tab_name, tab, _ in loaded}
+        lik_dict = TableDict(
+            {tab_name: lik for tab_name, _, lik in loaded},
+            typ="quality",
+            animal_ids=self.animal_ids,
+        )
 
-            tab_dict = deepof.utils.iterative_imputation(self, tab_dict, lik_dict)
+        # Impute occluded body parts with a single model per animal, fitted across all videos
+        if self.enable_iterative_imputation and self.imputation_engine == "pooled":
+            imputers = deepof.utils.fit_pooled_imputer(self, tab_dict, lik_dict)
+            tab_dict = deepof.utils.pooled_imputation(
+                self, tab_dict, lik_dict, imputers
+            )
 
         # Set table_dict to NaN if animals are missing
         tab_dict = deepof.utils.set_missing_animals(self, tab_dict, lik_dict)
@@ -505,16 +1557,21 @@ class Project:
 
         scales = self.scales[:, 2:]
 
+        # Only compute distances between the selected nodes
+        edges = None if self.distances == "all" else list(combinations(nodes, 2))
+
         distance_dict = {
-            key: deepof.utils.bpart_distance(tab, scales[i, 1], scales[i, 0])
+            key: self._from_processing_cache(
+                "distances",
+                key,
+                (list(scales[i]), edges),
+                lambda: deepof.utils.bpart_distance(
+                    tab, scales[i, 1], scales[i, 0], edges=edges
+                ),
+            )
             for i, (key, tab) in enumerate(tab_dict.items())
         }
 
-        for key in distance_dict.keys():
-            distance_dict[key] = distance_dict[key].loc[
-                :, [np.all([i in nodes for i in j]) for j in distance_dict[key].columns]
-            ]
-
         if self.ego:
             for key, val in distance_dict.items():
                 distance_dict[key] = val.loc[
@@ -547,24 +1604,33 @@ class Project:
             bridges += deepof.utils.enumerate_all_bridges(self.connectivity[i])
         bridges = [i for i in bridges if len(i) == 3]
 
+        def compute_angles(tab):
+
+            # Gather all cliques at once, in a (3, cliques, frames, 2) array
+            bparts = pd.Index(tab.columns.levels[0])
+            coords = (
+                tab.loc[:, list(bparts)]
+                .to_numpy()
+                .reshape(tab.shape[0], len(bparts), -1)[:, :, :2]
+            )
+            cliques = np.array(
+                [[bparts.get_loc(bp) for bp in clique] for clique in bridges],
+                dtype=int,
+            ).reshape(-1, 3)
+
+            return pd.DataFrame(
+                deepof.utils.angle(coords[:, cliques].transpose(2, 1, 0, 3)).T,
+                columns=pd.Index(
+                    [tuple(clique) for clique in bridges], tupleize_cols=False
+                ),
+            )
+
         angle_dict = {}
         try:
             for key, tab in tab_dict.items():
-
-                dats = []
-                for clique in bridges:
-                    dat = pd.DataFrame(
-                        deepof.utils.angle(
-                            np.array(tab[clique]).reshape([3, tab.shape[0], 2])
-                        ).T
-                    )
-
-                    dat.columns = [tuple(clique)]
-                    dats.append(dat)
-
-                dats = pd.concat(dats, axis=1)
-
-                angle_dict[key] = dats
+                angle_dict[key] = self._from_processing_cache(
+                    "angles", key, (bridges,), lambda: compute_angles(tab)
+                )
         except KeyError:
             raise KeyError(
                 "Are you using a custom labelling scheme? Out tutorials may help! "
@@ -592,39 +1658,41 @@ class Project:
         if verbose:
             print("Computing areas...")
 
-        areas_dict = {}
-
-        try:
-            for key, tab in tab_dict.items():
+        def compute_areas(tab):
 
-                exp_table = pd.DataFrame()
+            exp_table = pd.DataFrame()
 
-                for aid in self.animal_ids:
+            for aid in self.animal_ids:
 
-                    if aid == "":
-                        aid = None
+                if aid == "":
+                    aid = None
 
-                    # get the current table for the current animal
-                    current_table = tab.loc[
-                        :, deepof.utils.filter_columns(tab.columns, aid)
-                    ]
-                    current_table = current_table.apply(
-                        lambda x: deepof.utils.compute_areas(x, animal_id=aid), axis=1
-                    )
-                    current_table = pd.DataFrame(
-                        current_table.to_list(),
-                        index=current_table.index,
-                        columns=["head_area", "torso_area", "back_area", "full_area"],
-                    ).add_prefix(
-                        "{}{}".format(
-                            (aid if aid is not None else ""),
-                            ("_" if aid is not None else ""),
-                        )
+                # get the current table for the current animal
+                current_table = tab.loc[
+                    :, deepof.utils.filter_columns(tab.columns, aid)
+                ]
+                current_table = pd.DataFrame(
+                    deepof.utils.compute_all_areas(current_table, animal_id=aid),
+                    index=current_table.index,
+                    columns=["head_area", "torso_area", "back_area", "full_area"],
+                ).add_prefix(
+                    "{}{}".format(
+                        (aid if aid is not None else ""),
+                        ("_" if aid is not None else ""),
                     )
+                )
 
-                    exp_table = pd.concat([exp_table, current_table], axis=1)
+                exp_table = pd.concat([exp_table, current_table], axis=1)
 
-                areas_dict[key] = exp_table
+            return exp_table
+
+        areas_dict = {}
+
+        try:
+            for key, tab in tab_dict.items():
+                areas_dict[key] = self._from_processing_cache(
+                    "areas", key, (self.animal_ids,), lambda: compute_areas(tab)
+                )
 
         except KeyError:
             warnings.warn(
@@ -639,6 +1707,7 @@ class Project:
 
         Args:
             verbose (bool): If True, prints progress. Defaults to True.
+            force (bool): If True, overwrites the project if it already exists. Defaults to False.
 
         Returns:
             coordinates: Deepof.Coordinates object containing the trajectories of all bodyparts.
@@ -650,20 +1719,121 @@ class Project:
         if force and os.path.exists(os.path.join(self.project_path, self.project_name)):
             rmtree(os.path.join(self.project_path, self.project_name))
 
+        if self.exp_conditions is not None:
+            assert set(self._get_experiment_id(tab) for tab in self.tables) == set(
+                self.exp_conditions.keys()
+            ), "experimental IDs in exp_conditions do not match"
+
+        file_signatures = self._get_file_signatures()
         self.set_up_project_directory()
         self.frame_rate = int(
-            np.round(
-                pims.ImageIOReader(
-                    os.path.join(self.video_path, self.videos[0])
-                ).frame_rate
-            )
+            np.round(self.get_video_metadata()[self.videos[0]]["frame_rate"])
         )
 
-        tables, quality = self.load_tables(verbose)
+        coords = self._process_experiments(verbose)
+        coords._file_signatures = file_signatures
+
+        # Save created coordinates to the project directory
+        coords.save(timestamp=False)
+
+        if verbose:
+            print("Done!")
+
+        return coords
+
+    def update(self, verbose: bool = True) -> coordinates:
+        """Add new or modified experiments to an existing project, without reprocessing the rest.
+
+        Tables and videos are matched by experiment ID to the ones used to create the project, and compared by size and
+        modification time. Only new or modified experiments are processed (with the options specified during
+        initialization) and merged into the stored Coordinates object, leaving all previously processed experiments
+        untouched. If the project does not exist yet, it is created from scratch.
+
+        Args:
+            verbose (bool): If True, prints progress. Defaults to True.
+
+        Returns:
+            coordinates: Deepof.Coordinates object containing the trajectories of all bodyparts.
+
+        """
+        project_dir = os.path.join(self.project_path, self.project_name)
+        if not os.path.exists(
+            os.path.join(project_dir, "Coordinates", "deepof_coordinates.pkl")
+        ):
+            return self.create(verbose)
+
+        coords = load_project(project_dir)
+
+        # Select experiments that are either new, or whose table or video changed since they were processed
+        file_signatures = self._get_file_signatures()
+        to_update = [
+            i
+            for i, (exp_id, signature) in enumerate(file_signatures.items())
+            if exp_id not in coords._tables
+            or coords._file_signatures.get(exp_id, signature) != signature
+        ]
+
+        if len(to_update) == 0:
+            if verbose:
+                print("Project is already up to date!")
+            return coords
+
+        if verbose:
+            print(
+                "Updating {} experiment{}...".format(
+                    len(to_update), "s" if len(to_update) > 1 else ""
+                )
+            )
+
+        self.tables = [self.tables[i] for i in to_update]
+        self.videos = [self.videos[i] for i in to_update]
+
+        # Copy new and modified files to the project directory
+        for folder, path, files in [
+            ("Videos", self.video_path, self.videos),
+            ("Tables", self.table_path, self.tables),
+        ]:
+            if os.path.abspath(path) != os.path.abspath(
+                os.path.join(project_dir, folder)
+            ):
+                for file in files:
+                    shutil.copy2(
+                        os.path.join(path, file), os.path.join(project_dir, folder)
+                    )
+
+        self.video_path = os.path.join(project_dir, "Videos")
+        self.table_path = os.path.join(project_dir, "Tables")
+        self.frame_rate = coords._frame_rate
+
+        updated = self._process_experiments(verbose)
+        updated._file_signatures = {
+            exp_id: signature
+            for i, (exp_id, signature) in enumerate(file_signatures.items())
+            if i in to_update
+        }
+        coords._merge_experiments(updated)
+
         if self.exp_conditions is not None:
-            assert (
-                tables.keys() == self.exp_conditions.keys()
-            ), "experimental IDs in exp_conditions do not match"
+            coords._exp_conditions = self.exp_conditions
+
+        coords.save(timestamp=False)
+
+        if verbose:
+            print("Done!")
+
+        return coords
+
+    def _process_experiments(self, verbose: bool = True) -> coordinates:
+        """Load, preprocess and extract features from all tables and videos in the project, and wrap them in a Coordinates object.
+
+        Args:
+            verbose (bool): If True, prints progress. Defaults to True.
+
+        Returns:
+            coordinates: Deepof.Coordinates object containing the trajectories of all bodyparts.
+
+        """
+        tables, quality = self.load_tables(verbose)
 
         distances = None
         angles = None
@@ -683,7 +1853,7 @@ class Project:
         if self.areas:
             areas = self.get_areas(tables, verbose)
 
-        coords = Coordinates(
+        return Coordinates(
             project_path=self.project_path,
             project_name=self.project_name,
             angles=angles,
@@ -692,6 +1862,7 @@ class Project:
             arena=self.arena,
             arena_dims=self.arena_dims,
             bodypart_graph=self.bodypart_graph,
+            cache_size=self.cache_size,
             distances=distances,
             connectivity=self.connectivity,
             excluded_bodyparts=self.exclude_bodyparts,
@@ -701,20 +1872,13 @@ class Project:
             quality=quality,
             scales=self.scales,
             arena_params=self.arena_params,
+            storage=self.storage,
             tables=tables,
             trained_model_path=self.trained_path,
             videos=self.videos,
             video_resolution=self.video_resolution,
         )
 
-        # Save created coordinates to the project directory
-        coords.save(timestamp=False)
-
-        if verbose:
-            print("Done!")
-
-        return coords
-
     @distances.setter
     def distances(self, value):
         self._distances = value
@@ -750,10 +1914,12 @@ class Coordinates:
         angles: dict = None,
         animal_ids: List = tuple([""]),
         areas: dict = None,
+        cache_size: int = 1024,
         distances: dict = None,
         connectivity: nx.Graph = None,
         excluded_bodyparts: list = None,
         exp_conditions: dict = None,
+        storage: str = "pickle",
     ):
         """Class for storing the results of a ran project. Methods are mostly setters and getters in charge of tidying up the generated tables.
 
@@ -775,9 +1941,11 @@ class Coordinates:
             angles (dict): Dictionary containing the angles of the experiment. See deepof.data.Project for more information.
             animal_ids (List): List containing the animal IDs of the experiment. See deepof.data.Project for more information.
             areas (dict): dictionary with areas to compute. By default, it includes head, torso, and back.
+            cache_size (int): Maximum memory (in MB) used to cache the outputs of the getters. See deepof.data.Project for more information.
             distances (dict): Dictionary containing the distances of the experiment. See deepof.data.Project for more information.
             excluded_bodyparts (list): list of bodyparts to exclude from analysis.
             exp_conditions (dict): Dictionary containing the experimental conditions of the experiment. See deepof.data.Project for more information.
+            storage (str): Storage backend to use when saving the object. See deepof.data.Project for more information.
 
         """
         self._project_path = project_path
@@ -801,6 +1969,33 @@ class Coordinates:
         self._areas = areas
         self._distances = distances
         self._connectivity = connectivity
+        self._storage = storage
+        self._cache_size = cache_size
+        self._feature_cache = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._file_signatures = {}
+
+    def __setstate__(self, state):
+        """Restore a pickled object, filling in attributes missing from projects saved with older versions of deepof."""
+        state.setdefault("_storage", "pickle")
+        state.setdefault("_cache_size", 1024)
+        state.setdefault("_feature_cache", OrderedDict())
+        state.setdefault("_cache_hits", 0)
+        state.setdefault("_cache_misses", 0)
+        state.setdefault("_file_signatures", {})
+        self.__dict__.update(state)
+
+    def __setattr__(self, name, value):
+        """Set an attribute, clearing cached getter outputs whenever the state of the project changes."""
+        super().__setattr__(name, value)
+        if name not in [
+            "_feature_cache",
+            "_cache_size",
+            "_cache_hits",
+            "_cache_misses",
+        ] and hasattr(self, "_feature_cache"):
+            self.clear_cache()
 
     def __str__(self):  # pragma: no cover
         """Print the object to stdout."""
@@ -810,6 +2005,7 @@ class Coordinates:
         """Print the object to stdout."""
         return "deepof analysis of {} videos".format(len(self._videos))
 
+    @_cached_getter
     def get_coords(
         self,
         center: str = False,
@@ -981,6 +2177,7 @@ class Coordinates:
             propagate_annotations=propagate_annotations,
         )
 
+    @_cached_getter
     def get_distances(
         self,
         speed: int = 0,
@@ -1064,6 +2261,7 @@ class Coordinates:
             "Distances not computed. Read the documentation for more details"
         )  # pragma: no cover
 
+    @_cached_getter
     def get_angles(
         self,
         degrees: bool = False,
@@ -1130,6 +2328,7 @@ class Coordinates:
             "Angles not computed. Read the documentation for more details"
         )  # pragma: no cover
 
+    @_cached_getter
     def get_areas(self, speed: int = 0, selected_id: str = "all") -> table_dict:
         """Return a table_dict object with all relevant areas (head, torso, back, full). Unless specified otherwise, the areas are computed for all animals.
 
@@ -1215,11 +2414,59 @@ class Coordinates:
             for exp_id in exp_conditions.iloc[:, 0]
         }
         self._exp_conditions = exp_conditions
+        self.clear_cache()
 
     def get_quality(self):
         """Retrieve a dictionary with the tagging quality per video, as reported by DLC."""
         return TableDict(self._quality, typ="quality", animal_ids=self._animal_ids)
 
+    def _merge_experiments(self, other: coordinates):
+        """Add the experiments in other to the current object, replacing those with the same experiment IDs.
+
+        Used to update existing projects incrementally. New experiments are appended after the existing ones.
+
+        Args:
+            other (coordinates): Coordinates object with the experiments to add, processed with the same settings.
+
+        """
+        experiments = list(self._tables.keys())
+        per_video = {
+            attr: list(getattr(self, attr))
+            for attr in ["_scales", "_arena_params", "_video_resolution", "_videos"]
+            if getattr(self, attr) is not None
+        }
+
+        for i, exp_id in enumerate(other._tables.keys()):
+            for attr, values in per_video.items():
+                if exp_id in experiments:
+                    values[experiments.index(exp_id)] = getattr(other, attr)[i]
+                else:
+                    values.append(getattr(other, attr)[i])
+
+            for attr in ["_tables", "_quality", "_distances", "_angles", "_areas"]:
+                tabs, new_tabs = getattr(self, attr), getattr(other, attr)
+                if tabs is not None and new_tabs is not None:
+                    tabs[exp_id] = new_tabs[exp_id]
+
+        for attr, values in per_video.items():
+            setattr(self, attr, np.array(values) if attr == "_scales" else values)
+
+        self._file_signatures.update(other._file_signatures)
+        self.clear_cache()
+
+    def clear_cache(self):
+        """Remove all cached getter outputs. Called automatically whenever the state of the object is modified."""
+        self._feature_cache.clear()
+
+    def get_cache_info(self):
+        """Retrieve a dictionary with the number of cache hits and misses, the number of cached tables, and the memory (in MB) they use."""
+        return {
+            "hits": self._cache_hits,
+            "misses": self._cache_misses,
+            "entries": len(self._feature_cache),
+            "memory": sum(size for _, size in self._feature_cache.values()) / 1e6,
+        }
+
     @property
     def get_arenas(self):
         """Retrieve all available information associated with the arena."""
@@ -1275,6 +2522,9 @@ class Coordinates:
     def save(self, filename: str = None, timestamp: bool = True):
         """Save the current state of the Coordinates object to a pickled file.
 
+        If an on-disk storage backend ("hdf5" or "npy") is selected, each table is written as an independent dataset
+        to a folder with the same name as the output file, and only a small metadata manifest is pickled.
+
         Args:
             filename (str): Name of the pickled file to store. If no name is provided, a default is used.
             timestamp (bool): Whether to append a time stamp at the end of the output file name.
@@ -1289,6 +2539,32 @@ class Coordinates:
             (f"_{int(time())}" if timestamp else ""),
         )
 
+        # Stored tables might be replaced below, and cached features should never be pickled
+        self.clear_cache()
+
+        if self._storage in ["hdf5", "npy"]:
+            root, store_name = os.path.split(pkl_out[: -len(".pkl")])
+
+            for attr in ["_tables", "_quality", "_distances", "_angles", "_areas"]:
+                tabs = getattr(self, attr)
+                if tabs is None:
+                    continue
+
+                if not isinstance(tabs, DiskTableDict):
+                    tabs = DiskTableDict(
+                        root,
+                        os.path.join(store_name, attr[1:]),
+                        backend=self._storage,
+                    )
+                    for key, tab in getattr(self, attr).items():
+                        tabs[key] = tab
+                    setattr(self, attr, tabs)
+
+                tabs.save(root, os.path.join(store_name, attr[1:]))
+
+        elif self._storage != "pickle":  # pragma: no cover
+            raise ValueError("storage must be one of 'pickle', 'hdf5', and 'npy'")
+
         with open(pkl_out, "wb") as handle:
             pickle.dump(self, handle, protocol=pickle.HIGHEST_PROTOCOL)
 
@@ -1316,6 +2592,11 @@ class Coordinates:
             merged_features: A graph-based dataset.
 
         """
+        if kwargs.get("lazy", False):
+            raise ValueError(
+                "Lazy preprocessing is not supported for graph datasets, since node and edge features are split from dense windows"
+            )
+
         # Get all relevant features
         coords = self.get_coords(
             selected_id=animal_id, center=center, align=align, polar=polar
@@ -1446,14 +2727,13 @@ class Coordinates:
             video_output (bool): It outputs a fully annotated video for each experiment indicated in a list. If set to "all", it will output all videos. False by default.
             frame_limit (int): Only applies if video_output is not False. Indicates the maximum number of frames per video to output.
             debug (bool): Only applies if video_output is not False. If True, all videos will include debug information, such as the detected arena and the preprocessed tracking tags.
-            n_jobs (int): Number of jobs to use for parallel processing.
+            n_jobs (int): Number of experiments to annotate (and, if video_output is not False, videos to output) in parallel.
             propagate_labels (bool): If True, the pheno column will be propagated from the original data.
 
         Returns:
             table_dict: A table_dict object with all supervised annotations per experiment as values.
 
         """
-        tag_dict = {}
         params = deepof.annotation_utils.get_hparameters(params)
         raw_coords = self.get_coords(center=None)
 
@@ -1478,20 +2758,31 @@ class Coordinates:
                 for _id in self._animal_ids
             }
 
-        # noinspection PyTypeChecker
-        for key in tqdm(self._tables.keys()):
-
-            # Remove indices and add at the very end, to avoid conflicts if
-            # frame_rate is specified in project
-            tag_index = raw_coords[key].index
-
-            supervised_tags = deepof.annotation_utils.supervised_tagging(
-                self,
-                raw_coords=raw_coords,
-                coords=coords,
-                dists=dists,
-                full_features=features_dict,
-                speeds=speeds,
+        # Load the pre-trained huddle estimator once, and share it across workers
+        huddle_estimator = deepof.annotation_utils.load_huddle_estimator(
+            self._trained_model_path
+        )
+        quality = self.get_quality()
+
+        # Workers only need the project metadata, and the tables of the experiment they tag
+        metadata = copy.copy(self)
+        metadata._feature_cache = OrderedDict()
+        metadata._tables = dict.fromkeys(self._tables.keys())
+        metadata._quality = metadata._distances = metadata._angles = None
+        metadata._areas = None
+
+        tasks = (
+            delayed(deepof.annotation_utils.supervised_tagging)(
+                metadata,
+                raw_coords={key: raw_coords[key]},
+                coords={key: coords[key]},
+                dists={key: dists[key]},
+                full_features=(
+                    {key: features_dict[key]}
+                    if len(self._animal_ids) <= 1
+                    else {_id: {key: features_dict[_id][key]} for _id in features_dict}
+                ),
+                speeds={key: speeds[key]},
                 video=get_close_matches(
                     key,
                     [vid for vid in self._videos if vid.startswith(key)],
@@ -1500,10 +2791,19 @@ class Coordinates:
                 )[0],
                 trained_model_path=self._trained_model_path,
                 params=params,
+                huddle_estimator=huddle_estimator,
+                quality={key: quality[key]},
             )
+            for key in self._tables.keys()
+        )
 
-            supervised_tags.index = tag_index
-            tag_dict[key] = supervised_tags
+        tagged = Parallel(n_jobs=n_jobs)(tqdm(tasks, total=len(self._tables)))
+
+        # Remove indices and add them at the very end, to avoid conflicts if frame_rate is specified in project
+        for key, supervised_tags in zip(self._tables.keys(), tagged):
+            supervised_tags.index = raw_coords[key].index
+
+        tag_dict = dict(zip(self._tables.keys(), tagged))
 
         if propagate_labels:  # pragma: no cover
             for key, tab in tag_dict.items():
@@ -2066,6 +3366,29 @@ class TableDict(dict):
             test_index,
         )
 
+    @staticmethod
+    def _lazy_windows(
+        table_dict: table_dict,
+        data: np.ndarray,
+        window_indices: list,
+        window_size: int,
+        window_step: int,
+    ) -> WindowedDataset:
+        """Index sliding windows over the selected videos of a concatenated dataset, without materializing them.
+
+        Mirrors deepof.utils.rupture_per_experiment with fixed-length windows: videos are taken in table order, and
+        windows never span two videos.
+
+        """
+        lengths = [
+            tab.shape[0]
+            for i, tab in enumerate(table_dict.values())
+            if i in window_indices
+        ]
+        return WindowedDataset(
+            np.split(data, np.cumsum(lengths)[:-1]), window_size, window_step
+        )
+
     # noinspection PyTypeChecker,PyGlobalUndefined
     def preprocess(
         self,
@@ -2081,6 +3404,7 @@ class TableDict(dict):
         filter_low_variance: bool = False,
         interpolate_normalized: int = 10,
         precomputed_breaks: dict = None,
+        lazy: bool = False,
     ) -> np.ndarray:
         """Preprocess the loaded dataset before feeding to unsupervised embedding models.
 
@@ -2099,6 +3423,7 @@ class TableDict(dict):
             filter_low_variance (float): remove features with variance lower than the specified threshold. Useful to get rid of the x axis of the body part used for alignment (which would introduce noise after standardization).
             interpolate_normalized(int): if not 0, it specifies the number of standard deviations beyond which values will be interpolated after normalization. Only used if scale is set to "standard".
             precomputed_breaks (dict): If provided, changepoint detection is prevented, and provided breaks are used instead.
+            lazy (bool): If True, training and test sets are returned as WindowedDataset objects, which index the scaled videos instead of materializing all sliding windows. Only supported with fixed-length windows (automatic_changepoints=False), and with handle_ids="concat". Lazy sets can be passed to Coordinates.deep_unsupervised_embedding, but not to hyperparameter tuning or to graph datasets (see get_graph_dataset). Defaults to False.
 
         Returns:
             X_train (np.ndarray): 3D dataset with shape (instances, sliding_window_size, features) generated from all training videos.
@@ -2115,6 +3440,14 @@ class TableDict(dict):
             "split",
         ], "handle IDs should be one of 'concat', and 'split'. See documentation for more details."
 
+        if lazy and (
+            automatic_changepoints
+            or (len(self._animal_ids) > 1 and handle_ids == "split")
+        ):
+            raise ValueError(
+                "Lazy preprocessing is only supported with fixed-length sliding windows, and handle_ids='concat'"
+            )
+
         if filter_low_variance:
 
             # Remove body parts with extremely low variance (usually the result of vertical alignment).
@@ -2228,15 +3561,29 @@ class TableDict(dict):
             print("Breaking time series...")
 
         # Apply rupture method to each train experiment independently
-        X_train, train_breaks = deepof.utils.rupture_per_experiment(
-            table_dict=table_temp,
-            to_rupture=X_train,
-            rupture_indices=[i for i in range(len(table_temp)) if i not in test_index],
-            automatic_changepoints=automatic_changepoints,
-            window_size=window_size,
-            window_step=window_step,
-            precomputed_breaks=precomputed_breaks,
-        )
+        if lazy:
+            X_train, train_breaks = (
+                self._lazy_windows(
+                    table_temp,
+                    X_train,
+                    [i for i in range(len(table_temp)) if i not in test_index],
+                    window_size,
+                    window_step,
+                ),
+                None,
+            )
+        else:
+            X_train, train_breaks = deepof.utils.rupture_per_experiment(
+                table_dict=table_temp,
+                to_rupture=X_train,
+                rupture_indices=[
+                    i for i in range(len(table_temp)) if i not in test_index
+                ],
+                automatic_changepoints=automatic_changepoints,
+                window_size=window_size,
+                window_step=window_step,
+                precomputed_breaks=precomputed_breaks,
+            )
 
         # Print rupture information to screen
         if verbose > 1 and automatic_changepoints:
@@ -2272,15 +3619,23 @@ class TableDict(dict):
         if test_videos and len(test_index) > 0:
 
             # Apply rupture method to each test experiment independently
-            X_test, test_breaks = deepof.utils.rupture_per_experiment(
-                table_dict=table_temp,
-                to_rupture=X_test,
-                rupture_indices=test_index,
-                automatic_changepoints=automatic_changepoints,
-                window_size=window_size,
-                window_step=window_step,
-                precomputed_breaks=precomputed_breaks,
-            )
+            if lazy:
+                X_test, test_breaks = (
+                    self._lazy_windows(
+                        table_temp, X_test, test_index, window_size, window_step
+                    ),
+                    None,
+                )
+            else:
+                X_test, test_breaks = deepof.utils.rupture_per_experiment(
+                    table_dict=table_temp,
+                    to_rupture=X_test,
+                    rupture_indices=test_index,
+                    automatic_changepoints=automatic_changepoints,
+                    window_size=window_size,
+                    window_step=window_step,
+                    precomputed_breaks=precomputed_breaks,
+                )
 
             if self._propagate_labels or self._propagate_annotations:
                 if test_breaks is None:
@@ -2303,7 +3658,7 @@ class TableDict(dict):
                 shuffle_test = np.random.choice(
                     X_test.shape[0], X_test.shape[0], replace=False
                 )
-                X_test = X_test[shuffle_test]
+                X_test = X_test.take(shuffle_test) if lazy else X_test[shuffle_test]
 
                 if self._propagate_labels:
                     y_test = y_test[shuffle_test]
@@ -2312,12 +3667,14 @@ class TableDict(dict):
             shuffle_train = np.random.choice(
                 X_train.shape[0], X_train.shape[0], replace=False
             )
-            X_train = X_train[shuffle_train]
+            X_train = X_train.take(shuffle_train) if lazy else X_train[shuffle_train]
 
             if self._propagate_labels:
                 y_train = y_train[shuffle_train]
 
-        X_test, y_test = np.array(X_test), np.array(y_test)
+        if not isinstance(X_test, WindowedDataset):
+            X_test = np.array(X_test)
+        y_test = np.array(y_test)
 
         # If automatic changepoints are anabled, train and test can have different seq lengths.
         # To remove that issue, pad the shortest set to match the longest one.
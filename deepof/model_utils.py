@@ -1169,7 +1169,7 @@ def embedding_model_fitting(
 
     Args:
         coordinates (np.ndarray): Coordinates of the data.
-        preprocessed_object (tuple): Tuple containing the preprocessed data.
+        preprocessed_object (tuple): Tuple containing the preprocessed data. Training and validation sets can be WindowedDataset objects, as returned by TableDict.preprocess with lazy=True, in which case windows are gathered batch by batch during training.
         adjacency_matrix (np.ndarray): adjacency_matrix (np.ndarray): adjacency matrix of the connectivity graph to use.
         embedding_model (str): Model to use to embed and cluster the data. Must be one of VQVAE (default), VaDE, and contrastive.
         encoder_type (str): Encoder architecture to use. Must be one of "recurrent", "TCN", and "transformer".
@@ -1222,7 +1222,14 @@ def embedding_model_fitting(
             X_train, a_train, y_train, X_val, a_val, y_val = preprocessed_object
         except ValueError:
             X_train, y_train, X_val, y_val = preprocessed_object
-            a_train, a_val = np.zeros(X_train.shape), np.zeros(X_val.shape)
+
+            # Lazy datasets get read-only views of a single zero, to avoid allocating dense edge features
+            a_train, a_val = [
+                np.broadcast_to(np.zeros(1, dtype=np.float32), X.shape)
+                if isinstance(X, deepof.data.WindowedDataset)
+                else np.zeros(X.shape)
+                for X in [X_train, X_val]
+            ]
 
         # Make sure that batch_size is not larger than training set
         if batch_size > preprocessed_object[0].shape[0]:
@@ -1255,31 +1262,32 @@ def embedding_model_fitting(
         if not log_history:
             cbacks = cbacks[1:]
 
-        Xs, ys = X_train, [X_train]
-        Xvals, yvals = X_val, [X_val]
+        Xs = X_train
+        global_batch_size = batch_size * strategy.num_replicas_in_sync
+
+        def get_dataset(X, a, shuffle):
+            """Batch inputs, edge features and reconstruction targets, gathering windows on the fly if X is lazy."""
+            if isinstance(X, deepof.data.WindowedDataset):
+                dataset = (
+                    X.to_tf_dataset(global_batch_size, shuffle=shuffle)
+                    .filter(lambda x: tf.shape(x)[0] == global_batch_size)
+                    .map(lambda x: (x, tf.zeros_like(x), (x,)))
+                )
+
+            else:
+                # Cast to float32
+                X, a = tf.cast(X, tf.float32), tf.cast(a, tf.float32)
+                dataset = tf.data.Dataset.from_tensor_slices((X, a, (X,))).batch(
+                    global_batch_size, drop_remainder=True
+                )
+                if shuffle:
+                    dataset = dataset.shuffle(buffer_size=X.shape[0])
 
-        # Cast to float32
-        ys = tuple([tf.cast(dat, tf.float32) for dat in ys])
-        yvals = tuple([tf.cast(dat, tf.float32) for dat in yvals])
+            return dataset.with_options(options).prefetch(tf.data.AUTOTUNE)
 
         # Convert data to tf.data.Dataset objects
-        train_dataset = (
-            tf.data.Dataset.from_tensor_slices(
-                (tf.cast(Xs, tf.float32), tf.cast(a_train, tf.float32), tuple(ys))
-            )
-            .batch(batch_size * strategy.num_replicas_in_sync, drop_remainder=True)
-            .shuffle(buffer_size=X_train.shape[0])
-            .with_options(options)
-            .prefetch(tf.data.AUTOTUNE)
-        )
-        val_dataset = (
-            tf.data.Dataset.from_tensor_slices(
-                (tf.cast(Xvals, tf.float32), tf.cast(a_val, tf.float32), tuple(yvals))
-            )
-            .batch(batch_size * strategy.num_replicas_in_sync, drop_remainder=True)
-            .with_options(options)
-            .prefetch(tf.data.AUTOTUNE)
-        )
+        train_dataset = get_dataset(X_train, a_train, shuffle=True)
+        val_dataset = get_dataset(X_val, a_val, shuffle=False)
 
     # Build model
     with strategy.scope():
@@ -6,6 +6,7 @@
 import copy
 from copy import deepcopy
 from dask_image.imread import imread
+from functools import lru_cache
 from itertools import combinations, product
 from joblib import Parallel, delayed
 from scipy.signal import savgol_filter
@@ -16,7 +17,7 @@ from sklearn.experimental import enable_iterative_imputer  # noqa
 from sklearn.impute import IterativeImputer
 from sklearn.preprocessing import StandardScaler, MinMaxScaler, RobustScaler
 from tqdm import tqdm
-from typing import Tuple, Any, List, Union, NewType
+from typing import Tuple, Any, Iterable, List, Union, NewType
 import argparse
 import cv2
 from google.colab.patches import cv2_imshow
@@ -152,6 +153,8 @@ def edges_to_weithed_adj(adj: np.ndarray, edges: np.ndarray):
 def enumerate_all_bridges(G: nx.graph) -> list:
     """Enumerate all 3-node connected sequences in the given graph.
 
+    Results are cached per graph structure, so that bridges are only enumerated once per connectivity graph.
+
     Args:
         - G (nx.graph): Animal connectivity graph.
 
@@ -159,15 +162,22 @@ def enumerate_all_bridges(G: nx.graph) -> list:
         bridges (list): List with all 3-node connected sequences in the provided graph.
 
     """
-    degrees = dict(nx.degree(G))
-    centers = [node for node in degrees.keys() if degrees[node] >= 2]
+    adjacency = tuple((node, tuple(G[node].keys())) for node in G)
+
+    return [list(bridge) for bridge in _enumerate_all_bridges(adjacency)]
 
+
+@lru_cache(maxsize=None)
+def _enumerate_all_bridges(adjacency: tuple) -> tuple:
+    """Enumerate all 3-node connected sequences in a graph, given as a tuple of (node, neighbors) pairs."""
     bridges = []
-    for center in centers:
-        for comb in list(combinations(list(G[center].keys()), 2)):
-            bridges.append([comb[0], center, comb[1]])
+    for center, neighbors in adjacency:
+        if len(neighbors) < 2:
+            continue
+        for comb in combinations(neighbors, 2):
+            bridges.append((comb[0], center, comb[1]))
 
-    return bridges
+    return tuple(bridges)
 
 
 # QUALITY CONTROL AND PREPROCESSING #
@@ -281,6 +291,123 @@ def iterative_imputation(project: project, tab_dict: dict, lik_dict: dict):
     return imputed_tabs
 
 
+def fit_pooled_imputer(
+    project: project, tab_dict: dict, lik_dict: dict, max_samples: int = 10000
+) -> dict:
+    """Fit a single imputation model per animal, on frames pooled across all experiments.
+
+    Frames in which each animal is present are sampled uniformly across experiments, so that fitting time does not
+    depend on the number or length of the videos. Fitted models can then be applied to each experiment independently
+    with pooled_imputation.
+
+    Args:
+        project (project): Project object.
+        tab_dict (dict): Dictionary with the coordinates of the body parts.
+        lik_dict (dict): Dictionary with the likelihood of the tracking for each body part and animal.
+        max_samples (int): Maximum number of frames used to fit each model.
+
+    Returns:
+        imputers (dict): Dictionary with a tuple containing the fitted scaler, the fitted imputer, and the imputed columns per animal.
+
+    """
+    presence_masks = compute_animal_presence_mask(
+        deepof.data.TableDict(lik_dict, typ="quality", animal_ids=project.animal_ids)
+    )
+    rng = np.random.default_rng(42)
+    imputers = {}
+
+    for animal_id in project.animal_ids:
+
+        present_frames = {
+            k: np.where(presence_masks[k][animal_id].values)[0] for k in tab_dict.keys()
+        }
+        sample_frac = min(
+            1.0, max_samples / max(1, sum(len(i) for i in present_frames.values()))
+        )
+
+        pooled = []
+        for k, frames in present_frames.items():
+            tab = tab_dict[k]
+            frames = np.sort(
+                rng.choice(
+                    frames, int(np.ceil(len(frames) * sample_frac)), replace=False
+                )
+            )
+            pooled.append(
+                tab.iloc[frames].loc[:, filter_columns(tab.columns, animal_id)]
+            )
+
+        pooled = pd.concat(pooled)
+        columns = pooled.loc[:, pooled.isnull().mean(axis=0) != 1.0].columns
+
+        try:
+            scaler = StandardScaler()
+            imputer = IterativeImputer(
+                max_iter=project.enable_iterative_imputation,
+                n_nearest_features=len(columns),
+                tol=1e-1,
+            ).fit(scaler.fit_transform(pooled.loc[:, columns]))
+            imputers[animal_id] = (scaler, imputer, columns)
+
+            if pooled.shape[1] != len(columns):
+                warnings.warn(
+                    "Some of the body parts have zero measurements. Iterative imputation skips these,"
+                    " which could bring problems downstream. A possible solution could be to refine "
+                    "DLC tracklets."
+                )
+
+        except ValueError:
+            warnings.warn(
+                f"Animal {animal_id} has not enough data. Skipping imputation."
+            )
+
+    return imputers
+
+
+def pooled_imputation(
+    project: project, tab_dict: dict, lik_dict: dict, imputers: dict
+) -> table_dict:
+    """Perform imputation on occluded body parts, using models fitted across experiments. Run per animal and experiment.
+
+    Args:
+        project (project): Project object.
+        tab_dict (dict): Dictionary with the coordinates of the body parts.
+        lik_dict (dict): Dictionary with the likelihood of the tracking for each body part and animal.
+        imputers (dict): Fitted models per animal, as returned by fit_pooled_imputer.
+
+    Returns:
+        tab_dict (dict): Dictionary with the coordinates of the body parts after imputation.
+
+    """
+    presence_masks = compute_animal_presence_mask(
+        deepof.data.TableDict(lik_dict, typ="quality", animal_ids=project.animal_ids)
+    )
+    imputed_tabs = {}
+
+    for k, tab in tab_dict.items():
+
+        imputed_tabs[k] = tab.copy()
+
+        for animal_id, (scaler, imputer, columns) in imputers.items():
+
+            present_frames = np.where(presence_masks[k][animal_id].values)[0]
+            if len(present_frames) == 0:
+                continue
+
+            imputed = scaler.inverse_transform(
+                imputer.transform(
+                    scaler.transform(tab.iloc[present_frames].loc[:, columns])
+                )
+            )
+            imputed_tabs[k].iloc[
+                present_frames, tab.columns.get_indexer(columns)
+            ] = imputed
+
+    return deepof.data.TableDict(
+        imputed_tabs, typ="coords", animal_ids=project.animal_ids
+    )
+
+
 def set_missing_animals(
     coordinates: project, tab_dict: dict, lik_dict: dict, animal_ids: list = None
 ):
@@ -381,7 +508,7 @@ def compute_dist(
 
 
 def bpart_distance(
-    dataframe: pd.DataFrame, arena_abs: int = 1, arena_rel: int = 1
+    dataframe: pd.DataFrame, arena_abs: int = 1, arena_rel: int = 1, edges: list = None
 ) -> pd.DataFrame:
     """Return a pandas.DataFrame with the scaled distances between all pairs of body parts.
 
@@ -389,29 +516,66 @@ def bpart_distance(
         dataframe (pandas.DataFrame): pd.DataFrame of shape N*(2*bp) containing X,y positions over time for a given set of bp body parts.
         arena_abs (int): Diameter of the real arena in cm.
         arena_rel (int): Diameter of the captured arena in pixels.
+        edges (list): Pairs of body parts to compute distances for (such as the edges of the connectivity graph). If None (default), all pairs are computed.
 
     Returns:
         result (pd.DataFrame): pandas.DataFrame with the absolute distances between all pairs of body parts.
 
     """
-    indexes = combinations(dataframe.columns.levels[0], 2)
-    dists = []
-    for idx in indexes:
-        dist = compute_dist(np.array(dataframe.loc[:, list(idx)]), arena_abs, arena_rel)
-        dist.columns = [idx]
-        dists.append(dist)
+    bparts = list(dataframe.columns.levels[0])
+    coords = (
+        dataframe.loc[:, bparts].to_numpy().reshape(dataframe.shape[0], len(bparts), -1)
+    )
+
+    if edges is None:
+        pairs = np.triu_indices(len(bparts), k=1)
+    else:
+        pairs = sorted(
+            set(
+                tuple(sorted([bparts.index(bp) for bp in edge]))
+                for edge in edges
+                if all(bp in bparts for bp in edge)
+            )
+        )
+        pairs = np.array(pairs, dtype=int).reshape(-1, 2).T
 
-    return pd.concat(dists, axis=1)
+    dists = pairwise_distance(coords[:, :, :2], pairs)
+
+    return pd.DataFrame(
+        dists * arena_abs / arena_rel,
+        columns=pd.Index(
+            [(bparts[i], bparts[j]) for i, j in zip(*pairs)], tupleize_cols=False
+        ),
+    )
+
+
+def pairwise_distance(coords: np.ndarray, pairs: tuple = None) -> np.ndarray:
+    """Compute the distances between pairs of body parts over time.
+
+    Args:
+        coords (np.ndarray): array of shape (frames, bodyparts, 2) with the positions of all body parts over time.
+        pairs (tuple): tuple of two integer arrays, with the indices of the first and second body part in each pair. If None, all pairs are computed, in the same order as itertools.combinations.
+
+    Returns:
+        np.ndarray: array of shape (frames, pairs) with the distances between each pair of body parts.
+
+    """
+    if pairs is None:
+        pairs = np.triu_indices(coords.shape[1], k=1)
+
+    diff = coords[:, pairs[0]] - coords[:, pairs[1]]
+
+    return np.sqrt(np.einsum("...i,...i", diff, diff))
 
 
 def angle(bpart_array: np.array) -> np.array:
     """Return a numpy.ndarray with the angles between the provided instances.
 
     Args:
-        bpart_array (numpy.array): 2D positions over time for a bodypart.
+        bpart_array (numpy.array): 2D positions over time for three bodyparts. Extra leading dimensions (such as one per clique) are computed in a single batch.
 
     Returns:
-        ang (np.array): 1D angles between the three-point-instances.
+        ang (np.array): angles between the three-point-instances.
 
     """
     a, b, c = bpart_array
@@ -420,7 +584,7 @@ def angle(bpart_array: np.array) -> np.array:
     bc = c - b
 
     cosine_angle = np.einsum("...i,...i", ba, bc) / (
-        np.linalg.norm(ba, axis=1) * np.linalg.norm(bc, axis=1)
+        np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1)
     )
     ang = np.arccos(cosine_angle)
 
@@ -438,6 +602,26 @@ def compute_areas(coords, animal_id=None):
         areas: list including head, torso, back, and full areas for the provided coordinates.
 
     """
+    areas = []
+
+    for bps in _get_area_bodyparts():
+
+        if animal_id is not None:
+            bps = ["_".join([animal_id, bp]) for bp in bps]
+
+        x = coords.xs(key="x", level=1)[bps]
+        y = coords.xs(key="y", level=1)[bps]
+
+        if np.isnan(x).any() or np.isnan(y).any():
+            areas.append(np.nan)
+        else:
+            areas.append(Polygon(zip(x, y)).area)
+
+    return areas
+
+
+def _get_area_bodyparts():
+    """Return the lists of body parts delimiting the head, torso, back, and full areas, in that order."""
     head = ["Nose", "Left_ear", "Left_fhip", "Spine_1"]
 
     torso = ["Spine_1", "Right_fhip", "Spine_2", "Left_fhip"]
@@ -455,22 +639,59 @@ def compute_areas(coords, animal_id=None):
         "Right_ear",
     ]
 
+    return [head, torso, back, full]
+
+
+def polygon_area(vertices: np.ndarray) -> np.ndarray:
+    """Compute the areas of a batch of polygons using the shoelace formula.
+
+    Args:
+        vertices (np.ndarray): array of shape (..., n_vertices, 2) with the ordered vertices of each polygon.
+
+    Returns:
+        np.ndarray: array of shape (...) with the area of each polygon. NaN if any vertex is missing.
+
+    """
+    # Shift all polygons to their first vertex to reduce floating point error, as shapely does
+    vertices = vertices - vertices[..., :1, :]
+    x, y = vertices[..., 0], vertices[..., 1]
+
+    return (
+        np.abs(
+            np.sum(x * np.roll(y, -1, axis=-1) - np.roll(x, -1, axis=-1) * y, axis=-1)
+        )
+        / 2
+    )
+
+
+def compute_all_areas(coords: pd.DataFrame, animal_id: str = None) -> np.ndarray:
+    """Compute relevant areas (head, torso, back, full) for all time points in the provided coordinates at once.
+
+    Vectorized equivalent of compute_areas, which avoids building shapely polygons for each frame.
+
+    Args:
+        coords (pd.DataFrame): coordinates of the body parts over time.
+        animal_id (str): animal id for the provided coordinates, if any.
+
+    Returns:
+        np.ndarray: array of shape (frames, 4) including head, torso, back, and full areas per frame.
+
+    """
+    x = coords.xs(key="x", level=1, axis=1)
+    y = coords.xs(key="y", level=1, axis=1)
+
     areas = []
 
-    for bps in [head, torso, back, full]:
+    for bps in _get_area_bodyparts():
 
         if animal_id is not None:
             bps = ["_".join([animal_id, bp]) for bp in bps]
 
-        x = coords.xs(key="x", level=1)[bps]
-        y = coords.xs(key="y", level=1)[bps]
+        areas.append(
+            polygon_area(np.stack([x[bps].to_numpy(), y[bps].to_numpy()], axis=-1))
+        )
 
-        if np.isnan(x).any() or np.isnan(y).any():
-            areas.append(np.nan)
-        else:
-            areas.append(Polygon(zip(x, y)).area)
-
-    return areas
+    return np.stack(areas, axis=1)
 
 
 def rotate(
@@ -506,7 +727,8 @@ def align_trajectories(data: np.array, mode: str = "all") -> np.array:
 
     Args:
         data (numpy.ndarray): 3D array containing positions of body parts over time, where
-        shape is N (sliding window instances) * m (sliding window size) * l (features)
+        shape is N (sliding window instances) * m (sliding window size) * l (features). 2D arrays of shape
+        N (time points) * l (features) are also supported when mode is set to *all* or *none*.
         mode (string): Specifies if *all* instances of each sliding window get aligned, or only the *center*
 
     Returns:
@@ -514,7 +736,6 @@ def align_trajectories(data: np.array, mode: str = "all") -> np.array:
 
     """
     angles = np.zeros(data.shape[0])
-    data = deepcopy(data)
     dshape = data.shape
 
     if mode == "center":
@@ -527,12 +748,17 @@ def align_trajectories(data: np.array, mode: str = "all") -> np.array:
         data = data.reshape(-1, dshape[-1], order="C")
         angles = np.zeros(data.shape[0])
 
-    aligned_trajs = np.zeros(data.shape)
+    # Rotate all body parts in each instance at once, broadcasting the per-instance angles
+    points = data.reshape([data.shape[0], -1, 2], order="C")
+    cos, sin = np.cos(angles)[:, np.newaxis], np.sin(angles)[:, np.newaxis]
 
-    for frame in range(data.shape[0]):
-        aligned_trajs[frame] = rotate(
-            data[frame].reshape([-1, 2], order="C"), angles[frame]
-        ).reshape(data.shape[1:], order="C")
+    aligned_trajs = np.stack(
+        [
+            cos * points[:, :, 0] - sin * points[:, :, 1],
+            sin * points[:, :, 0] + cos * points[:, :, 1],
+        ],
+        axis=-1,
+    ).reshape(data.shape, order="C")
 
     if mode == "all" or mode == "none":
         aligned_trajs = aligned_trajs.reshape(dshape, order="C")
@@ -669,46 +895,32 @@ def kleinberg(
     if k is None:
         k = int(math.ceil(float(1 + math.log(T, s) + math.log(1 / np.amin(gaps), s))))
 
-    def tau(i, j):
-        if i >= j:
-            return 0
-        else:
-            return (j - i) * gamma_log_n
+    # Transition costs between states, as a (to, from) matrix. Moving down is free
+    states = np.arange(k)
+    tau = np.maximum(states[:, np.newaxis] - states[np.newaxis, :], 0) * gamma_log_n
 
-    alpha_function = np.vectorize(lambda x: s**x / g_hat)
-    alpha = alpha_function(np.arange(k))
-
-    def f(j, x):
-        return alpha[j] * math.exp(-alpha[j] * x)
+    alpha = s**states / g_hat
 
     C = np.repeat(float("inf"), k)
     C[0] = 0
 
-    q = np.empty((k, 0))
+    # Keep the best previous state for each state and timestep, and backtrack the optimal path at the end, instead
+    # of copying all paths at every timestep
+    backpointers = np.empty((np.size(gaps), k), dtype=np.int32)
     for t in range(np.size(gaps)):
-        C_prime = np.repeat(float("inf"), k)
-        q_prime = np.empty((k, t + 1))
-        q_prime.fill(np.nan)
-
-        for j in range(k):
-            cost_function = np.vectorize(lambda x: C[x] + tau(x, j))
-            cost = cost_function(np.arange(0, k))
-
-            el = np.argmin(cost)
+        cost = C[np.newaxis, :] + tau
+        el = np.argmin(cost, axis=1)
+        backpointers[t] = el
 
-            if f(j, gaps[t]) > 0:
-                C_prime[j] = cost[el] - math.log(f(j, gaps[t]))
-
-            if t > 0:
-                q_prime[j, :t] = q[el, :]
-
-            q_prime[j, t] = j + 1
-
-        C = C_prime
-        q = q_prime
+        f = alpha * np.exp(-alpha * float(gaps[t]))
+        C = np.repeat(float("inf"), k)
+        C[f > 0] = cost[states, el][f > 0] - np.log(f[f > 0])
 
+    q = np.empty(np.size(gaps))
     j = np.argmin(C)
-    q = q[j, :]
+    for t in range(np.size(gaps) - 1, -1, -1):
+        q[t] = j + 1
+        j = backpointers[t, j]
 
     prev_q = 0
 
@@ -967,22 +1179,189 @@ def smooth_mult_trajectory(
     return smoothed_series
 
 
-def moving_average(time_series: pd.Series, lag: int = 5) -> pd.Series:
+def moving_average(time_series: np.ndarray, lag: int = 5) -> np.ndarray:
     """Fast implementation of a moving average function.
 
+    Computes a centered moving average along the first axis, zero-padding at the edges (as np.convolve with
+    mode="same"). Multivariate time series are processed at once, by summing shifted copies of the whole array.
+
     Args:
-        time_series (pd.Series): Uni-variate time series to take the moving average of.
+        time_series (np.ndarray): Uni-variate or multivariate time series (with time in the first axis) to take the moving average of.
         lag (int): size of the convolution window used to compute the moving average.
 
     Returns:
-        moving_avg (pd.Series): Uni-variate moving average over time_series.
+        moving_avg (np.ndarray): Moving average over time_series, with the same shape as the input.
 
     """
-    moving_avg = np.convolve(time_series, np.ones(lag) / lag, mode="same")
+    time_series = np.asarray(time_series, dtype=float)
+    n_frames = time_series.shape[0]
+
+    # Sum shifted copies of the series, following the window alignment of np.convolve(..., mode="same")
+    moving_avg = time_series.copy()
+    for shift in range(-(lag // 2), (lag - 1) // 2 + 1):
+        if abs(shift) >= n_frames:
+            continue
+        elif shift > 0:
+            moving_avg[: n_frames - shift] += time_series[shift:]
+        elif shift < 0:
+            moving_avg[-shift:] += time_series[:shift]
+    moving_avg /= lag
 
     return moving_avg
 
 
+def iter_padded_chunks(chunks: Iterable, halo: int):
+    """Pad each chunk of a time series with up to halo neighbouring frames on each side.
+
+    Allows filters with a finite support to be applied chunk by chunk, with the same results over each chunk as when
+    applied to the whole series at once.
+
+    Args:
+        chunks (Iterable): consecutive 2D arrays with frames in the first axis. All but the last one must have at least halo frames.
+        halo (int): number of neighbouring frames to include on each side of each chunk, when available.
+
+    Yields:
+        Tuple: global index of the first frame of the chunk, padded chunk, and slice selecting the chunk within it.
+
+    """
+    start, prev, cur = 0, None, None
+    for nxt in chunks:
+        if cur is not None:
+            core = slice(len(prev), len(prev) + len(cur))
+            yield start, np.concatenate([prev, cur, nxt[:halo]]), core
+            start += len(cur)
+            prev = np.concatenate([prev, cur])
+            prev = prev[len(prev) - min(halo, len(prev)) :]
+        else:
+            prev = nxt[:0]
+        cur = nxt
+
+    if cur is not None:
+        yield start, np.concatenate([prev, cur]), slice(len(prev), None)
+
+
+def smooth_padded_chunk(
+    window: np.ndarray,
+    alpha: int,
+    w_length: int,
+    at_start: bool = True,
+    at_end: bool = True,
+) -> np.ndarray:
+    """Smooth a chunk of a trajectory padded with neighbouring frames, as yielded by iter_padded_chunks.
+
+    Frames within w_length of the edges of the window are only fitted by the smoothing filter when they are edges of
+    the whole trajectory. Otherwise, their values do not reach the padded chunk, and missing values can be zeroed out
+    to keep the filter from failing.
+
+    Args:
+        window (np.ndarray): padded chunk of the trajectory, with frames in the first axis.
+        alpha (int): see smooth_mult_trajectory.
+        w_length (int): see smooth_mult_trajectory. Padding should be at least twice as long.
+        at_start (bool): whether the window starts at the first frame of the trajectory.
+        at_end (bool): whether the window ends at the last frame of the trajectory.
+
+    Returns:
+        smoothed_window (np.ndarray): smoothed version of the window, with equal shape.
+
+    """
+    window = window.copy()
+    if not at_start:
+        window[:w_length] = np.nan_to_num(window[:w_length])
+    if not at_end:
+        window[-w_length:] = np.nan_to_num(window[-w_length:])
+
+    return smooth_mult_trajectory(window, alpha=alpha, w_length=w_length)
+
+
+def update_residual_statistics(
+    residuals: np.ndarray, statistics: tuple = None
+) -> tuple:
+    """Merge the per-column statistics of a chunk of moving average residuals into running ones, ignoring missing values.
+
+    Uses the pairwise update by Chan et al., so that statistics can be computed over arbitrarily long series in chunks.
+
+    Args:
+        residuals (np.ndarray): 2D array of residuals, with frames in the first axis.
+        statistics (tuple): counts, means and sums of squared deviations per column, as returned by a previous call. If None (default), statistics of the current chunk are returned.
+
+    Returns:
+        statistics (tuple): updated counts, means and sums of squared deviations per column.
+
+    """
+    if statistics is None:
+        statistics = tuple(np.zeros(residuals.shape[1]) for _ in range(3))
+    counts, means, sq_diffs = statistics
+
+    chunk_counts = np.sum(~np.isnan(residuals), axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        chunk_means = np.nanmean(residuals, axis=0)
+        chunk_sq_diffs = np.nansum((residuals - chunk_means) ** 2, axis=0)
+
+    total = counts + chunk_counts
+    delta = np.nan_to_num(chunk_means - means)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = np.where(total > 0, chunk_counts / total, 0.0)
+
+    return (
+        total,
+        means + delta * weight,
+        sq_diffs + chunk_sq_diffs + delta**2 * counts * weight,
+    )
+
+
+def residual_thresholds(statistics: tuple, n_std: float) -> np.ndarray:
+    """Return per-column outlier thresholds, n_std standard deviations over the mean of the moving average residuals.
+
+    Args:
+        statistics (tuple): counts, means and sums of squared deviations per column, as returned by update_residual_statistics.
+        n_std (float): Number of standard deviations over the mean to be considered an outlier.
+
+    Returns:
+        thresholds (np.ndarray): threshold per column. Columns without any valid residuals get a missing value.
+
+    """
+    counts, means, sq_diffs = statistics
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, means + n_std * np.sqrt(sq_diffs / counts), np.nan)
+
+
+def outlier_mask_from_residuals(
+    residuals: np.ndarray,
+    thresholds: np.ndarray,
+    low_likelihood: np.ndarray,
+    bpart_idx: np.ndarray,
+    mode: str,
+) -> np.ndarray:
+    """Combine residual and likelihood based outliers per body part, and broadcast them to all coordinates.
+
+    Args:
+        residuals (np.ndarray): 2D array of moving average residuals, with one column per coordinate.
+        thresholds (np.ndarray): outlier threshold per coordinate, as returned by residual_thresholds.
+        low_likelihood (np.ndarray): boolean 2D array, with one column per body part, marking low likelihood frames.
+        bpart_idx (np.ndarray): column in low_likelihood of the body part of each coordinate.
+        mode (str): If "and", all coordinates of a body part have to be marked in order to call an outlier. If "or", one is enough.
+
+    Returns:
+        mask (np.ndarray): boolean array with the same shape as residuals. True indicates an outlier.
+
+    """
+    if mode not in ["and", "or"]:
+        raise ValueError('mode must be one of "and" or "or"')
+
+    with np.errstate(invalid="ignore"):
+        outliers = np.abs(residuals) > thresholds
+
+    mask = low_likelihood.copy()
+    for bpart in np.unique(bpart_idx):
+        bpart_outliers = outliers[:, bpart_idx == bpart]
+        mask[:, bpart] |= (
+            bpart_outliers.all(axis=1) if mode == "and" else bpart_outliers.any(axis=1)
+        )
+
+    return mask[:, bpart_idx]
+
+
 def mask_outliers(
     time_series: pd.DataFrame,
     likelihood: pd.DataFrame,
@@ -1040,7 +1419,10 @@ def full_outlier_mask(
     n_std: int,
     mode: str,
 ) -> pd.DataFrame:
-    """Iterate over all body parts of experiment, and outputs a dataframe where all x, y positions are replaced by a boolean mask, where True indicates an outlier.
+    """Compute a boolean mask over all body parts of experiment, where True indicates an outlier.
+
+    All body parts are processed at once: moving averages are computed in a single batched convolution, and residual
+    statistics are computed per column. Results are equivalent to applying mask_outliers to each body part.
 
     Args:
         experiment (pd.DataFrame): Data frame with time series representing the x, y positions of every body part
@@ -1055,30 +1437,105 @@ def full_outlier_mask(
         full_mask (pd.DataFrame): Mask over all body parts in experiment. True indicates an outlier
 
     """
-    body_parts = experiment.columns.levels[0]
-    full_mask = experiment.copy()
-
     if exclude:
-        full_mask.drop(exclude, axis=1, inplace=True)
-
-    for bpart in body_parts:
-        if bpart != exclude:
-            mask = mask_outliers(
-                experiment[bpart],
-                likelihood[bpart],
-                likelihood_tolerance,
-                lag,
-                n_std,
-                mode,
-            )
+        experiment = experiment.drop(exclude, axis=1)
 
-            full_mask.loc[:, (bpart, "x")] = mask
-            full_mask.loc[:, (bpart, "y")] = mask
-            continue
+    body_parts = experiment.columns.unique(0)
+    coords = experiment.to_numpy(dtype=float)
+
+    # Residuals from a moving average model, and per-column thresholds (ignoring the first and last lag frames)
+    residuals = coords - moving_average(coords, lag)
+    thresholds = residual_thresholds(
+        update_residual_statistics(residuals[lag:-lag]), n_std
+    )
+
+    # Combine x and y masks per body part, add low likelihood frames, and broadcast them to all coordinates
+    full_mask = pd.DataFrame(
+        outlier_mask_from_residuals(
+            residuals,
+            thresholds,
+            likelihood.loc[:, body_parts].to_numpy() < likelihood_tolerance,
+            body_parts.get_indexer(experiment.columns.get_level_values(0)),
+            mode,
+        ),
+        index=experiment.index,
+        columns=experiment.columns,
+    )
 
     return full_mask
 
 
+def interpolate_gaps(
+    values: np.ndarray,
+    out: np.ndarray,
+    start: int = 0,
+    limit: int = 10,
+    state: tuple = None,
+    last: bool = True,
+) -> tuple:
+    """Linearly interpolate missing values in a chunk of a multivariate time series, column by column.
+
+    Equivalent to pd.DataFrame.interpolate with method="linear", limit=limit and limit_direction="both" when applied to
+    the whole series at once. Series can also be processed in consecutive chunks, in which case gaps spanning several
+    chunks are filled once their end is reached, by writing to frames of previous chunks in out.
+
+    Args:
+        values (np.ndarray): 2D array with missing values, holding frames start to start + len(values) of the series.
+        out (np.ndarray): 2D array-like indexed by global frame positions, to which interpolated values are written. Other frames are left untouched.
+        start (int): global index of the first frame in values.
+        limit (int): Maximum number of consecutive missing values to fill from each side of a gap.
+        state (tuple): position and value of the last valid frame per column, as returned by the call on the previous chunk. None (default) for the first chunk.
+        last (bool): whether values contains the last frame of the series, in which case missing frames after the last valid one are filled forward.
+
+    Returns:
+        state (tuple): position and value of the last valid frame per column, to pass on to the next chunk.
+
+    """
+    if state is None:
+        state = np.full(values.shape[1], -1), np.full(values.shape[1], np.nan)
+    last_valid, last_value = (arr.copy() for arr in state)
+
+    for col in range(values.shape[1]):
+        valid = np.where(~np.isnan(values[:, col]))[0]
+        if len(valid) == 0:
+            continue
+
+        xp, fp = valid + start, values[valid, col]
+        if last_valid[col] >= 0:
+            xp = np.concatenate([[last_valid[col]], xp])
+            fp = np.concatenate([[last_value[col]], fp])
+
+        # Candidate frames: missing frames in the current chunk, and frames carried over from previous ones
+        gap_start = last_valid[col] + 1
+        candidates = np.unique(
+            np.concatenate(
+                [
+                    np.arange(gap_start, min(gap_start + limit, start)),
+                    np.arange(max(valid[0] + start - limit, gap_start), start),
+                    np.where(np.isnan(values[: valid[-1], col]))[0] + start,
+                ]
+            )
+        ).astype(int)
+
+        nxt = np.searchsorted(xp, candidates)
+        close_to_prev = (nxt > 0) & (candidates - xp[np.maximum(nxt - 1, 0)] <= limit)
+        close_to_next = xp[nxt] - candidates <= limit
+        candidates = candidates[close_to_prev | close_to_next]
+
+        out[candidates, col] = np.interp(candidates, xp, fp)
+        last_valid[col], last_value[col] = xp[-1], fp[-1]
+
+    if last:
+        # Fill the frames following the last valid value of each column
+        n_frames = start + values.shape[0]
+        for col in np.where(last_valid >= 0)[0]:
+            out[
+                last_valid[col] + 1 : min(last_valid[col] + limit + 1, n_frames), col
+            ] = last_value[col]
+
+    return last_valid, last_value
+
+
 def interpolate_outliers(
     experiment: pd.DataFrame,
     likelihood: pd.DataFrame,
@@ -1107,23 +1564,22 @@ def interpolate_outliers(
         interpolated_exp (pd.DataFrame): Interpolated version of experiment.
 
     """
-    interpolated_exp = experiment.copy()
-
     # Creates a mask marking all outliers
     mask = full_outlier_mask(
         experiment, likelihood, likelihood_tolerance, exclude, lag, n_std, mode
-    )
+    ).reindex(columns=experiment.columns, fill_value=False)
+
+    values = experiment.to_numpy(dtype=float)
+    masked = np.where(mask.to_numpy(dtype=bool), np.nan, values)
+    interpolated = masked.copy()
+    interpolate_gaps(masked, interpolated, limit=limit)
 
-    interpolated_exp[mask] = np.nan
-    interpolated_exp.interpolate(
-        method="linear", limit=limit, limit_direction="both", inplace=True
-    )
     # Add original frames to what happens before lag
-    interpolated_exp = pd.concat(
-        [experiment.iloc[:lag, :], interpolated_exp.iloc[lag:, :]]
-    )
+    interpolated[:lag] = values[:lag]
 
-    return interpolated_exp
+    return pd.DataFrame(
+        interpolated, index=experiment.index, columns=experiment.columns
+    )
 
 
 def filter_columns(columns: list, selected_id: str) -> list:
@@ -1163,6 +1619,36 @@ def filter_columns(columns: list, selected_id: str) -> list:
     return columns_to_keep
 
 
+def get_video_metadata(video_path: str) -> dict:
+    """Return the frame rate, number of frames and resolution of a video, as stored in its container.
+
+    Only the container headers are read, so no frames are decoded.
+
+    Args:
+        video_path (str): Path to the video file.
+
+    Returns:
+        metadata (dict): Dictionary with the frame rate ("frame_rate"), number of frames ("n_frames"), and resolution
+        ("resolution", as a (width, height) tuple in pixels, following the layout of Coordinates._video_resolution).
+
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError("Could not open video file: {}".format(video_path))
+
+    metadata = {
+        "frame_rate": cap.get(cv2.CAP_PROP_FPS),
+        "n_frames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        "resolution": (
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        ),
+    }
+    cap.release()
+
+    return metadata
+
+
 def get_arenas(
     arena: str,
     arena_dims: int,
@@ -1170,6 +1656,10 @@ def get_arenas(
     project_name: str,
     tables: dict,
     videos: list = None,
+    n_jobs: int = 1,
+    sample_frames: int = None,
+    max_size: int = None,
+    video_metadata: list = None,
 ):
     """Extract arena parameters from a project or coordinates object.
 
@@ -1180,6 +1670,11 @@ def get_arenas(
         project_name (str): Name of project.
         tables (dict): List of tables to extract arena parameters from.
         videos (list): List of videos to extract arena parameters from. Defaults to None (all videos are used).
+        n_jobs (int): Number of videos to process in parallel threads when detecting arenas automatically.
+        sample_frames (int): Number of evenly spaced frames per video to use for automatic detection. See automatically_recognize_arena.
+        max_size (int): Maximum frame size used for automatic detection. See automatically_recognize_arena.
+        video_metadata (list): Metadata of each video, as returned by get_video_metadata. If provided, video
+        resolutions are taken from it instead of from the decoded frames.
 
     Returns:
         arena_params (list): List of arena parameters.
@@ -1236,14 +1731,21 @@ def get_arenas(
 
     elif arena in ["circular-autodetect"]:
 
-        for vid_index, _ in enumerate(videos):
-            ellipse, h, w = automatically_recognize_arena(
+        # Video decoding and contour detection release the GIL, so videos can be processed in threads
+        detected_arenas = Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(automatically_recognize_arena)(
                 videos=videos,
                 tables=tables,
                 vid_index=vid_index,
                 path=os.path.join(project_path, project_name, "Videos"),
                 arena_type=arena,
+                sample_frames=sample_frames,
+                max_size=max_size,
             )
+            for vid_index in range(len(videos))
+        )
+
+        for ellipse, h, w in detected_arenas:
 
             # scales contains the coordinates of the center of the arena,
             # the absolute diameter measured from the video in pixels, and
@@ -1271,6 +1773,9 @@ def get_arenas(
             "arenas must be set to one of: 'polygonal-manual', 'circular-autodetect'"
         )
 
+    if video_metadata is not None:
+        video_resolution = [metadata["resolution"] for metadata in video_metadata]
+
     return np.array(scales), arena_params, video_resolution
 
 
@@ -1282,6 +1787,8 @@ def automatically_recognize_arena(
     tables: dict = None,
     recoglimit: int = 500,
     arena_type: str = "circular-autodetect",
+    sample_frames: int = None,
+    max_size: int = None,
 ) -> Tuple[np.array, int, int]:
     """Return numpy.ndarray with information about the arena recognised from the first frames of the video.
 
@@ -1295,6 +1802,8 @@ def automatically_recognize_arena(
         recoglimit (int): Number of frames to use for position estimates.
         potentially more accurate in poor lighting conditions.
         arena_type (string): Arena type; must be one of ['circular-autodetect', 'circular-manual', 'polygon-manual'].
+        sample_frames (int): If provided, the given number of frames, evenly spaced across the whole video, are used instead of the first recoglimit frames. Each of them is decoded only once, seeking directly to its position.
+        max_size (int): If provided, frames are downsampled so that their largest side is at most max_size pixels before recognition. Results are rescaled to the original resolution.
 
     Returns:
         arena (np.ndarray): 1D-array containing information about the arena.
@@ -1307,10 +1816,35 @@ def automatically_recognize_arena(
     # "polygonal-manual" (2n-element-array) -> x-y position of each of the n the vertices of the polygon.
     cap = cv2.VideoCapture(os.path.join(path, videos[vid_index]))
 
+    # Select evenly spaced frames across the video, if specified
+    frame_indices = None
+    if sample_frames is not None:
+        # Some containers do not report a frame count. If so, rely on the length of the tracking table
+        n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if tables is not None:
+            table_length = tables[list(tables.keys())[vid_index]].shape[0]
+            n_frames = min(n_frames, table_length) if n_frames > 0 else table_length
+
+        if n_frames <= 0:
+            cap.release()
+            raise ValueError(
+                "Could not determine the number of frames of {}. Set sample_frames to None to use the first frames "
+                "of the video instead".format(videos[vid_index])
+            )
+
+        frame_indices = np.unique(
+            np.linspace(0, n_frames - 1, sample_frames).astype(int)
+        )
+        recoglimit = len(frame_indices)
+
     if tables is not None:
         # Select relevant table to check animal positions; if animals are close to the arena, do not take those frames
         # into account
-        centers = tables[list(tables.keys())[vid_index]].iloc[:recoglimit, :]
+        centers = tables[list(tables.keys())[vid_index]]
+        if frame_indices is not None:
+            centers = centers.iloc[frame_indices, :]
+        else:
+            centers = centers.iloc[:recoglimit, :]
 
         # Fix the edge case where there are less frames than the minimum specified for recognition
         recoglimit = np.min([recoglimit, centers.shape[0]])
@@ -1321,10 +1855,13 @@ def automatically_recognize_arena(
         ]
         centers_shape = centers.shape
 
-    # Loop over the first frames in the video to get resolution and center of the arena
+    # Loop over the selected frames in the video to get resolution and center of the arena
     arena, fnum, h, w = None, 0, None, None
 
     while cap.isOpened() and fnum < recoglimit:
+        if frame_indices is not None:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_indices[fnum])
+
         ret, frame = cap.read()
         # if frame is read correctly ret is True
         if not ret:  # pragma: no cover
@@ -1333,9 +1870,28 @@ def automatically_recognize_arena(
 
         if arena_type == "circular-autodetect":
 
+            if h is None and w is None:
+                w, h = frame.shape[0], frame.shape[1]
+
+            # Downsample large frames before detection, and rescale the results back
+            scale = 1.0
+            if max_size is not None and max(frame.shape[:2]) > max_size:
+                scale = max_size / max(frame.shape[:2])
+                frame = cv2.resize(
+                    frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+                )
+
             # Detect arena and extract positions
             temp_center, temp_axes, temp_angle = circular_arena_recognition(frame)
-            temp_arena = np.array([[*temp_center, *temp_axes, temp_angle]])
+            temp_arena = np.array(
+                [
+                    [
+                        *(np.array(temp_center) / scale),
+                        *(np.array(temp_axes) / scale),
+                        temp_angle,
+                    ]
+                ]
+            )
 
             # Set if not assigned, else concat and return the median
             if arena is None:
@@ -1343,9 +1899,6 @@ def automatically_recognize_arena(
             else:
                 arena = np.concatenate([arena, temp_arena], axis=0)
 
-            if h is None and w is None:
-                w, h = frame.shape[0], frame.shape[1]
-
         fnum += 1
 
     cap.release()
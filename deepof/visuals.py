@@ -7,7 +7,10 @@ import collections
 
 from collections import defaultdict
 from collections.abc import Sequence
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from functools import partial
 from itertools import cycle, product, combinations
+from joblib import effective_n_jobs
 from matplotlib.animation import FuncAnimation, FFMpegWriter
 from matplotlib.colors import ListedColormap, LinearSegmentedColormap
 from matplotlib.patches import Ellipse
@@ -16,7 +19,8 @@ from scipy.signal import savgol_filter
 from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
 from sklearn.metrics import balanced_accuracy_score, confusion_matrix
 from statannotations.Annotator import Annotator
-from typing import Any, List, NewType, Union
+from types import SimpleNamespace
+from typing import Any, Callable, Iterable, List, NewType, Union
 import calendar
 import copy
 import cv2
@@ -26,10 +30,12 @@ import networkx as nx
 import numpy as np
 import os
 import pandas as pd
+import queue
 import re
 import seaborn as sns
 import shap
 import tensorflow as tf
+import threading
 import time
 import umap
 import warnings
@@ -2070,6 +2076,130 @@ def plot_shap_swarm_per_cluster(
         plt.show()
 
 
+def get_frame_bouts(frame_mask: np.ndarray) -> np.ndarray:
+    """Return the start (included) and end (excluded) indices of all contiguous runs of selected frames in a mask.
+
+    Args:
+        frame_mask: boolean array indicating whether each frame is selected
+
+    Returns:
+        bouts: array of shape (n_bouts, 2), with the first and (one past the) last frame of each bout
+
+    """
+    padded = np.concatenate([[False], np.asarray(frame_mask, dtype=bool), [False]])
+    return np.flatnonzero(padded[1:] != padded[:-1]).reshape(-1, 2)
+
+
+def extract_frames(cap: Any, frame_mask: np.ndarray, seek_gap: int = 100):
+    """Yield the index and contents of all frames selected in a mask, seeking directly to the start of each bout.
+
+    Gaps shorter than seek_gap frames are skipped by grabbing frames without decoding them, since seeking involves
+    decoding forward from the previous keyframe anyway.
+
+    Args:
+        cap: video capture object, positioned at the first frame
+        frame_mask: boolean array indicating whether each frame should be extracted
+        seek_gap: minimum number of frames between bouts for the video to be seeked instead of read
+
+    """
+    position = 0
+    for start, end in get_frame_bouts(frame_mask):
+
+        if start - position >= seek_gap:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        else:
+            for _ in range(start - position):
+                if not cap.grab():
+                    return
+
+        for idx in range(start, end):
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield idx, frame
+
+        position = end
+
+
+def render_frames(
+    frames: Iterable,
+    annotate: Callable,
+    write: Callable,
+    n_jobs: int = 1,
+    buffer_size: int = None,
+):
+    """Decode, annotate and encode video frames in a pipeline.
+
+    With more than one job, frames are decoded in a dedicated thread into a bounded queue, annotated by n_jobs worker
+    threads, and handed to the encoder in their original order from the calling thread. Since OpenCV releases the
+    GIL while decoding, drawing and encoding, all stages run concurrently on multi-core machines.
+
+    Args:
+        frames: iterable yielding (frame index, frame) tuples, such as the output of extract_frames
+        annotate: function taking a frame index and a frame, and returning the frame to write
+        write: function taking a frame index and an annotated frame, which encodes it
+        n_jobs: number of annotation workers. If 1 (default), all stages run sequentially in the calling thread.
+        Non-positive values are resolved as in joblib, so -1 uses one worker per CPU core
+        buffer_size: maximum number of frames waiting in each stage. Defaults to four times n_jobs
+
+    """
+    n_jobs = effective_n_jobs(n_jobs)
+    if n_jobs == 1:
+        for idx, frame in frames:
+            write(idx, annotate(idx, frame))
+        return
+
+    if buffer_size is None:
+        buffer_size = 4 * n_jobs
+
+    decoded, errors, stop = queue.Queue(maxsize=buffer_size), [], threading.Event()
+
+    def put(item):
+        """Add an item to the decoded queue, unless the pipeline is stopped."""
+        while not stop.is_set():
+            try:
+                decoded.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def decode():
+        """Produce decoded frames, followed by None to signal the end of the video."""
+        try:
+            for item in frames:
+                if not put(item):
+                    return
+        except Exception as error:
+            errors.append(error)
+        put(None)
+
+    decoder = threading.Thread(target=decode, daemon=True)
+    decoder.start()
+
+    try:
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            pending = collections.deque()
+            for item in iter(decoded.get, None):
+                pending.append((item[0], pool.submit(annotate, *item)))
+
+                # Encode frames in order, as soon as the buffer is full
+                if len(pending) >= buffer_size:
+                    idx, future = pending.popleft()
+                    write(idx, future.result())
+
+            while pending:
+                idx, future = pending.popleft()
+                write(idx, future.result())
+
+    finally:
+        stop.set()
+        decoder.join()
+
+    if errors:
+        raise errors[0]
+
+
 def output_cluster_video(
     cap: Any,
     out: Any,
@@ -2078,6 +2208,7 @@ def output_cluster_video(
     v_height: int,
     path: str,
     frame_limit: int = np.inf,
+    n_jobs: int = 1,
 ):
     """Output a video with the frames corresponding to the cluster.
 
@@ -2089,43 +2220,104 @@ def output_cluster_video(
         v_height: video height
         path: path to the video file
         frame_limit: maximum number of frames to render
+        n_jobs: number of threads used to annotate frames. See render_frames
 
     """
-    i = 0
-    j = 0
-    while cap.isOpened() and j < frame_limit:
-        ret, frame = cap.read()
-        if ret == False:
-            break
+    # Only keep the first frame_limit selected frames
+    selected = np.flatnonzero(frame_mask)
+    frame_mask = np.zeros(len(frame_mask), dtype=bool)
+    frame_mask[selected[:frame_limit] if frame_limit < np.inf else selected] = True
 
-        try:
-            if frame_mask[i]:
-
-                res_frame = cv2.resize(frame, [v_width, v_height])
-                re_path = re.findall(".+/(.+)DLC", path)[0]
-
-                if path is not None:
-                    cv2.putText(
-                        res_frame,
-                        re_path,
-                        (int(v_width * 0.3 / 10), int(v_height / 1.05)),
-                        cv2.FONT_HERSHEY_DUPLEX,
-                        0.75,
-                        (255, 255, 255),
-                        2,
-                    )
-
-                out.write(res_frame)
-                j += 1
+    try:
+        re_path = re.findall(".+/(.+)DLC", path)[0]
+    except IndexError:
+        re_path = os.path.splitext(os.path.basename(path))[0]
+
+    def annotate(idx, frame):
+        """Resize the frame and add the name of the video."""
+        res_frame = cv2.resize(frame, [v_width, v_height])
+        cv2.putText(
+            res_frame,
+            re_path,
+            (int(v_width * 0.3 / 10), int(v_height / 1.05)),
+            cv2.FONT_HERSHEY_DUPLEX,
+            0.75,
+            (255, 255, 255),
+            2,
+        )
+        return res_frame
 
-            i += 1
-        except IndexError:
-            ret = False
+    render_frames(
+        extract_frames(cap, frame_mask),
+        annotate,
+        lambda idx, frame: out.write(frame),
+        n_jobs=n_jobs,
+    )
 
     cap.release()
     cv2.destroyAllWindows()
 
 
+def demultiplex_cluster_video(
+    path: str,
+    frame_assignments: np.ndarray,
+    writers: dict,
+    v_width: int,
+    v_height: int,
+    frame_limit: int = np.inf,
+    n_jobs: int = 1,
+):
+    """Decode a video once, and write each frame to the video writer of the cluster it is assigned to.
+
+    Only rendered frames are decoded, seeking directly to each bout of them.
+
+    Args:
+        path: path to the video file
+        frame_assignments: cluster assigned to each frame of the video. Frames assigned to -1 are skipped
+        writers: dictionary with cluster ids as keys and video writer objects as values
+        v_width: output video width
+        v_height: output video height
+        frame_limit: maximum number of frames to render per cluster
+        n_jobs: number of threads used to annotate frames. See render_frames
+
+    """
+    try:
+        video_name = re.findall(".+/(.+)DLC", path)[0]
+    except IndexError:
+        video_name = os.path.splitext(os.path.basename(path))[0]
+
+    # Select the first frame_limit frames assigned to each cluster, and decode only those
+    frame_mask = np.zeros(len(frame_assignments), dtype=bool)
+    for cluster_id in writers:
+        selected = np.flatnonzero(frame_assignments == cluster_id)
+        frame_mask[selected[:frame_limit] if frame_limit < np.inf else selected] = True
+
+    def annotate(idx, frame):
+        """Resize the frame and add the name of the video."""
+        res_frame = cv2.resize(frame, [v_width, v_height])
+        cv2.putText(
+            res_frame,
+            video_name,
+            (int(v_width * 0.3 / 10), int(v_height / 1.05)),
+            cv2.FONT_HERSHEY_DUPLEX,
+            0.75,
+            (255, 255, 255),
+            2,
+        )
+        return res_frame
+
+    cap = cv2.VideoCapture(path)
+    try:
+        render_frames(
+            extract_frames(cap, frame_mask),
+            annotate,
+            lambda idx, frame: writers[frame_assignments[idx]].write(frame),
+            n_jobs=n_jobs,
+        )
+    finally:
+        cap.release()
+
+
 def output_videos_per_cluster(
     video_paths: list,
     breaks: list,
@@ -2137,9 +2329,16 @@ def output_videos_per_cluster(
     min_confidence: float = 0.0,
     min_bout_duration: int = None,
     out_path: str = ".",
+    n_jobs: int = 1,
+    buffer_size: int = 64,
 ):
     """Given a list of videos, and a list of soft counts per video, outputs a video for each cluster.
 
+    Each input video is decoded only once, and its frames are routed to the output video of the cluster they are
+    assigned to. With more than one job, videos are decoded and annotated concurrently in threads, each into a bounded
+    queue, and queues are drained into the output videos in the order of video_paths. Output videos are identical to
+    those written sequentially.
+
     Args:
         video_paths: list of paths to the videos
         breaks: list of breaks between videos
@@ -2151,12 +2350,41 @@ def output_videos_per_cluster(
         min_confidence: minimum confidence threshold for a frame to be considered part of a cluster.
         min_bout_duration: minimum duration of a bout to be considered.
         out_path: path to the output directory.
+        n_jobs: number of videos to decode and annotate concurrently, resolving non-positive values as in joblib. Jobs left over when there are fewer videos than jobs annotate the frames of each video (see render_frames)
+        buffer_size: maximum number of annotated frames waiting to be written, per video being processed
 
     """
-    # Iterate over all clusters, and output a masked video for each
-    for cluster_id in range(soft_counts[0].shape[1]):
+    v_width, v_height = single_output_resolution
+
+    # Assign each frame of each video to a cluster, or to -1 if it should not be rendered
+    frame_assignments = []
+    for i in range(len(video_paths)):
+
+        # Get hard counts and confidence estimates per cluster
+        hard_counts = np.argmax(soft_counts[i], axis=1)
+        confidence = np.max(soft_counts[i], axis=1)
+        confidence_indices = np.ones(hard_counts.shape[0], dtype=bool)
 
-        out = cv2.VideoWriter(
+        # Compute confidence mask, filtering out also bouts that are too short
+        confidence_indices = deepof.utils.filter_short_bouts(
+            hard_counts,
+            confidence,
+            confidence_indices,
+            min_confidence,
+            min_bout_duration,
+        )
+
+        # Extend assignments using the corresponding breaks, to select and output all relevant video frames
+        # Add a prefix to the assignments, to account for the frames lost by the sliding window
+        assignments = np.repeat(
+            np.where(confidence_indices, hard_counts, -1), breaks[i]
+        )
+        frame_assignments.append(
+            np.concatenate((np.full(window_length, -1), assignments))
+        )
+
+    writers = {
+        cluster_id: cv2.VideoWriter(
             os.path.join(
                 out_path,
                 "deepof_unsupervised_annotation_cluster={}_threshold={}_{}.mp4".format(
@@ -2167,45 +2395,77 @@ def output_videos_per_cluster(
             frame_rate,
             single_output_resolution,
         )
+        for cluster_id in range(soft_counts[0].shape[1])
+    }
 
-        for i, path in enumerate(video_paths):
-
-            # Get hard counts and confidence estimates per cluster
-            hard_counts = np.argmax(soft_counts[i], axis=1)
-            confidence = np.max(soft_counts[i], axis=1)
-            confidence_indices = np.ones(hard_counts.shape[0], dtype=bool)
-
-            # Given a frame mask, output a subset of the given video to disk, corresponding to a particular cluster
-            cap = cv2.VideoCapture(path)
-            v_width, v_height = single_output_resolution
-
-            # Compute confidence mask, filtering out also bouts that are too short
-            confidence_indices = deepof.utils.filter_short_bouts(
-                hard_counts,
-                confidence,
-                confidence_indices,
-                min_confidence,
-                min_bout_duration,
-            )
-            confidence_mask = (hard_counts == cluster_id) & confidence_indices
-
-            # Extend confidence mask using the corresponding breaks, to select and output all relevant video frames
-            # Add a prefix of zeros to the mask, to account for the frames lost by the sliding window
-            frame_mask = np.repeat(confidence_mask, breaks[i])
-            frame_mask = np.concatenate(
-                (np.zeros(window_length, dtype=bool), frame_mask)
-            )
+    n_jobs = effective_n_jobs(n_jobs)
+    frame_jobs = max(1, n_jobs // len(video_paths))
 
-            output_cluster_video(
-                cap,
-                out,
-                frame_mask,
+    if n_jobs == 1 or len(video_paths) == 1:
+        for path, assignments in zip(video_paths, frame_assignments):
+            demultiplex_cluster_video(
+                path,
+                assignments,
+                writers,
                 v_width,
                 v_height,
-                path,
                 frame_limit_per_video,
+                n_jobs=frame_jobs,
             )
 
+    else:
+        decoded = [queue.Queue(maxsize=buffer_size) for _ in video_paths]
+        stop = threading.Event()
+
+        def put(i, item):
+            """Add an item to the queue of video i, unless writing has stopped."""
+            while not stop.is_set():
+                try:
+                    decoded[i].put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def write(i, cluster_id, frame):
+            """Queue an annotated frame of video i, aborting its decoding if writing has stopped."""
+            if not put(i, (cluster_id, frame)):
+                raise CancelledError()
+
+        def demultiplex(i):
+            """Route the annotated frames of video i to its queue, followed by None to signal the end of the video."""
+            try:
+                demultiplex_cluster_video(
+                    video_paths[i],
+                    frame_assignments[i],
+                    {
+                        cluster_id: SimpleNamespace(write=partial(write, i, cluster_id))
+                        for cluster_id in writers
+                    },
+                    v_width,
+                    v_height,
+                    frame_limit_per_video,
+                    n_jobs=frame_jobs,
+                )
+            finally:
+                put(i, None)
+
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(demultiplex, i) for i in range(len(video_paths))]
+            try:
+                for i, future in enumerate(futures):
+                    for cluster_id, frame in iter(decoded[i].get, None):
+                        writers[cluster_id].write(frame)
+                    future.result()
+
+            finally:
+                stop.set()
+                for future in futures:
+                    future.cancel()
+
+    for writer in writers.values():
+        writer.release()
+
 
 def output_unsupervised_annotated_video(
     video_path: str,
@@ -2216,6 +2476,7 @@ def output_unsupervised_annotated_video(
     window_length: int = None,
     cluster_names: dict = {},
     out_path: str = ".",
+    n_jobs: int = 1,
 ):
     """Given a video, and soft_counts per frame, outputs a video with the frames annotated with the cluster they belong to.
 
@@ -2228,6 +2489,7 @@ def output_unsupervised_annotated_video(
         window_length: window length used to compute the soft counts.
         cluster_names: dictionary with user-defined names for each cluster (useful to output interpretation).
         out_path: out_path: path to the output directory.
+        n_jobs: number of threads used to annotate frames. See render_frames
 
     """
     # Get cluster assignment per frame
@@ -2255,33 +2517,30 @@ def output_unsupervised_annotated_video(
         video_out, cv2.VideoWriter_fourcc(*"mp4v"), frame_rate, (v_width, v_height)
     )
 
-    i, j = 0, 0
-    while cap.isOpened() and i < frame_limit:
-        if j >= window_length:
-            j += 1
+    # Render the first frame_limit frames with an assigned cluster, without decoding the rest of the video
+    frame_mask = np.arange(assignments_per_frame.shape[0]) < frame_limit
 
-        else:
-            ret, frame = cap.read()
-            if ret == False:
-                break
-
-            try:
-                cv2.putText(
-                    frame,
-                    "Cluster {}".format(cluster_labels[assignments_per_frame[i]]),
-                    (int(v_width * 0.3 / 10), int(v_height / 1.05)),
-                    cv2.FONT_HERSHEY_DUPLEX,
-                    0.75,
-                    (255, 255, 255),
-                    2,
-                )
-                out.write(frame)
-
-                i += 1
+    def annotate(idx, frame):
+        """Add the assigned cluster to the frame."""
+        cv2.putText(
+            frame,
+            "Cluster {}".format(cluster_labels[assignments_per_frame[idx]]),
+            (int(v_width * 0.3 / 10), int(v_height / 1.05)),
+            cv2.FONT_HERSHEY_DUPLEX,
+            0.75,
+            (255, 255, 255),
+            2,
+        )
+        return frame
 
-            except IndexError:
-                ret = False
+    render_frames(
+        extract_frames(cap, frame_mask),
+        annotate,
+        lambda idx, frame: out.write(frame),
+        n_jobs=n_jobs,
+    )
 
+    out.release()
     cap.release()
     cv2.destroyAllWindows()
 
@@ -2296,6 +2555,7 @@ def export_annotated_video(
     frame_limit_per_video: int = np.inf,
     exp_conditions: dict = {},
     cluster_names: dict = {},
+    n_jobs: int = 1,
 ):
     """Export annotated videos from both supervised and unsupervised pipelines.
 
@@ -2309,6 +2569,7 @@ def export_annotated_video(
         frame_limit_per_video (int): number of frames to render per video. If None, all frames are included for all videos.
         exp_conditions (dict): if provided, data coming from a particular condition is used. If not, all conditions are exported. If a dictionary with more than one entry is provided, the intersection of all conditions (i.e. male, stressed) is used.
         cluster_names (dict): dictionary with user-defined names for each cluster (useful to output interpretation).
+        n_jobs (int): number of threads to use when rendering videos: videos decoded concurrently when outputting a video per cluster, or annotation workers when outputting a single experiment. See output_videos_per_cluster and render_frames.
 
     """
     # Create output directory if it doesn't exist
@@ -2371,6 +2632,7 @@ def export_annotated_video(
                 cluster_names=cluster_names,
                 out_path=out_path,
                 frame_limit=frame_limit_per_video,
+                n_jobs=n_jobs,
             )
         else:
             # If experiment_id is not provided, output a video per cluster for each experiment
@@ -2406,6 +2668,7 @@ def export_annotated_video(
                 min_confidence=min_confidence,
                 min_bout_duration=min_bout_duration,
                 out_path=out_path,
+                n_jobs=n_jobs,
             )
 
     # Supervised annotation output
@@ -2583,7 +2846,8 @@ def tag_annotated_frames(
 ):
     """Annotate a given frame with on-screen information about the recognised patterns.
 
-    Helper function for annotate_video. No public use intended.
+    Helper function for annotate_video. No public use intended. Both tag_dict and coords are expected to be
+    dictionaries of NumPy arrays (with tags and body parts as keys, respectively), indexed by frame number.
 
     """
     arena, w, h = arena
@@ -2644,11 +2908,11 @@ def tag_annotated_frames(
             )
 
         # Print body parts for debuging
-        for bpart in coords.columns.levels[0]:
-            if not np.isnan(coords[bpart]["x"][fnum]):
+        for bpart, positions in coords.items():
+            if not np.isnan(positions[fnum, 0]):
                 cv2.circle(
                     frame,
-                    (int(coords[bpart]["x"][fnum]), int(coords[bpart]["y"][fnum])),
+                    (int(positions[fnum, 0]), int(positions[fnum, 1])),
                     radius=3,
                     color=(
                         (255, 0, 0) if bpart.startswith(animal_ids[0]) else (0, 0, 255)
@@ -2743,6 +3007,7 @@ def annotate_video(
     frame_limit: int = np.inf,
     debug: bool = False,
     params: dict = {},
+    n_jobs: int = 1,
 ) -> True:
     """Render a version of the input video with all supervised taggings in place.
 
@@ -2752,6 +3017,7 @@ def annotate_video(
         vid_index: for internal usage only; index of the video to tag in coordinates._videos.
         frame_limit (float): limit the number of frames to output. Generates all annotated frames by default.
         params (dict): dictionary to overwrite the default values of the hyperparameters of the functions that the supervised pose estimation utilizes.
+        n_jobs (int): number of threads used to annotate frames. See render_frames.
 
     """
     # Extract useful information from coordinates object
@@ -2771,41 +3037,47 @@ def annotate_video(
     h, w = coordinates._video_resolution[vid_index]
     corners = deepof.annotation_utils.frame_corners(h, w)
 
+    # Retrieve all per-frame information once, as NumPy arrays indexed by frame number
+    tag_dict = {tag: tag_dict[tag].to_numpy() for tag in tag_dict.columns}
+    coords = coordinates.get_coords(center=False)[vid_name]
+    coords = {
+        bpart: coords[bpart][["x", "y"]].to_numpy()
+        for bpart in coords.columns.get_level_values(0).unique()
+    }
+
     cap = cv2.VideoCapture(os.path.join(path, videos[vid_index]))
-    # Keep track of the frame number, to align with the tracking data
-    fnum = 0
-    writer = None
-    frame_speeds = (
-        {_id: -np.inf for _id in animal_ids} if len(animal_ids) > 1 else -np.inf
+    writer = cv2.VideoWriter()
+    writer.open(
+        os.path.join(
+            coordinates._project_path,
+            coordinates._project_name,
+            "Out_videos",
+            vid_name + "_supervised_tagged.avi",
+        ),
+        cv2.VideoWriter_fourcc(*"MJPG"),
+        coordinates._frame_rate,
+        (
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        ),
+        True,
     )
 
-    # Loop over the frames in the video
-    while cap.isOpened() and fnum < frame_limit:
-
-        ret, frame = cap.read()
-        # if frame is read correctly ret is True
-        if not ret:  # pragma: no cover
-            print("Can't receive frame (stream end?). Exiting ...")
-            break
-
-        font = cv2.FONT_HERSHEY_DUPLEX
-
-        # Capture speeds
-        try:
-            if (
-                list(frame_speeds.values())[0] == -np.inf
-                or fnum % params["speed_pause"] == 0
-            ):
-                for _id in animal_ids:
-                    frame_speeds[_id] = tag_dict[_id + undercond + "speed"][fnum]
-        except AttributeError:
-            if frame_speeds == -np.inf or fnum % params["speed_pause"] == 0:
-                frame_speeds = tag_dict["speed"][fnum]
+    def annotate(fnum, frame):
+        """Display all annotations on a single frame."""
+        # Speeds are only updated every speed_pause frames, to make them readable
+        speed_fnum = fnum - fnum % params["speed_pause"]
+        if len(animal_ids) > 1:
+            frame_speeds = {
+                _id: tag_dict[_id + undercond + "speed"][speed_fnum]
+                for _id in animal_ids
+            }
+        else:
+            frame_speeds = tag_dict["speed"][speed_fnum]
 
-        # Display all annotations in the output video
         tag_annotated_frames(
             frame,
-            font,
+            cv2.FONT_HERSHEY_DUPLEX,
             frame_speeds,
             animal_ids,
             corners,
@@ -2816,29 +3088,20 @@ def annotate_video(
             (arena_params, h, w),
             coordinates._arena,
             debug,
-            coordinates.get_coords(center=False)[vid_name],
+            coords,
         )
+        return frame
+
+    # Loop over the tracked frames in the video
+    n_frames = len(next(iter(tag_dict.values())))
+    render_frames(
+        extract_frames(cap, np.arange(n_frames) < frame_limit),
+        annotate,
+        lambda fnum, frame: writer.write(frame),
+        n_jobs=n_jobs,
+    )
 
-        if writer is None:
-            # Define the codec and create VideoWriter object.The output is stored in 'outpy.avi' file.
-            # Define the FPS. Also frame size is passed.
-            writer = cv2.VideoWriter()
-            writer.open(
-                os.path.join(
-                    coordinates._project_path,
-                    coordinates._project_name,
-                    "Out_videos",
-                    vid_name + "_supervised_tagged.avi",
-                ),
-                cv2.VideoWriter_fourcc(*"MJPG"),
-                coordinates._frame_rate,
-                (frame.shape[1], frame.shape[0]),
-                True,
-            )
-
-        writer.write(frame)
-        fnum += 1
-
+    writer.release()
     cap.release()
     cv2.destroyAllWindows()
 
@@ -19,7 +19,9 @@ from hypothesis import HealthCheck
 from hypothesis import given
 from hypothesis import settings
 from hypothesis import strategies as st
+from hypothesis.extra.numpy import arrays
 from hypothesis.extra.pandas import range_indexes, columns, data_frames
+from shapely.geometry import Point, Polygon
 
 import deepof.data
 import deepof.annotation_utils
@@ -152,6 +154,41 @@ def test_climb_wall(center, axes, angle, tol):
         deepof.annotation_utils.climb_wall("", arena, prun["test"], tol1, nose="Nose")
 
 
+@settings(deadline=None)
+@given(
+    points=arrays(
+        dtype=float,
+        shape=st.tuples(st.integers(min_value=1, max_value=200), st.just(2)),
+        elements=st.floats(min_value=0, max_value=100, width=32),
+    ),
+    tol=st.floats(min_value=-30, max_value=30),
+)
+def test_outside_polygon(points, tol):
+
+    # Concave arena, so that negative buffers can split it into several parts
+    arena = [
+        [10, 10],
+        [90, 10],
+        [90, 90],
+        [55, 90],
+        [55, 30],
+        [45, 30],
+        [45, 90],
+        [10, 90],
+    ]
+    buffered = Polygon(arena).buffer(tol)
+
+    outside = deepof.annotation_utils.outside_polygon(points, arena, threshold=tol)
+    assert outside.dtype == bool
+
+    # Points lying exactly on the boundary are ambiguous, and not checked
+    not_on_boundary = [buffered.boundary.distance(Point(p)) > 1e-6 for p in points]
+    assert np.array_equal(
+        outside[not_on_boundary],
+        np.array([not buffered.contains(Point(p)) for p in points])[not_on_boundary],
+    )
+
+
 @settings(deadline=None, suppress_health_check=[HealthCheck.too_slow])
 @given(animal_id=st.one_of(st.just("B"), st.just("W")))
 def test_single_animal_traits(animal_id):
@@ -233,7 +270,9 @@ def test_following_path(distance_dframe, position_dframe, frames, tol):
     )
 
     position_dframe.columns = pos_idx
-    distance_dframe.columns = [c for c in combinations(bparts, 2) if c[0][0] != c[1][0]]
+    distance_dframe.columns = [
+        tuple(sorted(c)) for c in combinations(bparts, 2) if c[0][0] != c[1][0]
+    ]
 
     follow = deepof.annotation_utils.following_path(
         distance_dframe,
@@ -250,6 +289,29 @@ def test_following_path(distance_dframe, position_dframe, frames, tol):
     assert np.sum(follow) <= position_dframe.shape[0]
     assert np.sum(follow) <= distance_dframe.shape[0]
 
+    # Computing both directions at once should match computing them independently
+    follow_ab, follow_ba = deepof.annotation_utils.following_path(
+        distance_dframe,
+        position_dframe,
+        follower="A",
+        followed="B",
+        frames=frames,
+        tol=tol,
+        bidirectional=True,
+    )
+    assert np.array_equal(follow_ab, follow)
+    assert np.array_equal(
+        follow_ba,
+        deepof.annotation_utils.following_path(
+            distance_dframe,
+            position_dframe,
+            follower="B",
+            followed="A",
+            frames=frames,
+            tol=tol,
+        ),
+    )
+
 
 @settings(deadline=None, suppress_health_check=[HealthCheck.too_slow])
 @given(
@@ -9,13 +9,15 @@ Testing module for deepof.preprocess
 """
 
 import os
+import pickle
 from collections import defaultdict
-from shutil import rmtree
+from shutil import copy2, rmtree
 
 import numpy as np
 import pandas as pd
 import pytest
 import string
+from unittest import mock
 from hypothesis import given
 from hypothesis import settings
 from hypothesis import strategies as st
@@ -61,6 +63,401 @@ def test_project_init(table_type):
     )
 
 
+def test_read_table():
+
+    tables = []
+    for table_type in [".h5", ".csv"]:
+        prun = deepof.data.Project(
+            project_path=os.path.join(
+                ".", "tests", "test_examples", "test_madlc_topview"
+            ),
+            video_path=os.path.join(
+                ".", "tests", "test_examples", "test_madlc_topview", "Videos"
+            ),
+            table_path=os.path.join(
+                ".", "tests", "test_examples", "test_madlc_topview", "Tables"
+            ),
+            arena="polygonal-manual",
+            video_scale=380,
+            video_format=".mp4",
+            table_format=table_type,
+        )
+        tables.append(prun._read_table(prun.tables[0]))
+
+        columns = prun._read_table_columns(prun.tables[0])
+        assert columns.names == ["individuals", "bodyparts", "coords"]
+
+    for tab in tables:
+        assert tab.columns.names == ["bodyparts", "coords"]
+        assert all(dtype == float for dtype in tab.dtypes)
+        assert tab.columns[0][0] == "_".join(columns[0][:2])
+
+    pd.testing.assert_index_equal(tables[0].columns, tables[1].columns)
+
+
+def test_load_tables_parallel():
+
+    tables = []
+    for n_jobs in [1, 2]:
+        prun = deepof.data.Project(
+            project_path=os.path.join(
+                ".", "tests", "test_examples", "test_single_topview"
+            ),
+            video_path=os.path.join(
+                ".", "tests", "test_examples", "test_single_topview", "Videos"
+            ),
+            table_path=os.path.join(
+                ".", "tests", "test_examples", "test_single_topview", "Tables"
+            ),
+            arena="circular-autodetect",
+            video_scale=380,
+            video_format=".mp4",
+            table_format=".h5",
+            n_jobs=n_jobs,
+        )
+        tables.append(prun.load_tables(verbose=False)[0])
+
+    assert list(tables[0].keys()) == list(tables[1].keys())
+    for key in tables[0].keys():
+        pd.testing.assert_frame_equal(tables[0][key], tables[1][key])
+
+
+@settings(max_examples=2, deadline=None)
+@given(
+    storage=st.one_of(st.just("hdf5"), st.just("npy")),
+)
+def test_disk_storage(storage):
+
+    prun = deepof.data.Project(
+        project_path=os.path.join(".", "tests", "test_examples", "test_single_topview"),
+        video_path=os.path.join(
+            ".", "tests", "test_examples", "test_single_topview", "Videos"
+        ),
+        table_path=os.path.join(
+            ".", "tests", "test_examples", "test_single_topview", "Tables"
+        ),
+        project_name="test_disk_storage",
+        arena="circular-autodetect",
+        video_scale=380,
+        video_format=".mp4",
+        table_format=".h5",
+        storage=storage,
+    ).create(force=True)
+
+    loaded = deepof.data.load_project(
+        os.path.join(
+            ".", "tests", "test_examples", "test_single_topview", "test_disk_storage"
+        )
+    )
+    assert isinstance(loaded._tables, deepof.data.DiskTableDict)
+
+    # Getters should not modify the stored tables
+    for _ in range(2):
+        for key, tab in prun.get_coords(center="arena").items():
+            pd.testing.assert_frame_equal(tab, loaded.get_coords(center="arena")[key])
+    for key, tab in prun.get_distances().items():
+        pd.testing.assert_frame_equal(tab, loaded.get_distances()[key])
+
+    rmtree(
+        os.path.join(
+            ".", "tests", "test_examples", "test_single_topview", "test_disk_storage"
+        )
+    )
+
+
+@settings(max_examples=2, deadline=None)
+@given(
+    storage=st.one_of(st.just("hdf5"), st.just("npy")),
+)
+def test_disk_table_dict_reads(storage):
+
+    root = os.path.join(".", "tests", "test_examples", "test_single_topview")
+    tabs = deepof.data.DiskTableDict(root, "test_disk_table_dict", backend=storage)
+    for i in range(3):
+        tabs["test_{}".format(i)] = pd.DataFrame(
+            np.random.normal(size=(100, 4)), columns=list("abcd")
+        )
+    tabs.save()
+    saved = {key: tab.copy() for key, tab in tabs.items()}
+
+    loaded = pickle.loads(pickle.dumps(tabs))
+    with mock.patch.object(
+        deepof.data.DiskTableDict,
+        "_read_table",
+        autospec=True,
+        side_effect=deepof.data.DiskTableDict._read_table,
+    ) as read_table:
+
+        # Each table is read from disk once, regardless of how many copies access it
+        for _ in range(3):
+            copied = deepof.utils.deepcopy(loaded)
+            for key, tab in copied.items():
+                pd.testing.assert_frame_equal(tab, saved[key])
+                tab.iloc[:, :] = 0.0
+        assert read_table.call_count == 3
+
+        # Modifying copies never affects the original store, or other copies
+        for key, tab in loaded.items():
+            pd.testing.assert_frame_equal(tab, saved[key])
+        assert read_table.call_count == 3
+
+    rmtree(os.path.join(root, "test_disk_table_dict"))
+
+
+def test_load_legacy_project():
+
+    prun = deepof.data.Project(
+        project_path=os.path.join(".", "tests", "test_examples", "test_single_topview"),
+        video_path=os.path.join(
+            ".", "tests", "test_examples", "test_single_topview", "Videos"
+        ),
+        table_path=os.path.join(
+            ".", "tests", "test_examples", "test_single_topview", "Tables"
+        ),
+        project_name="test_legacy_project",
+        arena="circular-autodetect",
+        video_scale=380,
+        video_format=".mp4",
+        table_format=".h5",
+    ).create(force=True)
+
+    # Simulate a project pickled before on-disk storage backends and getter caching were introduced
+    project_path = os.path.join(
+        ".", "tests", "test_examples", "test_single_topview", "test_legacy_project"
+    )
+    for attr in [
+        "_storage",
+        "_cache_size",
+        "_feature_cache",
+        "_cache_hits",
+        "_cache_misses",
+        "_file_signatures",
+    ]:
+        delattr(prun, attr)
+    with open(
+        os.path.join(project_path, "Coordinates", "deepof_coordinates.pkl"), "wb"
+    ) as handle:
+        pickle.dump(prun, handle)
+
+    loaded = deepof.data.load_project(project_path)
+    assert loaded._storage == "pickle"
+    loaded.save(timestamp=False)
+
+    for getter in ["get_coords", "get_distances", "get_angles", "get_areas"]:
+        assert isinstance(getattr(loaded, getter)(), deepof.data.TableDict)
+    assert loaded.get_cache_info()["misses"] == 4
+    loaded.clear_cache()
+    assert loaded.get_cache_info()["entries"] == 0
+    assert loaded._file_signatures == {}
+
+    rmtree(project_path)
+
+
+@settings(max_examples=2, deadline=None)
+@given(
+    table_type=st.one_of(st.just(".h5"), st.just(".csv")),
+)
+def test_streaming_ingestion(table_type):
+
+    tables = []
+    for chunk_size in [None, 20]:
+        prun = deepof.data.Project(
+            project_path=os.path.join(
+                ".", "tests", "test_examples", "test_single_topview"
+            ),
+            video_path=os.path.join(
+                ".", "tests", "test_examples", "test_single_topview", "Videos"
+            ),
+            table_path=os.path.join(
+                ".", "tests", "test_examples", "test_single_topview", "Tables"
+            ),
+            project_name="test_streaming_ingestion",
+            arena="circular-autodetect",
+            video_scale=380,
+            video_format=".mp4",
+            table_format=table_type,
+            storage="npy",
+            chunk_size=chunk_size,
+            enable_iterative_imputation=False,
+        ).create(force=True)
+        tables.append(
+            {key: tab.copy() for key, tab in prun.get_coords(center=False).items()}
+        )
+
+    assert list(tables[0].keys()) == list(tables[1].keys())
+    for key in tables[0].keys():
+        pd.testing.assert_frame_equal(tables[0][key], tables[1][key])
+
+    rmtree(
+        os.path.join(
+            ".",
+            "tests",
+            "test_examples",
+            "test_single_topview",
+            "test_streaming_ingestion",
+        )
+    )
+
+
+def test_project_update():
+
+    example_path = os.path.join(".", "tests", "test_examples", "test_single_topview")
+    update_path = os.path.join(example_path, "test_update")
+
+    def add_experiment(exp_id):
+        for folder, extension in [("Videos", ".mp4"), ("Tables", ".h5")]:
+            os.makedirs(os.path.join(update_path, folder), exist_ok=True)
+            for file in os.listdir(os.path.join(example_path, folder)):
+                if file.startswith(exp_id + "DLC") and file.endswith(extension):
+                    copy2(
+                        os.path.join(example_path, folder, file),
+                        os.path.join(update_path, folder),
+                    )
+
+    def get_project():
+        return deepof.data.Project(
+            project_path=update_path,
+            video_path=os.path.join(update_path, "Videos"),
+            table_path=os.path.join(update_path, "Tables"),
+            project_name="test_project_update",
+            arena="circular-autodetect",
+            video_scale=380,
+            video_format=".mp4",
+            table_format=".h5",
+        )
+
+    add_experiment("test2")
+    prun = get_project().create(force=True)
+    assert list(prun._tables.keys()) == ["test2"]
+    previous = prun.get_coords()["test2"]
+
+    # Only the new experiment is processed and merged into the existing project
+    add_experiment("test")
+    prun = get_project().update()
+    assert list(prun._tables.keys()) == ["test2", "test"]
+    assert prun._scales.shape[0] == len(prun._videos) == 2
+    pd.testing.assert_frame_equal(prun.get_coords()["test2"], previous)
+
+    # Unchanged projects are returned as they are
+    assert get_project().update()._file_signatures == prun._file_signatures
+
+    rmtree(update_path)
+
+
+def test_processing_cache():
+
+    cache_path = os.path.join(
+        ".", "tests", "test_examples", "test_single_topview", "test_processing_cache"
+    )
+
+    def get_project(distances):
+        prun = deepof.data.Project(
+            project_path=os.path.join(
+                ".", "tests", "test_examples", "test_single_topview"
+            ),
+            video_path=os.path.join(
+                ".", "tests", "test_examples", "test_single_topview", "Videos"
+            ),
+            table_path=os.path.join(
+                ".", "tests", "test_examples", "test_single_topview", "Tables"
+            ),
+            project_name="test_processing_cache_project",
+            arena="circular-autodetect",
+            video_scale=380,
+            video_format=".mp4",
+            table_format=".h5",
+            processing_cache_path=cache_path,
+        )
+        prun.distances = distances
+        return prun.create(force=True)
+
+    coords = [
+        get_project(distances)
+        for distances in ["all", "all", ["Nose", "Center", "Tail_base"]]
+    ]
+
+    # Cached results are identical to computed ones
+    for getter in ["get_coords", "get_distances", "get_angles", "get_areas"]:
+        for key, tab in getattr(coords[0], getter)().items():
+            pd.testing.assert_frame_equal(tab, getattr(coords[1], getter)()[key])
+
+    # Changing a downstream parameter only invalidates the affected stage
+    n_entries = {
+        stage: len(os.listdir(os.path.join(cache_path, stage)))
+        for stage in os.listdir(cache_path)
+    }
+    assert n_entries["distances"] == 2 * n_entries["angles"]
+    assert n_entries["tables"] == n_entries["angles"] == n_entries["areas"]
+
+    # Entries written by other versions of the processing code are never reused
+    with mock.patch.object(deepof.data, "PROCESSING_CACHE_VERSION", -1):
+        get_project("all")
+    for stage in os.listdir(cache_path):
+        entries = os.listdir(os.path.join(cache_path, stage))
+        assert len(entries) > n_entries[stage]
+        assert all(entry.endswith(".pkl") for entry in entries)
+
+    rmtree(cache_path)
+    rmtree(
+        os.path.join(
+            ".",
+            "tests",
+            "test_examples",
+            "test_single_topview",
+            "test_processing_cache_project",
+        )
+    )
+
+
+def test_feature_cache():
+
+    prun = deepof.data.Project(
+        project_path=os.path.join(".", "tests", "test_examples", "test_single_topview"),
+        video_path=os.path.join(
+            ".", "tests", "test_examples", "test_single_topview", "Videos"
+        ),
+        table_path=os.path.join(
+            ".", "tests", "test_examples", "test_single_topview", "Tables"
+        ),
+        project_name="test_feature_cache",
+        arena="circular-autodetect",
+        video_scale=380,
+        video_format=".mp4",
+        table_format=".h5",
+    ).create(force=True)
+
+    first = prun.get_coords(center="Center", align="Spine_1")
+    assert prun.get_cache_info()["misses"] == 1
+
+    # Modifying returned tables should not affect cached values
+    for tab in first.values():
+        tab.iloc[:, :] = 0.0
+
+    second = prun.get_coords(center="Center", align="Spine_1")
+    assert prun.get_cache_info()["hits"] == 1
+    assert isinstance(second, deepof.data.TableDict)
+    assert second._center == "Center"
+    assert all(tab.abs().sum().sum() > 0 for tab in second.values())
+
+    # Saving invalidates the cache
+    prun.save(timestamp=False)
+    assert prun.get_cache_info()["entries"] == 0
+
+    # So does modifying the project, which cached outputs would otherwise not reflect
+    prun.get_coords()
+    prun._exp_conditions = {
+        key: pd.DataFrame({"CSDS": "test_cond"}, index=[0]) for key in prun._tables
+    }
+    assert prun.get_cache_info()["entries"] == 0
+    assert prun.get_coords()._exp_conditions is prun._exp_conditions
+
+    rmtree(
+        os.path.join(
+            ".", "tests", "test_examples", "test_single_topview", "test_feature_cache"
+        )
+    )
+
+
 def test_project_properties():
 
     prun = deepof.data.Project(
@@ -228,32 +625,35 @@ def test_run(nodes, ego):
     assert isinstance(prun, deepof.data.Coordinates)
 
 
-def test_get_supervised_annotation():
+@settings(max_examples=2, deadline=None)
+@given(mode=st.one_of(st.just("single"), st.just("multi")))
+def test_get_supervised_annotation(mode):
+
+    path = os.path.join(".", "tests", "test_examples", "test_{}_topview".format(mode))
 
     prun = deepof.data.Project(
-        project_path=os.path.join(".", "tests", "test_examples", "test_single_topview"),
-        video_path=os.path.join(
-            ".", "tests", "test_examples", "test_single_topview", "Videos"
-        ),
-        table_path=os.path.join(
-            ".", "tests", "test_examples", "test_single_topview", "Tables"
-        ),
+        project_path=path,
+        video_path=os.path.join(path, "Videos"),
+        table_path=os.path.join(path, "Tables"),
         arena="circular-autodetect",
         exclude_bodyparts=["Tail_1", "Tail_2", "Tail_tip"],
+        animal_ids=(["B", "W"] if mode == "multi" else [""]),
         video_scale=380,
         video_format=".mp4",
         table_format=".h5",
     ).create(force=True)
-    rmtree(
-        os.path.join(
-            ".", "tests", "test_examples", "test_single_topview", "deepof_project"
-        )
-    )
+    rmtree(os.path.join(path, "deepof_project"))
 
-    prun = prun.supervised_annotation()
+    # Experiments tagged in worker processes should match those tagged sequentially
+    supervised = [prun.supervised_annotation(n_jobs=n_jobs) for n_jobs in [1, 2]]
 
-    assert isinstance(prun, deepof.data.TableDict)
-    assert prun._type == "supervised"
+    for tags in supervised:
+        assert isinstance(tags, deepof.data.TableDict)
+        assert tags._type == "supervised"
+
+    assert list(supervised[0].keys()) == list(supervised[1].keys())
+    for key in supervised[0].keys():
+        pd.testing.assert_frame_equal(supervised[0][key], supervised[1][key])
 
 
 @settings(deadline=None)
@@ -392,6 +792,55 @@ def test_get_table_dicts(nodes, mode, ego, exclude, sampler, random_id):
     assert isinstance(coords.pca(n_components=2), tuple)
 
 
+@settings(max_examples=10, deadline=None)
+@given(
+    window_step=st.integers(min_value=1, max_value=5),
+    test_videos=st.integers(min_value=0, max_value=1),
+    shuffle=st.booleans(),
+)
+def test_lazy_preprocess(window_step, test_videos, shuffle):
+
+    tabs = deepof.data.TableDict(
+        {
+            "test_{}".format(i): pd.DataFrame(
+                np.random.normal(size=(length, 6)),
+                columns=["feature_{}".format(j) for j in range(6)],
+            )
+            for i, length in enumerate([100, 40, 75])
+        },
+        typ="coords",
+    )
+
+    np.random.seed(0)
+    dense, _ = tabs.preprocess(
+        window_size=11,
+        window_step=window_step,
+        test_videos=test_videos,
+        shuffle=shuffle,
+    )
+    np.random.seed(0)
+    lazy, _ = tabs.preprocess(
+        window_size=11,
+        window_step=window_step,
+        test_videos=test_videos,
+        shuffle=shuffle,
+        lazy=True,
+    )
+
+    assert isinstance(lazy[0], deepof.data.WindowedDataset)
+    assert lazy[0].shape == dense[0].shape
+    assert np.array_equal(lazy[0][np.arange(len(lazy[0]))], dense[0])
+    assert np.array_equal(np.concatenate(list(lazy[0].batches(16))), dense[0])
+    if test_videos:
+        assert np.array_equal(lazy[2][np.arange(len(lazy[2]))], dense[2])
+
+    batch = next(iter(lazy[0].to_tf_dataset(batch_size=16)))
+    assert batch.shape == (16, 11, 6)
+
+    with pytest.raises(ValueError):
+        tabs.preprocess(automatic_changepoints="linear", lazy=True)
+
+
 @settings(deadline=None)
 @given(
     mode=st.one_of(st.just("single"), st.just("multi"), st.just("madlc")),
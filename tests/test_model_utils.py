@@ -80,11 +80,13 @@ def test_get_hard_counts(soft_counts):
     embedding_model=st.sampled_from(["VQVAE", "VaDE", "Contrastive"]),
     encoder_type=st.sampled_from(["recurrent", "TCN", "transformer"]),
     use_graph=st.booleans(),
+    lazy=st.booleans(),
 )
 def test_model_embedding_fitting(
     embedding_model,
     encoder_type,
     use_graph,
+    lazy,
 ):
 
     prun = deepof.data.Project(
@@ -108,6 +110,10 @@ def test_model_embedding_fitting(
     X_train = np.ones([20, 5, 6]).astype(float)
     y_train = np.array([20, 1]).astype(float)
 
+    if lazy and not use_graph:
+        # 20 sliding windows of 5 frames, gathered batch by batch during training
+        X_train = deepof.data.WindowedDataset([np.ones([24, 6])], window_size=5)
+
     if not use_graph:
         preprocessed_data = (X_train, y_train, X_train, y_train)
     else:
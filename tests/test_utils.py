@@ -8,12 +8,16 @@ Testing module for deepof.utils
 
 """
 
+import math
 import os
+import warnings
 from itertools import combinations
 
+import cv2
 import networkx as nx
 import numpy as np
 import pandas as pd
+import pytest
 import tensorflow as tf
 from hypothesis import HealthCheck
 from hypothesis import given
@@ -23,6 +27,8 @@ from hypothesis.extra.numpy import arrays
 from hypothesis.extra.pandas import range_indexes, columns, data_frames
 from scipy.spatial import distance
 from shutil import rmtree
+from types import SimpleNamespace
+from unittest import mock
 
 import deepof.data
 import deepof.utils
@@ -36,6 +42,116 @@ def autocorr(x, t=1):
     return np.round(np.corrcoef(np.array([x[:-t], x[t:]]))[0, 1], 5)
 
 
+def kleinberg_path_copying(
+    offsets: list, s: float = np.e, gamma: float = 1.0, n=None, T=None, k=None
+):
+    """Reference implementation of deepof.utils.kleinberg from deepof<=0.5.0, which copies the whole path matrix at every timestep"""
+    offsets = np.array(offsets, dtype=object)
+
+    if offsets.size == 1:
+        bursts = np.array([0, offsets[0], offsets[0]], ndmin=2, dtype=object)
+        return bursts
+
+    offsets = np.sort(offsets)
+    gaps = np.diff(offsets)
+
+    if not np.all(gaps):
+        raise ValueError("Input cannot contain events with zero time between!")
+
+    if T is None:
+        T = np.sum(gaps)
+
+    if n is None:
+        n = np.size(gaps)
+
+    g_hat = T / n
+    gamma_log_n = gamma * math.log(n)
+
+    if k is None:
+        k = int(math.ceil(float(1 + math.log(T, s) + math.log(1 / np.amin(gaps), s))))
+
+    def tau(i, j):
+        if i >= j:
+            return 0
+        else:
+            return (j - i) * gamma_log_n
+
+    alpha_function = np.vectorize(lambda x: s**x / g_hat)
+    alpha = alpha_function(np.arange(k))
+
+    def f(j, x):
+        return alpha[j] * math.exp(-alpha[j] * x)
+
+    C = np.repeat(float("inf"), k)
+    C[0] = 0
+
+    q = np.empty((k, 0))
+    for t in range(np.size(gaps)):
+        C_prime = np.repeat(float("inf"), k)
+        q_prime = np.empty((k, t + 1))
+        q_prime.fill(np.nan)
+
+        for j in range(k):
+            cost_function = np.vectorize(lambda x: C[x] + tau(x, j))
+            cost = cost_function(np.arange(0, k))
+
+            el = np.argmin(cost)
+
+            if f(j, gaps[t]) > 0:
+                C_prime[j] = cost[el] - math.log(f(j, gaps[t]))
+
+            if t > 0:
+                q_prime[j, :t] = q[el, :]
+
+            q_prime[j, t] = j + 1
+
+        C = C_prime
+        q = q_prime
+
+    j = np.argmin(C)
+    q = q[j, :]
+
+    prev_q = 0
+
+    N = 0
+    for t in range(np.size(gaps)):
+        if q[t] > prev_q:
+            N = N + q[t] - prev_q
+        prev_q = q[t]
+
+    bursts = np.array(
+        [np.repeat(np.nan, N), np.repeat(offsets[0], N), np.repeat(offsets[0], N)],
+        ndmin=2,
+        dtype=object,
+    ).transpose()
+
+    burst_counter = -1
+    prev_q = 0
+    stack = np.zeros(int(N), dtype=int)
+    stack_counter = -1
+    for t in range(np.size(gaps)):
+        if q[t] > prev_q:
+            num_levels_opened = q[t] - prev_q
+            for i in range(int(num_levels_opened)):
+                burst_counter += 1
+                bursts[burst_counter, 0] = prev_q + i
+                bursts[burst_counter, 1] = offsets[t]
+                stack_counter += 1
+                stack[stack_counter] = int(burst_counter)
+        elif q[t] < prev_q:
+            num_levels_closed = prev_q - q[t]
+            for i in range(int(num_levels_closed)):
+                bursts[stack[stack_counter], 2] = offsets[t]
+                stack_counter -= 1
+        prev_q = q[t]
+
+    while stack_counter >= 0:
+        bursts[stack[stack_counter], 2] = offsets[np.size(gaps)]
+        stack_counter -= 1
+
+    return bursts
+
+
 # QUALITY CONTROL AND PREPROCESSING #
 
 
@@ -154,6 +270,18 @@ def test_bpart_distance(cordarray):
     assert bpart.shape[0] == cord_df.shape[0]
     assert bpart.shape[1] == len(list(combinations(range(cord_df.shape[1] // 2), 2)))
 
+    for pair in bpart.columns:
+        assert np.allclose(
+            bpart[pair],
+            deepof.utils.compute_dist(np.array(cord_df.loc[:, list(pair)]))[0],
+        )
+
+    edges = list(combinations(cord_df.columns.levels[0], 2))[::2]
+    bpart_edges = deepof.utils.bpart_distance(cord_df, edges=edges)
+
+    assert list(bpart_edges.columns) == edges
+    assert np.allclose(bpart_edges, bpart.loc[:, edges])
+
 
 @settings(deadline=None, suppress_health_check=[HealthCheck.too_slow])
 @given(
@@ -181,6 +309,58 @@ def test_angle(abc):
 
     assert np.allclose(deepof.utils.angle([a, b, c]), np.array(angles))
 
+    # Several cliques can be computed in a single batch
+    batched = deepof.utils.angle(np.stack([abc, abc[::-1]], axis=1))
+    assert np.allclose(batched, np.array([angles, angles]))
+
+
+@settings(deadline=None, suppress_health_check=[HealthCheck.too_slow])
+@given(
+    coords=arrays(
+        dtype=float,
+        shape=st.tuples(
+            st.integers(min_value=5, max_value=100),
+            st.integers(min_value=20, max_value=20),
+        ),
+        elements=st.one_of(
+            st.floats(min_value=-100, max_value=100, allow_infinity=False),
+            st.just(np.nan),
+        ),
+    ),
+    animal_id=st.one_of(st.just(None), st.just("B")),
+)
+def test_compute_all_areas(coords, animal_id):
+    bodyparts = [
+        "Nose",
+        "Left_ear",
+        "Right_ear",
+        "Spine_1",
+        "Spine_2",
+        "Left_fhip",
+        "Right_fhip",
+        "Left_bhip",
+        "Right_bhip",
+        "Tail_base",
+    ]
+    if animal_id is not None:
+        bodyparts = ["_".join([animal_id, bp]) for bp in bodyparts]
+
+    coords = pd.DataFrame(
+        coords, columns=pd.MultiIndex.from_product([bodyparts, ["x", "y"]])
+    )
+
+    shapely_areas = np.array(
+        coords.apply(
+            lambda x: deepof.utils.compute_areas(x, animal_id=animal_id), axis=1
+        ).to_list()
+    )
+
+    assert np.allclose(
+        deepof.utils.compute_all_areas(coords, animal_id=animal_id),
+        shapely_areas,
+        equal_nan=True,
+    )
+
 
 @settings(max_examples=10, deadline=None)
 @given(
@@ -226,6 +406,12 @@ def test_align_trajectories(data, mode_idx):
     elif mode == "none":
         assert np.allclose(aligned, data)
 
+    # Rotations should preserve the distance of each body part to the origin
+    assert np.allclose(
+        np.linalg.norm(aligned.reshape(-1, 2), axis=1),
+        np.linalg.norm(data.reshape(-1, 2), axis=1),
+    )
+
 
 @settings(deadline=None, suppress_health_check=[HealthCheck.too_slow])
 @given(a=arrays(dtype=bool, shape=st.tuples(st.integers(min_value=3, max_value=100))))
@@ -240,6 +426,22 @@ def test_smooth_boolean_array(a):
     assert trans(a) >= trans(smooth)
 
 
+@settings(deadline=None, max_examples=50)
+@given(
+    offsets=st.lists(
+        st.integers(min_value=0, max_value=2000), min_size=1, max_size=150, unique=True
+    ),
+    s=st.floats(min_value=1.5, max_value=4.0),
+    gamma=st.floats(min_value=0.01, max_value=2.0),
+)
+def test_kleinberg(offsets, s, gamma):
+
+    # Bursts should match the ones obtained by tracking full paths across states
+    bursts = deepof.utils.kleinberg(offsets, s=s, gamma=gamma)
+    reference = kleinberg_path_copying(offsets, s=s, gamma=gamma)
+    assert np.array_equal(bursts.astype(float), reference.astype(float))
+
+
 @settings(deadline=None)
 @given(
     window=st.data(),
@@ -288,6 +490,210 @@ def test_smooth_mult_trajectory(alpha, series):
     assert autocorr(smoothed2) >= autocorr(smoothed1)
 
 
+@settings(deadline=None, suppress_health_check=[HealthCheck.too_slow])
+@given(
+    coords=arrays(
+        dtype=float,
+        shape=st.tuples(
+            st.integers(min_value=20, max_value=100),
+            st.integers(min_value=6, max_value=6),
+        ),
+        elements=st.one_of(
+            st.floats(min_value=-100, max_value=100, allow_infinity=False),
+            st.just(np.nan),
+        ),
+    ),
+    mode=st.one_of(st.just("and"), st.just("or")),
+    lag=st.integers(min_value=2, max_value=6),
+)
+def test_full_outlier_mask(coords, mode, lag):
+    bodyparts = ["Nose", "Center", "Tail_base"]
+    coords = pd.DataFrame(
+        coords, columns=pd.MultiIndex.from_product([bodyparts, ["x", "y"]])
+    )
+    likelihood = pd.DataFrame(
+        np.random.uniform(0, 1, [coords.shape[0], 3]), columns=bodyparts
+    )
+
+    full_mask = deepof.utils.full_outlier_mask(
+        coords, likelihood, 0.5, exclude="Center", lag=lag, n_std=1, mode=mode
+    )
+    assert full_mask.columns.get_level_values(0).unique().to_list() == [
+        "Nose",
+        "Tail_base",
+    ]
+
+    for bpart in ["Nose", "Tail_base"]:
+        mask = deepof.utils.mask_outliers(
+            coords[bpart], likelihood[bpart], 0.5, lag=lag, n_std=1, mode=mode
+        )
+        assert np.array_equal(full_mask[bpart]["x"], mask)
+        assert np.array_equal(full_mask[bpart]["y"], mask)
+
+
+@settings(deadline=None)
+@given(
+    n_frames=st.integers(min_value=1, max_value=200),
+    chunk_size=st.integers(min_value=1, max_value=50),
+    halo=st.integers(min_value=0, max_value=20),
+)
+def test_iter_padded_chunks(n_frames, chunk_size, halo):
+    series = np.arange(n_frames)[:, np.newaxis]
+    chunk_size = max(chunk_size, halo)
+
+    cores = []
+    for start, window, core in deepof.utils.iter_padded_chunks(
+        np.array_split(series, range(chunk_size, n_frames, chunk_size)), halo
+    ):
+        cores.append(window[core])
+        assert window[core][0, 0] == start
+        assert np.array_equal(
+            window, series[max(0, start - halo) : start + len(window[core]) + halo]
+        )
+
+    assert np.array_equal(np.concatenate(cores), series)
+
+
+@settings(deadline=None, suppress_health_check=[HealthCheck.too_slow])
+@given(
+    series=arrays(
+        dtype=float,
+        shape=st.tuples(
+            st.integers(min_value=40, max_value=300),
+            st.integers(min_value=1, max_value=4),
+        ),
+        elements=st.floats(min_value=-100, max_value=100),
+    ),
+    chunk_size=st.integers(min_value=35, max_value=100),
+    alpha=st.integers(min_value=1, max_value=10),
+)
+def test_smooth_padded_chunk(series, chunk_size, alpha):
+    w_length, halo = 15, 35
+
+    smoothed = np.concatenate(
+        [
+            deepof.utils.smooth_padded_chunk(
+                window, alpha, w_length, start == 0, core.stop is None
+            )[core]
+            for start, window, core in deepof.utils.iter_padded_chunks(
+                np.array_split(series, range(chunk_size, len(series), chunk_size)),
+                halo,
+            )
+        ]
+    )
+    assert np.allclose(
+        smoothed, deepof.utils.smooth_mult_trajectory(series, alpha, w_length)
+    )
+
+
+@settings(deadline=None, suppress_health_check=[HealthCheck.too_slow])
+@given(
+    residuals=arrays(
+        dtype=float,
+        shape=st.tuples(
+            st.integers(min_value=1, max_value=200),
+            st.integers(min_value=1, max_value=4),
+        ),
+        elements=st.one_of(
+            st.floats(min_value=-100, max_value=100, allow_infinity=False),
+            st.just(np.nan),
+        ),
+    ),
+    chunk_size=st.integers(min_value=1, max_value=50),
+    n_std=st.floats(min_value=0, max_value=3),
+)
+def test_residual_thresholds(residuals, chunk_size, n_std):
+    statistics = None
+    for start in range(0, len(residuals), chunk_size):
+        statistics = deepof.utils.update_residual_statistics(
+            residuals[start : start + chunk_size], statistics
+        )
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        expected = np.nanmean(residuals, axis=0) + n_std * np.nanstd(residuals, axis=0)
+
+    assert np.allclose(
+        deepof.utils.residual_thresholds(statistics, n_std), expected, equal_nan=True
+    )
+
+
+@settings(deadline=None, suppress_health_check=[HealthCheck.too_slow])
+@given(
+    values=arrays(
+        dtype=float,
+        shape=st.tuples(
+            st.integers(min_value=1, max_value=200),
+            st.integers(min_value=1, max_value=4),
+        ),
+        elements=st.one_of(
+            st.floats(min_value=-100, max_value=100, allow_infinity=False),
+            st.just(np.nan),
+        ),
+    ),
+    chunk_size=st.integers(min_value=1, max_value=50),
+    limit=st.integers(min_value=1, max_value=15),
+)
+def test_interpolate_gaps(values, chunk_size, limit):
+    expected = (
+        pd.DataFrame(values)
+        .interpolate(method="linear", limit=limit, limit_direction="both")
+        .to_numpy()
+    )
+
+    # Results should match pandas, both when processing the whole series and chunk by chunk
+    interpolated = values.copy()
+    deepof.utils.interpolate_gaps(values, interpolated, limit=limit)
+    assert np.allclose(interpolated, expected, equal_nan=True)
+
+    interpolated, state = values.copy(), None
+    for start in range(0, len(values), chunk_size):
+        state = deepof.utils.interpolate_gaps(
+            values[start : start + chunk_size],
+            interpolated,
+            start=start,
+            limit=limit,
+            state=state,
+            last=start + chunk_size >= len(values),
+        )
+    assert np.allclose(interpolated, expected, equal_nan=True)
+
+
+@settings(max_examples=10, deadline=None)
+@given(
+    n_videos=st.integers(min_value=1, max_value=3),
+    occlusion_rate=st.floats(min_value=0.01, max_value=0.2),
+)
+def test_pooled_imputation(n_videos, occlusion_rate):
+    animal_ids = ["B", "W"]
+    bodyparts = ["{}_{}".format(aid, bp) for aid in animal_ids for bp in "abcd"]
+    project = SimpleNamespace(animal_ids=animal_ids, enable_iterative_imputation=10)
+
+    tabs, liks = {}, {}
+    for i in range(n_videos):
+        tab = pd.DataFrame(
+            np.random.normal(0, 1, [200, 16]),
+            columns=pd.MultiIndex.from_product([bodyparts, ["x", "y"]]),
+        )
+        tabs["test_{}".format(i)] = tab.mask(
+            np.random.uniform(size=tab.shape) < occlusion_rate
+        )
+        liks["test_{}".format(i)] = pd.DataFrame(
+            1.0, index=tab.index, columns=bodyparts
+        )
+
+    liks = deepof.data.TableDict(liks, typ="quality", animal_ids=animal_ids)
+    imputers = deepof.utils.fit_pooled_imputer(project, tabs, liks, max_samples=300)
+    imputed = deepof.utils.pooled_imputation(project, tabs, liks, imputers)
+
+    assert set(imputers.keys()) == set(animal_ids)
+    for key, tab in tabs.items():
+        assert imputed[key].shape == tab.shape
+        assert not imputed[key].isna().any().any()
+        observed = tab.notna().to_numpy()
+        assert np.allclose(imputed[key].to_numpy()[observed], tab.to_numpy()[observed])
+
+
 @settings(deadline=None)
 @given(mode=st.one_of(st.just("and"), st.just("or")))
 def test_interpolate_outliers(mode):
@@ -341,6 +747,25 @@ def test_interpolate_outliers(mode):
     )
 
 
+def test_get_video_metadata():
+
+    path = os.path.join(".", "tests", "test_examples", "test_single_topview", "Videos")
+    video = [i for i in os.listdir(path) if i.endswith("mp4")][0]
+
+    metadata = deepof.utils.get_video_metadata(os.path.join(path, video))
+    assert metadata["frame_rate"] > 0
+    assert metadata["n_frames"] > 0
+
+    # Resolution should match the one obtained when decoding frames
+    _, h, w = deepof.utils.automatically_recognize_arena(
+        videos=[video], vid_index=0, path=path, recoglimit=1
+    )
+    assert metadata["resolution"] == (h, w)
+
+    with pytest.raises(ValueError):
+        deepof.utils.get_video_metadata(os.path.join(path, "missing.mp4"))
+
+
 @settings(deadline=None, max_examples=10)
 @given(
     indexes=st.data(),
@@ -366,6 +791,58 @@ def test_recognize_arena_and_subfunctions(indexes):
     assert isinstance(arena[1], int)
     assert isinstance(arena[2], int)
 
+    # Evenly spaced, downsampled frames should yield the same structure, at the original resolution
+    sampled_arena = deepof.utils.automatically_recognize_arena(
+        videos=videos,
+        tables=None,
+        vid_index=vid_index,
+        path=path,
+        arena_type="circular-autodetect",
+        sample_frames=recoglimit,
+        max_size=indexes.draw(st.integers(min_value=200, max_value=1000)),
+    )
+    assert len(sampled_arena[0]) == 3
+    assert sampled_arena[1:] == arena[1:]
+
+
+def test_recognize_arena_without_frame_count():
+
+    path = os.path.join(".", "tests", "test_examples", "test_single_topview", "Videos")
+    videos = [i for i in os.listdir(path) if i.endswith("mp4")]
+    video_capture = cv2.VideoCapture
+
+    class NoFrameCountCapture:
+        """Video capture reporting no frame count, as some containers do."""
+
+        def __init__(self, *args):
+            self._cap = video_capture(*args)
+
+        def get(self, prop):
+            return 0 if prop == cv2.CAP_PROP_FRAME_COUNT else self._cap.get(prop)
+
+        def __getattr__(self, name):
+            return getattr(self._cap, name)
+
+    tables = {
+        "test": pd.DataFrame(
+            np.random.uniform(0, 10, size=(20, 2)),
+            columns=pd.MultiIndex.from_product([["Center"], ["x", "y"]]),
+        )
+    }
+
+    with mock.patch.object(deepof.utils.cv2, "VideoCapture", NoFrameCountCapture):
+
+        # Sampled frames fall back to the length of the tracking table
+        arena = deepof.utils.automatically_recognize_arena(
+            videos=videos, tables=tables, vid_index=0, path=path, sample_frames=5
+        )
+        assert len(arena[0]) == 3
+
+        with pytest.raises(ValueError):
+            deepof.utils.automatically_recognize_arena(
+                videos=videos, vid_index=0, path=path, sample_frames=5
+            )
+
 
 @settings(deadline=None, suppress_health_check=[HealthCheck.too_slow])
 @given(
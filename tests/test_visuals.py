@@ -0,0 +1,286 @@
+# @author lucasmiranda42
+# encoding: utf-8
+# module deepof
+
+"""
+
+Testing module for deepof.visuals
+
+"""
+
+import os
+import random
+import time
+from unittest import mock
+
+import cv2
+import numpy as np
+import pytest
+
+import deepof.visuals
+
+
+# AUXILIARY FUNCTIONS #
+
+
+def write_test_video(path, n_frames=60, fourcc="MJPG", shape=(48, 64)):
+    """Writes a video in which each frame has a distinct intensity and pattern, and returns its path"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), 25, shape[::-1])
+    for i in range(n_frames):
+        frame = np.full((*shape, 3), (4 * i) % 256, dtype=np.uint8)
+        cv2.putText(
+            frame, str(i), (5, shape[0] - 5), cv2.FONT_HERSHEY_PLAIN, 1, (255,) * 3
+        )
+        writer.write(frame)
+    writer.release()
+
+    return path
+
+
+def synthetic_frames(n_frames=50, fail_at=None):
+    """Yields (index, frame) tuples of small constant frames, raising an error at frame fail_at if given"""
+    for i in range(n_frames):
+        if i == fail_at:
+            raise RuntimeError("decoding failed")
+        yield i, np.full((4, 4), i, dtype=np.int64)
+
+
+def slow_annotate(idx, frame, fail_at=None):
+    """Annotates a frame after a random delay, so that workers finish out of order"""
+    time.sleep(random.uniform(0, 0.005))
+    if idx == fail_at:
+        raise ValueError("annotation failed")
+    return frame + 1
+
+
+class FrameCollector:
+    """Stand-in for cv2.VideoWriter, which keeps all written frames in memory"""
+
+    def __init__(self):
+        self.frames = []
+
+    def write(self, frame):
+        self.frames.append(frame)
+
+    def release(self):
+        pass
+
+
+# VIDEO RENDERING #
+
+
+@pytest.mark.parametrize(
+    "frame_mask, bouts",
+    [
+        ([], []),
+        ([False, False, False], []),
+        ([True, True, True], [[0, 3]]),
+        ([True, False, True], [[0, 1], [2, 3]]),
+        ([False, True, True, False, False, True], [[1, 3], [5, 6]]),
+    ],
+)
+def test_get_frame_bouts(frame_mask, bouts):
+
+    assert np.array_equal(
+        deepof.visuals.get_frame_bouts(np.array(frame_mask, dtype=bool)),
+        np.array(bouts, dtype=int).reshape(-1, 2),
+    )
+
+
+@pytest.mark.parametrize("fourcc, extension", [("MJPG", "avi"), ("mp4v", "mp4")])
+def test_extract_frames(tmp_path, fourcc, extension):
+
+    path = write_test_video(
+        os.path.join(tmp_path, "test_video.{}".format(extension)), fourcc=fourcc
+    )
+
+    cap = cv2.VideoCapture(path)
+    sequential = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        sequential.append(frame)
+    cap.release()
+
+    # Bouts touching the first and last frames, separated by gaps that are both grabbed and seeked over
+    frame_mask = np.zeros(len(sequential), dtype=bool)
+    frame_mask[[0, 1, 4, 5, 6, 30, 31, 58, 59]] = True
+
+    for seek_gap in [1, 10, 100]:
+        extracted = list(
+            deepof.visuals.extract_frames(
+                cv2.VideoCapture(path), frame_mask, seek_gap=seek_gap
+            )
+        )
+        assert [idx for idx, _ in extracted] == list(np.flatnonzero(frame_mask))
+        assert all(np.array_equal(frame, sequential[idx]) for idx, frame in extracted)
+
+    # Masks longer than the video stop at its last frame
+    extracted = list(
+        deepof.visuals.extract_frames(cv2.VideoCapture(path), np.ones(100, dtype=bool))
+    )
+    assert len(extracted) == len(sequential)
+
+
+@pytest.mark.parametrize(
+    "n_jobs, buffer_size", [(1, None), (4, None), (4, 2), (-1, None)]
+)
+def test_render_frames(n_jobs, buffer_size):
+
+    written = []
+    deepof.visuals.render_frames(
+        synthetic_frames(),
+        slow_annotate,
+        lambda idx, frame: written.append((idx, frame)),
+        n_jobs=n_jobs,
+        buffer_size=buffer_size,
+    )
+
+    # Frames are encoded in their original order, regardless of when each worker finishes
+    assert [idx for idx, _ in written] == list(range(50))
+    assert all(np.all(frame == idx + 1) for idx, frame in written)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 4])
+def test_render_frames_errors(n_jobs):
+
+    with pytest.raises(ValueError, match="annotation failed"):
+        deepof.visuals.render_frames(
+            synthetic_frames(),
+            lambda idx, frame: slow_annotate(idx, frame, fail_at=20),
+            lambda idx, frame: None,
+            n_jobs=n_jobs,
+        )
+
+    written = []
+    with pytest.raises(RuntimeError, match="decoding failed"):
+        deepof.visuals.render_frames(
+            synthetic_frames(fail_at=20),
+            slow_annotate,
+            lambda idx, frame: written.append(idx),
+            n_jobs=n_jobs,
+        )
+    assert written == list(range(20))
+
+
+def test_demultiplex_cluster_video(tmp_path):
+
+    path = write_test_video(os.path.join(tmp_path, "test_video.avi"))
+    np.random.seed(0)
+    assignments = np.random.choice([-1, 0, 1, 2], size=60)
+
+    for frame_limit in [np.inf, 5]:
+
+        # A single decoding pass should write the same frames as rendering each cluster independently
+        demultiplexed = {cluster_id: FrameCollector() for cluster_id in range(3)}
+        deepof.visuals.demultiplex_cluster_video(
+            path, assignments, demultiplexed, 32, 24, frame_limit
+        )
+
+        for cluster_id, collector in demultiplexed.items():
+            per_cluster = FrameCollector()
+            deepof.visuals.output_cluster_video(
+                cv2.VideoCapture(path),
+                per_cluster,
+                list(assignments == cluster_id),
+                32,
+                24,
+                path,
+                frame_limit,
+            )
+
+            assert len(collector.frames) == min(
+                frame_limit, np.sum(assignments == cluster_id)
+            )
+            assert len(collector.frames) == len(per_cluster.frames)
+            assert all(
+                np.array_equal(demultiplexed_frame, per_cluster_frame)
+                for demultiplexed_frame, per_cluster_frame in zip(
+                    collector.frames, per_cluster.frames
+                )
+            )
+
+
+@pytest.mark.parametrize("n_jobs, buffer_size", [(2, 64), (3, 1), (-1, 4)])
+def test_output_videos_per_cluster(tmp_path, n_jobs, buffer_size):
+
+    np.random.seed(0)
+    lengths = [60, 25, 40, 50]
+    video_paths = [
+        write_test_video(os.path.join(tmp_path, "test_video_{}.avi".format(i)), n)
+        for i, n in enumerate(lengths)
+    ]
+    soft_counts = [np.random.dirichlet(np.ones(3), size=n - 5) for n in lengths]
+    breaks = [np.ones(n - 5, dtype=int) for n in lengths]
+
+    # Videos decoded concurrently should be written in the same order as when decoded one after the other
+    written = []
+    for jobs in [1, n_jobs]:
+        collectors = []
+
+        def new_writer(*args):
+            collectors.append(FrameCollector())
+            return collectors[-1]
+
+        with mock.patch.object(
+            deepof.visuals.cv2, "VideoWriter", side_effect=new_writer
+        ):
+            deepof.visuals.output_videos_per_cluster(
+                video_paths,
+                breaks,
+                soft_counts,
+                frame_limit_per_video=20,
+                single_output_resolution=(32, 24),
+                window_length=5,
+                min_confidence=0.4,
+                out_path=str(tmp_path),
+                n_jobs=jobs,
+                buffer_size=buffer_size,
+            )
+        written.append(collectors)
+
+    assert sum(len(collector.frames) for collector in written[0]) > 0
+    for sequential, concurrent in zip(*written):
+        assert len(sequential.frames) == len(concurrent.frames)
+        assert all(
+            np.array_equal(sequential_frame, concurrent_frame)
+            for sequential_frame, concurrent_frame in zip(
+                sequential.frames, concurrent.frames
+            )
+        )
+
+
+def test_output_videos_per_cluster_errors(tmp_path):
+
+    video_paths = [
+        write_test_video(os.path.join(tmp_path, "test_video_{}.avi".format(i)))
+        for i in range(3)
+    ]
+    soft_counts = [np.eye(3)[np.arange(55) % 3] for _ in range(3)]
+    breaks = [np.ones(55, dtype=int) for _ in range(3)]
+
+    # Errors raised while decoding any of the videos should reach the caller
+    demultiplex_cluster_video = deepof.visuals.demultiplex_cluster_video
+
+    def failing_demultiplex(path, *args, **kwargs):
+        if path == video_paths[1]:
+            raise RuntimeError("decoding failed")
+        return demultiplex_cluster_video(path, *args, **kwargs)
+
+    with mock.patch.object(
+        deepof.visuals.cv2, "VideoWriter", side_effect=lambda *args: FrameCollector()
+    ), mock.patch.object(
+        deepof.visuals, "demultiplex_cluster_video", side_effect=failing_demultiplex
+    ):
+        with pytest.raises(RuntimeError, match="decoding failed"):
+            deepof.visuals.output_videos_per_cluster(
+                video_paths,
+                breaks,
+                soft_counts,
+                single_output_resolution=(32, 24),
+                window_length=5,
+                out_path=str(tmp_path),
+                n_jobs=2,
+                buffer_size=1,
+            )